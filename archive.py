@@ -0,0 +1,134 @@
+import os
+from datetime import date, datetime
+
+import db
+import timeutil
+
+# ---------------------------
+# Архив прошлых лет
+# ---------------------------
+# Операции старше границы переезжают из data.db в файлы по годам
+# (data.2021.db, data.2022.db, ... рядом с базой). Запросы подключают файл
+# года через ATTACH, только когда их диапазон дат в него заходит
+# (Repository.history_page, period_totals, iter_*); итоги по категориям,
+# дням и месяцам остаются в основной базе и архив по-прежнему учитывают.
+#
+# Перенос года — две транзакции в разных файлах (в режиме WAL SQLite не
+# делает их одной атомарной):
+#   1. строки копируются в архив (INSERT OR REPLACE по id — повтор безопасен);
+#   2. в основной базе при meta 'archiving' = 1 строки удаляются, их
+#      import_key запоминаются в archived_import_keys (повторный импорт
+#      выписки за архивный год их пропустит), год регистрируется в archives.
+# Пока шаг 2 не закоммичен, archives о копии не знает и чтение её не видит.
+# Граница переноса записывается в meta 'archive_cutoff' до начала и
+# стирается после конца: прерванный перенос resume() доводит при запуске.
+
+ARCHIVE_COLUMNS = "id, category_id, amount_cents, type, created_at, import_key, created_ts, note, merchant, entry_uuid"
+ARCHIVE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS {schema}.operations (
+        id INTEGER PRIMARY KEY,
+        category_id INTEGER,
+        amount_cents INTEGER,
+        type TEXT,
+        created_at TIMESTAMP,
+        import_key TEXT,
+        created_ts INTEGER,
+        note TEXT,
+        merchant TEXT,
+        entry_uuid TEXT
+    )""",
+    """CREATE INDEX IF NOT EXISTS {schema}.idx_operations_history
+       ON operations(category_id, created_ts, id, amount_cents, type)""",
+)
+
+SQL_OLDEST_BEFORE = "SELECT MIN(created_ts) FROM operations WHERE created_ts < ?"
+SQL_ANY_IN_RANGE = "SELECT EXISTS(SELECT 1 FROM operations WHERE created_ts >= ? AND created_ts < ?)"
+# по категории — диапазон idx_operations_history вместо обхода таблицы
+SQL_COPY_TO_ARCHIVE = (
+    f"INSERT OR REPLACE INTO {{schema}}.operations({ARCHIVE_COLUMNS}) "
+    f"SELECT {ARCHIVE_COLUMNS} FROM main.operations "
+    "WHERE category_id=? AND created_ts >= ? AND created_ts < ?"
+)
+SQL_REMEMBER_IMPORT_KEYS = (
+    "INSERT OR IGNORE INTO archived_import_keys(import_key) "
+    "SELECT import_key FROM main.operations "
+    "WHERE category_id=? AND created_ts >= ? AND created_ts < ? AND import_key IS NOT NULL"
+)
+SQL_DELETE_ARCHIVED = "DELETE FROM main.operations WHERE category_id=? AND created_ts >= ? AND created_ts < ?"
+SQL_REGISTER_ARCHIVE = "INSERT OR IGNORE INTO archives(year, file) VALUES (?, ?)"
+SQL_PENDING_CUTOFF = "SELECT value FROM meta WHERE key = 'archive_cutoff'"
+SQL_SET_PENDING_CUTOFF = "INSERT OR REPLACE INTO meta(key, value) VALUES ('archive_cutoff', ?)"
+SQL_CLEAR_PENDING_CUTOFF = "DELETE FROM meta WHERE key = 'archive_cutoff'"
+
+DEFAULT_KEEP_MONTHS = 24
+
+
+def cutoff_for(keep_months, today=None):
+    # граница «оставить последние keep_months месяцев» — начало месяца
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - keep_months
+    return timeutil.local_day_start(date(index // 12, index % 12 + 1, 1))
+
+
+def archive_file(repo, year):
+    stem = os.path.splitext(os.path.basename(repo.path))[0]
+    return f"{stem}.{year}.db"
+
+
+def year_range(year):
+    return (timeutil.local_day_start(date(year, 1, 1)),
+            timeutil.local_day_start(date(year + 1, 1, 1)))
+
+
+def archive_before(repo, cutoff_ts, progress=None):
+    # переносит операции с created_ts < cutoff_ts; возвращает их число.
+    # progress(год, перенесено за год) — после каждого года
+    with repo.lock:
+        with repo.conn:
+            repo.conn.execute(SQL_SET_PENDING_CUTOFF, (cutoff_ts,))
+        moved = 0
+        oldest = repo.conn.execute(SQL_OLDEST_BEFORE, (cutoff_ts,)).fetchone()[0]
+        if oldest is not None:
+            categories = [c.id for c in repo.categories()]
+            for year in range(datetime.fromtimestamp(oldest).year,
+                              datetime.fromtimestamp(cutoff_ts - 1).year + 1):
+                since, until = year_range(year)
+                count = _archive_year(repo, year, categories, since, min(until, cutoff_ts))
+                moved += count
+                if progress and count:
+                    progress(year, count)
+        with repo.conn:
+            repo.conn.execute(SQL_CLEAR_PENDING_CUTOFF)
+    return moved
+
+
+def _archive_year(repo, year, categories, since, until):
+    conn = repo.conn
+    if not conn.execute(SQL_ANY_IN_RANGE, (since, until)).fetchone()[0]:
+        return 0
+    schema = repo.attach_archive(year, archive_file(repo, year))
+    with conn:
+        for sql in ARCHIVE_SCHEMA:
+            conn.execute(sql.format(schema=schema))
+        for category_id in categories:
+            conn.execute(SQL_COPY_TO_ARCHIVE.format(schema=schema), (category_id, since, until))
+    moved = 0
+    with conn:
+        conn.execute(db.SQL_SET_ARCHIVING, (1,))
+        for category_id in categories:
+            conn.execute(SQL_REMEMBER_IMPORT_KEYS, (category_id, since, until))
+            moved += conn.execute(SQL_DELETE_ARCHIVED, (category_id, since, until)).rowcount
+        conn.execute(db.SQL_SET_ARCHIVING, (0,))
+        conn.execute(SQL_REGISTER_ARCHIVE, (year, archive_file(repo, year)))
+        conn.execute(db.SQL_UPDATE_ARCHIVE, (
+            *conn.execute(db.SQL_ARCHIVE_STATS.format(schema=schema)).fetchone(), year,
+        ))
+    return moved
+
+
+def resume(repo):
+    # перенос, прерванный сбоем, доводится до конца; None — доводить нечего
+    row = repo.conn.execute(SQL_PENDING_CUTOFF).fetchone()
+    if row is None:
+        return None
+    return archive_before(repo, row[0])
@@ -0,0 +1,326 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+from urllib.request import pathname2url
+
+import journal
+import migrations
+
+# ---------------------------
+# Резервные копии базы
+# ---------------------------
+# Снимок делается штатным Connection.backup с рабочего соединения
+# Repository: копия идёт шагами по BACKUP_PAGES страниц, между шагами поток
+# копирования спит BACKUP_PAUSE. Шаг держит соединение миллисекунды, так
+# что запись из потока базы ждёт не дольше одного шага, а изменения,
+# сделанные через это же соединение посреди копии, SQLite сам переносит
+# в копию — копирование не начинается заново. (Запись из другого
+# соединения, например manage.py backup при открытом приложении,
+# начинает копию заново.)
+#
+# Снимок — каталог snapshot-ГГГГММДД-ЧЧММСС-мс/ рядом с базой
+# (<база>.backups/): <файл>.gz основной базы и архивов прошлых лет
+# (archive.py) и manifest.json с sha256 несжатого содержимого каждого
+# файла. Каталог собирается под именем .part и переименовывается, когда
+# манифест уже записан, — недописанных снимков в списке не бывает.
+# Сверх keep самые старые снимки удаляются.
+#
+# Восстановление (при закрытом приложении, manage.py restore) распаковывает
+# файлы рядом с базой, сверяет sha256, PRAGMA integrity_check и версию
+# схемы и только потом подменяет файлы. Прежняя база, её -wal и журнал
+# отложенной записи (journal.py) остаются рядом с суффиксом
+# .before-restore-<время> — повторное восстановление их не перезапишет,
+# а записи старого журнала не попадут в восстановленную базу при запуске.
+
+log = logging.getLogger(__name__)
+
+BACKUP_PAGES = 256       # страниц за шаг: ~1 МБ при странице 4 КБ
+BACKUP_PAUSE = 0.002     # с между шагами
+COMPRESS_LEVEL = 1       # gzip: страницы SQLite хорошо жмутся и на быстром уровне
+DEFAULT_KEEP = 7
+BACKUP_INTERVAL = 24 * 3600
+CHUNK_SIZE = 1 << 20
+SNAPSHOT_PREFIX = "snapshot-"
+MANIFEST = "manifest.json"
+
+
+class Snapshot(NamedTuple):
+    path: str
+    created_ts: int
+    main: str            # имя файла основной базы
+    files: dict          # имя файла -> {"sha256", "size", "compressed"}
+    schema_version: int
+    copy_s: float
+    compress_s: float
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def backup_dir(db_path):
+    return db_path + ".backups"
+
+
+def _copy_database(source, target_path, pages, pause, cancel):
+    def step(status, remaining, total):
+        if cancel is not None and cancel.is_set():
+            raise _Cancelled()  # исключение из progress прерывает backup
+        if pause and remaining:
+            time.sleep(pause)
+
+    target = sqlite3.connect(target_path)
+    # последний шаг коммитит копию, держа соединение-источник; с fsync
+    # гигабайтного файла запись из приложения ждала бы сотни мс. Сырая
+    # копия временная — на диск надёжно ложится уже сжатый файл (_compress)
+    target.execute("PRAGMA synchronous=OFF")
+    try:
+        # SQLITE_BUSY/LOCKED (поток базы как раз пишет через это соединение) —
+        # повтор шага через sleep
+        source.backup(target, pages=pages, progress=step, sleep=0.01)
+    finally:
+        target.close()
+
+
+def _compress(raw_path, level, cancel):
+    # raw -> raw.gz с sha256 несжатого содержимого; raw удаляется
+    digest = hashlib.sha256()
+    with open(raw_path, "rb") as src, gzip.GzipFile(raw_path + ".gz", "wb", level, mtime=0) as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            if cancel is not None and cancel.is_set():
+                raise _Cancelled()
+            digest.update(chunk)
+            dst.write(chunk)
+        size = src.tell()
+    with open(raw_path + ".gz", "rb+") as f:
+        os.fsync(f.fileno())
+    os.remove(raw_path)
+    return {"sha256": digest.hexdigest(), "size": size, "compressed": os.path.getsize(raw_path + ".gz")}
+
+
+def create_snapshot(repo, directory=None, pages=BACKUP_PAGES, pause=BACKUP_PAUSE,
+                    level=COMPRESS_LEVEL, cancel=None):
+    # cancel — threading.Event: прерывает копию на ближайшем шаге
+    directory = directory or backup_dir(repo.path)
+    started = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(started)) + f"-{int(started * 1000) % 1000:03d}"
+    path = os.path.join(directory, SNAPSHOT_PREFIX + stamp)
+    part = path + ".part"
+    os.makedirs(part)
+    try:
+        with repo.lock:
+            schema_version = repo.conn.execute("PRAGMA user_version").fetchone()[0]
+            archives = [(a.file, repo.archive_path(a.file)) for a in repo.archives()]
+        main = os.path.basename(repo.path)
+        copy_s = compress_s = 0.0
+        files = {}
+        sources = [(main, None)] + [(f, p) for f, p in archives if os.path.exists(p)]
+        for name, source_path in sources:
+            raw = os.path.join(part, name)
+            t = time.perf_counter()
+            if source_path is None:
+                _copy_database(repo.conn, raw, pages, pause, cancel)
+            else:
+                # архив меняется редко — своё соединение только для чтения
+                source = sqlite3.connect(f"file:{pathname2url(source_path)}?mode=ro", uri=True)
+                try:
+                    _copy_database(source, raw, pages, pause, cancel)
+                finally:
+                    source.close()
+            copy_s += time.perf_counter() - t
+            t = time.perf_counter()
+            files[name] = _compress(raw, level, cancel)
+            compress_s += time.perf_counter() - t
+
+        snapshot = Snapshot(path, int(started), main, files, schema_version, round(copy_s, 3), round(compress_s, 3))
+        manifest = snapshot._asdict()
+        del manifest["path"]
+        with open(os.path.join(part, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(part, path)
+    except BaseException:
+        shutil.rmtree(part, ignore_errors=True)
+        raise
+    return snapshot
+
+
+def list_snapshots(directory):
+    # готовые снимки, новые первыми
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for name in names:
+        if not name.startswith(SNAPSHOT_PREFIX) or name.endswith(".part"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+                snapshots.append(Snapshot(path=path, **json.load(f)))
+        except (OSError, ValueError, TypeError):
+            continue
+    snapshots.sort(key=lambda s: os.path.basename(s.path), reverse=True)
+    return snapshots
+
+
+def prune(directory, keep=DEFAULT_KEEP):
+    # удаляет снимки сверх keep и каталоги .part, оставшиеся от прерванных копий
+    removed = []
+    for snapshot in list_snapshots(directory)[keep:]:
+        shutil.rmtree(snapshot.path, ignore_errors=True)
+        removed.append(snapshot.path)
+    for name in os.listdir(directory):
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(".part"):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return removed
+
+
+def _decompress(gz_path, target_path):
+    digest = hashlib.sha256()
+    with gzip.open(gz_path, "rb") as src, open(target_path, "wb") as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+
+def verify_snapshot(snapshot):
+    # список проблем; пустой — все файлы читаются и совпадают с манифестом
+    problems = []
+    for name, meta in snapshot.files.items():
+        digest = hashlib.sha256()
+        try:
+            with gzip.open(os.path.join(snapshot.path, name + ".gz"), "rb") as src:
+                while chunk := src.read(CHUNK_SIZE):
+                    digest.update(chunk)
+        except (OSError, EOFError) as e:
+            problems.append(f"{name}: не читается ({e})")
+            continue
+        if digest.hexdigest() != meta["sha256"]:
+            problems.append(f"{name}: sha256 не совпадает с манифестом")
+    return problems
+
+
+def _check_database(path):
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+    return result, version
+
+
+def restore_snapshot(snapshot, db_path):
+    # заменяет базу (и архивы) содержимым снимка после полной проверки;
+    # при любой проблеме — ValueError, рабочие файлы не тронуты.
+    # Возвращает (восстановленные файлы, отложенные в сторону прежние)
+    directory = os.path.dirname(os.path.abspath(db_path))
+    staged = []  # (распакованный файл, куда его положить)
+    try:
+        for name, meta in snapshot.files.items():
+            dest = db_path if name == snapshot.main else os.path.join(directory, name)
+            tmp = dest + ".restore"
+            staged.append((tmp, dest))
+            try:
+                digest = _decompress(os.path.join(snapshot.path, name + ".gz"), tmp)
+            except (OSError, EOFError) as e:
+                raise ValueError(f"{name}: не читается ({e})") from e
+            if digest != meta["sha256"]:
+                raise ValueError(f"{name}: sha256 не совпадает с манифестом")
+            result, version = _check_database(tmp)
+            if result != "ok":
+                raise ValueError(f"{name}: integrity_check: {result}")
+            if name == snapshot.main and version > migrations.SCHEMA_VERSION:
+                raise ValueError(f"снимок базы версии {version} новее приложения ({migrations.SCHEMA_VERSION})")
+    except BaseException:
+        for tmp, _ in staged:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        raise
+
+    now = time.time()
+    stamp = ".before-restore-" + time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+    previous = journal.journal_files(db_path) + [dest for _, dest in staged]
+    aside, n = stamp, 1
+    while any(os.path.exists(p + aside) for p in previous):
+        aside, n = f"{stamp}-{n}", n + 1
+    moved = []
+
+    def move_aside(path, target):
+        if os.path.exists(path):
+            os.replace(path, target)
+            moved.append(target)
+
+    # несброшенные вводы прежней базы: при запуске они ушли бы в снимок
+    for path in journal.journal_files(db_path):
+        move_aside(path, path + aside)
+    for tmp, dest in staged:
+        # -wal относится к прежнему файлу и уезжает вместе с ним
+        move_aside(dest, dest + aside)
+        move_aside(dest + "-wal", dest + aside + "-wal")
+        if os.path.exists(dest + "-shm"):
+            os.remove(dest + "-shm")
+        os.replace(tmp, dest)
+    # кэш диаграмм ключован версией данных — у восстановленной базы
+    # она может совпасть с версией, под которой лежат чужие данные
+    shutil.rmtree(db_path + ".charts", ignore_errors=True)
+    return [dest for _, dest in staged], moved
+
+
+class BackupService:
+    # Резервное копирование из приложения: не чаще interval, в своём потоке;
+    # stop() прерывает копию на ближайшем шаге (недописанный снимок удаляется)
+    def __init__(self, repo, directory=None, keep=DEFAULT_KEEP, interval=BACKUP_INTERVAL):
+        self.repo = repo
+        self.directory = directory or backup_dir(repo.path)
+        self.keep = keep
+        self.interval = interval
+        self._cancel = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def due(self):
+        snapshots = list_snapshots(self.directory)
+        return not snapshots or time.time() - snapshots[0].created_ts >= self.interval
+
+    def start(self, on_done=None):
+        # on_done(snapshot) — из потока копирования
+        if self.running:
+            return False
+        self._cancel.clear()
+        self._thread = threading.Thread(target=self._run, args=(on_done,), name="backup", daemon=True)
+        self._thread.start()
+        return True
+
+    def start_if_due(self, on_done=None):
+        return self.due() and self.start(on_done)
+
+    def _run(self, on_done):
+        try:
+            snapshot = create_snapshot(self.repo, self.directory, cancel=self._cancel)
+            prune(self.directory, self.keep)
+        except _Cancelled:
+            return
+        except Exception:
+            log.exception("резервная копия не создана")
+            return
+        if on_done:
+            on_done(snapshot)
+
+    def stop(self):
+        self._cancel.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
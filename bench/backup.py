@@ -0,0 +1,151 @@
+# Резервная копия большой базы (backup.py): время копии, сжатия, проверки и
+# восстановления и задержка записи из приложения, пока копия идёт в фоне.
+# База — готовая (--db) или временная: bench/generate.py на --operations
+# операций, затем операции дублируются пачками, пока файл не дорастёт до
+# --size-mb. Запись меряется как в приложении: add_operation раз в
+# --write-every мс из «потока базы», сначала без копии, потом во время неё.
+#
+#   python bench/backup.py                        # ~1 ГБ во временной базе
+#   python bench/backup.py --db /tmp/big.db       # база сохраняется для повторных замеров
+#   python bench/backup.py --db /tmp/big.db --levels 1,6,9
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import backup  # noqa: E402
+import db  # noqa: E402
+import generate  # noqa: E402
+
+GROW_BATCH = 500_000
+SQL_GROW = (
+    "INSERT INTO operations(category_id, amount_cents, type, created_ts, note, merchant) "
+    "SELECT category_id, amount_cents, type, created_ts, note, merchant FROM operations "
+    "WHERE id > ? AND id <= ?"
+)
+SQL_GROW_UNTIL = "SELECT MAX(id) FROM (SELECT id FROM operations WHERE id > ? ORDER BY id LIMIT ?)"
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def grow(repo, size_mb):
+    # дублирует уже имеющиеся операции, пока файл меньше size_mb
+    last_id = 0
+    while os.path.getsize(repo.path) < size_mb * 1024 * 1024:
+        with repo.lock, repo.conn:
+            until = repo.conn.execute(SQL_GROW_UNTIL, (last_id, GROW_BATCH)).fetchone()[0]
+            repo.conn.execute(SQL_GROW, (last_id, until))
+        last_id = until
+        with repo.lock:
+            repo.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"\rразмер: {os.path.getsize(repo.path) / 1024 / 1024:.0f} МБ", end="", flush=True)
+    print()
+
+
+def write_latencies(repo, category_id, every, stop):
+    # add_operation раз в every с, пока stop() не вернёт True; задержки в мс
+    latencies = []
+    while not stop():
+        t = time.perf_counter()
+        repo.add_operation(category_id, -100, "расход", int(time.time()), "копия", None)
+        latencies.append((time.perf_counter() - t) * 1000)
+        time.sleep(every)
+    return latencies
+
+
+def describe(name, values):
+    return (f"{name}: {len(values)} записей, p50 {percentile(values, 0.5):.2f} мс, "
+            f"p95 {percentile(values, 0.95):.2f} мс, max {max(values):.2f} мс")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Резервная копия и восстановление большой базы")
+    parser.add_argument("--db", help="путь к базе; если файл уже есть, он не перезаполняется")
+    parser.add_argument("--operations", type=int, default=1_000_000, help="начальное заполнение")
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--levels", default="1,6", help="уровни gzip через запятую; первый — с записью")
+    parser.add_argument("--write-every", type=float, default=20, help="мс между записями")
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args(argv)
+    levels = [int(v) for v in args.levels.split(",")]
+
+    tmp = tempfile.TemporaryDirectory()
+    path = args.db or os.path.join(tmp.name, "data.db")
+    existing = os.path.exists(path)
+    repo = db.Repository(path)
+    repo.init_schema()
+    if not existing:
+        generate.generate(
+            repo, 12, args.operations, args.seed,
+            progress=lambda done, total: print(f"\rзаполнение: {done}/{total}", end="", flush=True),
+        )
+        print()
+    grow(repo, args.size_mb)
+    count = repo.conn.execute("SELECT COUNT(*) FROM operations").fetchone()[0]
+    print(f"база: {os.path.getsize(path) / 1024 / 1024:.0f} МБ, операций: {count}")
+    category_id = repo.categories()[0].id
+    every = args.write_every / 1000
+
+    # для сравнения — 10 с записи без копии
+    deadline = time.perf_counter() + 10
+    idle = write_latencies(repo, category_id, every, lambda: time.perf_counter() > deadline)
+
+    directory = os.path.join(tmp.name, "backups")
+    snapshots = {}
+    for i, level in enumerate(levels):
+        done = threading.Event()
+        result = {}
+
+        def run(level=level):
+            t = time.perf_counter()
+            result["snapshot"] = backup.create_snapshot(repo, directory, level=level)
+            result["total"] = time.perf_counter() - t
+            done.set()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        busy = write_latencies(repo, category_id, every, done.is_set) if i == 0 else None
+        thread.join()
+        snapshot = result["snapshot"]
+        snapshots[level] = snapshot
+        meta = snapshot.files[snapshot.main]
+        print(f"gzip {level}: всего {result['total']:.1f} с (копия {snapshot.copy_s:.1f} с, "
+              f"сжатие {snapshot.compress_s:.1f} с), {meta['size'] / 1024 / 1024:.0f} МБ -> "
+              f"{meta['compressed'] / 1024 / 1024:.0f} МБ ({meta['size'] / meta['compressed']:.1f}x)")
+        if busy:
+            print("  " + describe("запись без копии", idle))
+            print("  " + describe("запись во время копии", busy))
+
+    snapshot = snapshots[levels[0]]
+    t = time.perf_counter()
+    problems = backup.verify_snapshot(snapshot)
+    print(f"проверка снимка: {time.perf_counter() - t:.1f} с, {'; '.join(problems) or 'ok'}")
+
+    restored = os.path.join(tmp.name, "restored", "data.db")
+    os.makedirs(os.path.dirname(restored))
+    t = time.perf_counter()
+    backup.restore_snapshot(snapshot, restored)  # (файлы, прежние файлы)
+    print(f"восстановление (распаковка, sha256, integrity_check): {time.perf_counter() - t:.1f} с")
+    check = db.Repository(restored)
+    restored_count = check.conn.execute("SELECT COUNT(*) FROM operations").fetchone()[0]
+    check.close()
+    # снимок сделан во время записи: в нём все операции до его конца
+    print(f"операций в восстановленной базе: {restored_count} (до копии было {count})")
+
+    repo.close()
+    shutil.rmtree(directory, ignore_errors=True)
+    tmp.cleanup()
+    return 0 if not problems and restored_count >= count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# Генератор синтетической базы: N категорий и M операций за несколько лет
+# с заметками и получателями. При одном и том же --seed данные одинаковые,
+# так что замеры на разных машинах и коммитах сравнимы.
+# Операции пишутся пачками через Repository.import_operations — итоги,
+# корзины по дням/месяцам и поисковый индекс заполняют триггеры.
+#
+#   python bench/generate.py --db /tmp/bench.db --categories 12 --operations 100000
+#   python bench/generate.py --db /tmp/big.db --operations 5000000   # ~10 минут
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+
+BATCH_SIZE = 10000
+SYLLABLES = ("ка", "ро", "ми", "ла", "то", "ве", "ст", "ар", "ны", "по", "се", "ду", "ри", "кон", "мар", "бе")
+CATEGORY_NAMES = (
+    "Еда", "Транспорт", "Кафе", "Аптека", "Дом", "Связь", "Одежда", "Кино",
+    "Подарки", "Спорт", "Путешествия", "Зарплата",
+)
+COLORS = ("#D64545", "#E67E22", "#F1C40F", "#A3CB38", "#2ECC71", "#48C9B0", "#3498DB", "#8E44AD", "#C0398E")
+INCOME_SHARE = 0.15
+
+
+def make_words(rnd, count):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+
+def vocabulary(seed):
+    # словарь зависит только от seed — bench/search.py восстанавливает его
+    # для уже заполненной базы, не читая её
+    rnd = random.Random(seed)
+    return make_words(rnd, 5000), [w.capitalize() for w in make_words(rnd, 300)]
+
+
+def generate(repo, categories, operations, seed=17, years=5, progress=None):
+    vocab, merchants = vocabulary(seed)
+    rnd = random.Random(seed + 1)
+    names = [CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"Категория {i + 1}"
+             for i in range(categories)]
+    category_ids = [repo.ensure_category(name, COLORS[i % len(COLORS)]) for i, name in enumerate(names)]
+    # у категорий разная «популярность», как в жизни
+    weights = [1 / (i + 1) for i in range(categories)]
+
+    end = int(time.time())
+    start = end - years * 365 * 86400
+    step = (end - start) / max(operations, 1)
+    batch = []
+    for i in range(operations):
+        created_ts = int(start + i * step + rnd.random() * step)
+        if rnd.random() < INCOME_SHARE:
+            type_op, amount = "доход", int(rnd.lognormvariate(10.5, 0.8))
+        else:
+            type_op, amount = "расход", -int(rnd.lognormvariate(7.5, 1.2))
+        note = " ".join(rnd.choice(vocab) for _ in range(rnd.randint(1, 4))) if rnd.random() < 0.3 else None
+        merchant = rnd.choice(merchants) if rnd.random() < 0.7 else None
+        category_id = rnd.choices(category_ids, weights)[0]
+        batch.append((category_id, amount, type_op, created_ts, None, note, merchant))
+        if len(batch) == BATCH_SIZE:
+            repo.import_operations(batch)
+            batch.clear()
+            if progress:
+                progress(i + 1, operations)
+    if batch:
+        repo.import_operations(batch)
+        if progress:
+            progress(operations, operations)
+    return vocab, merchants
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Синтетическая база для замеров")
+    parser.add_argument("--db", default=db.DB_NAME)
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--operations", type=int, default=100_000, help="от 1000 до 5 000 000")
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args(argv)
+    if not 1000 <= args.operations <= 5_000_000:
+        parser.error("--operations: от 1000 до 5 000 000")
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} уже существует — генератор заполняет только новую базу")
+
+    def report(done, total):
+        print(f"\rопераций: {done}/{total}", end="", flush=True)
+
+    started = time.perf_counter()
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    generate(repo, args.categories, args.operations, args.seed, args.years, progress=report)
+    repo.close()
+    print(f"\nГотово за {time.perf_counter() - started:.1f} с: {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# Замер горячих путей без окна: данные главного экрана (animate_chart),
+# страница истории (load_history), get_categories и отрисовка диаграмм
+# (инструкции PieCanvasChart).
+# Каждый путь гоняется --repeat раз, в отчёт идут p50/p95 в мс и пиковый
+# RSS процесса. Результат пишется в JSON (--out) и сравнивается с
+# сохранённой базой (--baseline): p95 хуже базы больше чем в --tolerance
+# раз или путь есть только в одном из замеров — код выхода 1.
+#
+# Заливка готового RGBA-кадра в текстуру (RGBATexture.upload) требует
+# GL-контекста и здесь не меряется — это делают bench/startup.py и
+# bench/screens.py в настоящем окне.
+#
+#   python bench/hotpaths.py                                  # 100 000 операций во временной базе
+#   python bench/hotpaths.py --db /tmp/bench.db               # база из bench/generate.py
+#   python bench/hotpaths.py --out result.json --baseline bench/hotpaths_baseline.json
+#   python bench/hotpaths.py --save-baseline                  # перезаписать базу замеров
+import argparse
+import json
+import os
+import platform
+import resource
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+
+BASELINE_FILE = os.path.join(ROOT, "bench", "hotpaths_baseline.json")
+# пути быстрее этого не считаются регрессией даже при росте в разы —
+# на долях миллисекунды шум таймера больше самого пути
+NOISE_MS = 1.0
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def measure(fn, repeat):
+    fn()  # прогрев: кэш страниц SQLite, шрифты matplotlib
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t) * 1000)
+    return {
+        "p50_ms": round(statistics.median(times), 3),
+        "p95_ms": round(percentile(times, 0.95), 3),
+        "runs": repeat,
+    }
+
+
+def hot_paths(repo, main, timeutil):
+    # функции без аргументов; каждая повторяет работу своего пути в приложении
+    categories = [c.id for c in repo.categories()]
+    totals = repo.period_totals()
+    pie_data = [(t.name, t.expense_cents, t.color) for t in totals if t.expense_cents > 0]
+    values = [v for _, v, _ in pie_data]
+    colors = [c for _, _, c in pie_data]
+    labels = [n for n, _, _ in pie_data]
+    history_cursor = [0]
+
+    def period_totals(period):
+        since, until = timeutil.period_range(period)
+        return lambda: repo.period_totals(since, until)
+
+    def load_history():
+        # первая страница и итоги очередной категории, строки — с холодным
+        # кэшем текстов, как при первом входе в историю
+        category_id = categories[history_cursor[0] % len(categories)]
+        history_cursor[0] += 1
+        main._operation_texts.clear()
+        rows = repo.history_page(category_id, None, main.HISTORY_PAGE_SIZE)
+        repo.category_summary(category_id)
+        return [main.HistoryScreen._make_item(op) for op in rows]
+
+    def load_history_next():
+        category_id = categories[0]
+        first = repo.history_page(category_id, None, main.HISTORY_PAGE_SIZE)
+        if first:
+            rows = repo.history_page(category_id, main._history_page_key(first[-1]), main.HISTORY_PAGE_SIZE)
+            return [main.HistoryScreen._make_item(op) for op in rows]
+
+    canvas_chart = main.PieCanvasChart(size=(320, 320))
+
+    def pie_canvas():
+        # то, что animate_chart делает в UI-потоке: инструкции и все кадры анимации
+        canvas_chart.values, canvas_chart.colors, canvas_chart.labels = values, colors, labels
+        canvas_chart._build()
+        progress = 0
+        while progress < 1:
+            canvas_chart._draw(progress)
+            progress += canvas_chart.speed
+        canvas_chart._draw(1)
+
+    def cached(load, *args):
+        # повторный запуск при той же версии данных: ответ из кэша на диске
+        load(*args)
+        return lambda: load(*args)
+
+    return {
+        "get_categories": main.get_categories,
+        "animate_chart.totals_all": period_totals("all"),
+        "animate_chart.totals_month": period_totals("month"),
+        "animate_chart.totals_30d": period_totals("30d"),
+        "animate_chart.totals_cached": cached(main.load_period_totals, *timeutil.period_range("month")),
+        "animate_chart.pie_canvas": pie_canvas,
+        "load_history.first_page": load_history,
+        "load_history.next_page": load_history_next,
+        "load_balance_series.cached": cached(main.load_balance_series),
+    }
+
+
+def compare(result, baseline, tolerance):
+    # список регрессий: (путь, p95 сейчас, p95 в базе). Путь, которого нет
+    # в одном из замеров, не проверен — это тоже ошибка, с None вместо p95
+    if (result["meta"]["operations"], result["meta"]["categories"]) != \
+            (baseline["meta"]["operations"], baseline["meta"]["categories"]):
+        raise SystemExit(
+            "база замеров снята на другом объёме данных: "
+            f"{baseline['meta']['operations']} операций / {baseline['meta']['categories']} категорий"
+        )
+    regressions = [(name, None, base["p95_ms"])
+                   for name, base in baseline["paths"].items() if name not in result["paths"]]
+    for name, current in result["paths"].items():
+        base = baseline["paths"].get(name)
+        if base is None:
+            regressions.append((name, current["p95_ms"], None))
+            continue
+        limit = max(base["p95_ms"] * tolerance, base["p95_ms"] + NOISE_MS)
+        if current["p95_ms"] > limit:
+            regressions.append((name, current["p95_ms"], base["p95_ms"]))
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Горячие пути базы и диаграмм без окна")
+    parser.add_argument("--db", help="готовая база (bench/generate.py); без неё — временная")
+    parser.add_argument("--operations", type=int, default=100_000)
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--out", help="куда записать JSON с результатами")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=1.5, help="допустимый рост p95, раз")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результат в --baseline")
+    args = parser.parse_args(argv)
+
+    import db
+
+    tmp = None
+    path = args.db
+    if path is None:
+        import generate
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "data.db")
+        repo = db.Repository(path)
+        repo.init_schema()
+        print("заполнение временной базы...", flush=True)
+        generate.generate(repo, args.categories, args.operations, args.seed)
+        repo.close()
+
+    db.DB_NAME = path
+    os.chdir(ROOT)
+    import main
+    import timeutil
+
+    repo = db.get_repo()
+    repo.init_schema()
+    meta = {
+        "operations": repo.conn.execute("SELECT COUNT(*) FROM operations").fetchone()[0],
+        "categories": len(repo.categories()),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+    }
+    paths = {}
+    for name, fn in hot_paths(repo, main, timeutil).items():
+        paths[name] = measure(fn, args.repeat)
+        print(f"{name}: p50 {paths[name]['p50_ms']:.2f} мс, p95 {paths[name]['p95_ms']:.2f} мс", flush=True)
+    db.close_repo()
+    if tmp is not None:
+        tmp.cleanup()
+
+    result = {"meta": meta, "peak_rss_mb": round(peak_rss_mb(), 1), "paths": paths}
+    print(f"операций: {meta['operations']}, категорий: {meta['categories']}, "
+          f"пиковый RSS: {result['peak_rss_mb']} МБ")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"база замеров записана: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(result, baseline, args.tolerance)
+    for name, current, base in regressions:
+        if base is None:
+            print(f"НЕТ В БАЗЕ {name}: перезапишите базу (--save-baseline)")
+        elif current is None:
+            print(f"НЕТ В ЗАМЕРЕ {name}: путь есть только в базе")
+        else:
+            print(f"РЕГРЕССИЯ {name}: p95 {current:.2f} мс (база {base:.2f} мс)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,79 @@
+# Проверка, что дерево виджетов не растёт при обходе категорий:
+# приложение открывает запись и историю для N категорий подряд и после
+# каждого перехода считает виджеты (main.widget_count) и RSS процесса.
+#
+#   python bench/screens.py --categories 50
+import argparse
+import os
+import resource
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux — килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Число виджетов при обходе категорий")
+    parser.add_argument("--categories", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.TemporaryDirectory()
+    import db
+    db.DB_NAME = os.path.join(tmp.name, "data.db")
+    os.chdir(ROOT)  # main.kv ищется относительно текущего каталога
+
+    import main
+    from kivy.clock import Clock
+
+    main.init_db()
+    repo = db.get_repo()
+    categories = [
+        (repo.add_category(f"Категория {i}", main.CATEGORY_COLORS[i % len(main.CATEGORY_COLORS)]),
+         f"Категория {i}")
+        for i in range(args.categories)
+    ]
+
+    app = main.MainApp()
+    counts = []
+    visits = iter(categories)
+
+    def visit(dt):
+        try:
+            cat_id, name = next(visits)
+        except StopIteration:
+            app.stop()
+            return
+        app.mode = "record"
+        app.category_selected(cat_id, name)
+        app.open_category_screen(cat_id, name)
+        app.mode = "history"
+        app.category_selected(cat_id, name)
+        Clock.schedule_once(lambda dt: measure(), 0.1)
+
+    def measure():
+        counts.append(main.widget_count(app.root))
+        Clock.schedule_once(visit, 0)
+
+    Clock.schedule_once(visit, 0.5)
+    app.run()
+    tmp.cleanup()
+
+    print(f"категорий обойдено: {len(counts)}")
+    print(f"виджетов после первой: {counts[0]}, после последней: {counts[-1]}, максимум: {max(counts)}")
+    print(f"пиковый RSS: {peak_rss_mb():.1f} МБ")
+    if max(counts) > counts[0]:
+        print("Дерево виджетов растёт с числом категорий")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,97 @@
+# Задержка полнотекстового поиска (Repository.search_page) на большой базе.
+# Создаёт (или берёт готовую) базу с N операциями — те же данные, что
+# bench/generate.py, — затем гоняет запросы «по мере ввода» — префиксы слов
+# длиной от 2 букв и пары слов — и сравнивает p95 первой и следующей
+# страницы с бюджетом одного кадра (16.7 мс при 60 FPS).
+#
+#   python bench/search.py                       # 1 000 000 операций во временной базе
+#   python bench/search.py --rows 200000
+#   python bench/search.py --db /tmp/search.db   # база сохраняется для повторных замеров
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+import generate  # noqa: E402
+
+FRAME_MS = 1000 / 60
+PAGE_SIZE = 50
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Задержка поиска по заметкам")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", help="путь к базе; если файл уже есть, он не перезаполняется")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args(argv)
+
+    tmp = None
+    path = args.db
+    if path is None:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "search.db")
+    existing = os.path.exists(path)
+
+    repo = db.Repository(path)
+    repo.init_schema()
+    rnd = random.Random(args.seed)
+    if existing:
+        vocab, merchants = generate.vocabulary(args.seed)
+    else:
+        vocab, merchants = generate.generate(
+            repo, 8, args.rows, args.seed,
+            progress=lambda done, total: print(f"\rзаполнение: {done}/{total}", end="", flush=True),
+        )
+        print()
+    count = repo.conn.execute("SELECT COUNT(*) FROM operations").fetchone()[0]
+
+    # запросы так, как их порождает ввод: префиксы растут по букве
+    queries = []
+    while len(queries) < args.queries:
+        word = rnd.choice(vocab + merchants)
+        queries.extend(word[:n] for n in range(2, len(word) + 1))
+        if rnd.random() < 0.3:
+            queries.append(f"{rnd.choice(merchants)} {rnd.choice(vocab)[:3]}")
+    queries = queries[:args.queries]
+
+    first, following = [], []
+    for query in queries:
+        t = time.perf_counter()
+        page = repo.search_page(query, limit=PAGE_SIZE)
+        first.append((time.perf_counter() - t) * 1000)
+        if len(page) == PAGE_SIZE:
+            t = time.perf_counter()
+            repo.search_page(query, after=page[-1].id, limit=PAGE_SIZE)
+            following.append((time.perf_counter() - t) * 1000)
+    repo.close()
+    if tmp is not None:
+        tmp.cleanup()
+
+    print(f"операций: {count}, запросов: {len(queries)}")
+    failed = False
+    for name, values in (("первая страница", first), ("следующая страница", following)):
+        if not values:
+            continue
+        p95 = percentile(values, 0.95)
+        verdict = "ok" if p95 <= FRAME_MS else "ДОЛЬШЕ КАДРА"
+        failed |= p95 > FRAME_MS
+        print(f"{name}: p50 {statistics.median(values):.2f} мс, p95 {p95:.2f} мс, "
+              f"max {max(values):.2f} мс (кадр {FRAME_MS:.1f} мс) — {verdict}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
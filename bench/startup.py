@@ -0,0 +1,129 @@
+# Замер холодного старта: время импорта main (python -X importtime)
+# и время до первого кадра окна. Сравнивает с bench/startup_budget.json
+# и завершается с кодом 1 при выходе за бюджет.
+#
+#   python bench/startup.py            # замер + проверка бюджета
+#   python bench/startup.py --runs 5   # медиана по 5 запускам
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(ROOT, "bench", "startup_budget.json")
+FIRST_FRAME_MARKER = "FIRST_FRAME"
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("KIVY_NO_ARGS", "1")
+    env.setdefault("KIVY_NO_CONSOLELOG", "1")
+    return env
+
+
+def measure_import():
+    # importtime пишет в stderr строки "self [us] | cumulative [us] | модуль"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=child_env(), capture_output=True, text=True, check=True,
+    )
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue  # заголовок таблицы
+        modules[parts[2].strip()] = cumulative
+    return modules["main"] / 1000, set(modules)
+
+
+def measure_first_frame(db_path):
+    # дочерний процесс запускает приложение и печатает маркер на первом flip окна
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", db_path],
+        cwd=ROOT, env=child_env(), stdout=subprocess.PIPE, text=True,
+    )
+    elapsed = None
+    for line in proc.stdout:
+        if line.strip() == FIRST_FRAME_MARKER:
+            elapsed = (time.perf_counter() - start) * 1000
+    proc.wait()
+    if elapsed is None:
+        raise RuntimeError("приложение не отрисовало первый кадр")
+    return elapsed
+
+
+def run_child(db_path):
+    sys.path.insert(0, ROOT)
+    import db
+    db.DB_NAME = db_path
+
+    import main
+    from kivy.clock import Clock
+    from kivy.core.window import Window
+
+    def on_flip(*args):
+        Window.unbind(on_flip=on_flip)
+        print(FIRST_FRAME_MARKER, flush=True)
+        Clock.schedule_once(lambda dt: main.App.get_running_app().stop(), 0)
+
+    Window.bind(on_flip=on_flip)
+    main.init_db()
+    main.MainApp().run()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Бюджет холодного старта CashPilot")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", metavar="DB", help=argparse.SUPPRESS)
+    parser.add_argument("--no-frame", action="store_true", help="только время импорта (без окна)")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child)
+        return 0
+
+    with open(BUDGET_FILE, encoding="utf-8") as f:
+        budget = json.load(f)
+
+    import_ms = []
+    imported = set()
+    for _ in range(args.runs):
+        ms, modules = measure_import()
+        import_ms.append(ms)
+        imported |= modules
+
+    result = {"import_main_ms": round(statistics.median(import_ms), 1)}
+    if not args.no_frame:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "data.db")
+            frames = [measure_first_frame(db_path) for _ in range(args.runs)]
+        result["first_frame_ms"] = round(statistics.median(frames), 1)
+
+    failures = []
+    for key, value in result.items():
+        limit = budget[key]
+        status = "ok" if value <= limit else "ПРЕВЫШЕН"
+        print(f"{key}: {value} мс (бюджет {limit} мс) — {status}")
+        if value > limit:
+            failures.append(key)
+
+    # тяжёлые модули не должны попадать в холодный старт
+    eager = sorted(m for m in budget["deferred_modules"] if m in imported)
+    if eager:
+        print("Импортируются при старте:", ", ".join(eager))
+        failures.append("deferred_modules")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
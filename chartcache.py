@@ -0,0 +1,74 @@
+import hashlib
+import os
+import threading
+
+# ---------------------------
+# Кэш диаграмм на диске
+# ---------------------------
+# Данные диаграмм, переживающие перезапуск: итоги главного экрана и ряд
+# баланса — по версии данных базы (meta 'data_version', её поднимают
+# триггеры записи). Ключ — любой кортеж с repr(); файл
+# называется по kind и хэшу ключа, так что устаревшие версии просто
+# перестают запрашиваться и вытесняются самыми старыми по времени
+# доступа, когда кэш превышает max_bytes.
+# Запись атомарная (временный файл + os.replace): оборванная запись не
+# оставит битого файла под рабочим именем.
+
+
+class ChartCache:
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, kind, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:24]
+        return os.path.join(self.directory, f"{kind}-{digest}.bin")
+
+    def get(self, kind, key):
+        path = self._path(kind, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # время доступа для вытеснения
+        except OSError:
+            pass
+        return data
+
+    def put(self, kind, key, data):
+        # кэш необязателен: без места на диске диаграмма просто не сохранится
+        path = self._path(kind, key)
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = path + ".part"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                self._evict()
+            except OSError:
+                return False
+        return True
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".bin"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            if not os.path.isdir(self.directory):
+                return
+            for entry in os.scandir(self.directory):
+                os.remove(entry.path)
@@ -0,0 +1,254 @@
+import math
+
+from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, Ellipse, Rectangle
+from kivy.graphics.texture import Texture
+from kivy.metrics import sp
+from kivy.uix.widget import Widget
+from kivy.utils import get_color_from_hex as HEX
+
+from profiler import timed
+
+
+# ---------------------------
+# RGBATexture — загрузка сырого RGBA-буфера в текстуру
+# ---------------------------
+# Текстура выделяется один раз на размер виджета, а каждый кадр
+# только перезаливается через blit_buffer прямо из memoryview.
+class RGBATexture:
+    def __init__(self):
+        self.texture = None
+
+    def upload(self, buf, size):
+        size = tuple(size)
+        if self.texture is None or self.texture.size != size:
+            self.texture = Texture.create(size=size, colorfmt='rgba')
+            self.texture.flip_vertical()  # Agg пишет строки сверху вниз
+        self.texture.blit_buffer(buf, colorfmt='rgba', bufferfmt='ubyte')
+        return self.texture
+
+
+# ---------------------------
+# PieCanvasChart — круговая диаграмма на инструкциях canvas
+# ---------------------------
+# Сектора — Ellipse с angle_start/angle_end, подписи — текстуры,
+# которые рендерятся один раз в start(). Кадр анимации только меняет
+# углы и позиции инструкций, без matplotlib и кодирования картинок.
+class PieCanvasChart(Widget):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.progress = 0
+        self.fps = 1 / 120
+        self.speed = 0.1
+        self.values = []
+        self.colors = []
+        self.labels = []
+        self._anim_event = None
+        self._wedges = []
+        self._texts = []
+        self.bind(pos=self._redraw, size=self._redraw)
+
+    def start(self, values, colors, labels, animate=True):
+        # animate=False — сразу конечное состояние (данные из кэша или те же,
+        # что уже были показаны)
+        # сохраняем данные
+        self.values = values
+        self.colors = colors
+        self.labels = labels
+
+        # сбрасываем анимацию
+        self.progress = 0
+        if self._anim_event:
+            self._anim_event.cancel()
+            self._anim_event = None
+
+        self._build()
+
+        if not animate:
+            self.progress = 1
+            self._redraw()
+            return
+
+        # запуск анимации
+        self._anim_event = Clock.schedule_interval(self._update, self.fps)
+
+    @timed()
+    def _update(self, dt):
+        if self.progress >= 1:
+            self.progress = 1
+            self._draw(self.progress)
+            return False  # стоп анимации
+
+        self._draw(self.progress)
+        self.progress += self.speed
+
+    def _redraw(self, *args):
+        if self._wedges:
+            self._draw(min(self.progress, 1))
+
+    def _build(self):
+        # инструкции создаются один раз на набор данных
+        self.canvas.clear()
+        self._wedges = []
+        self._texts = []
+        total = sum(self.values)
+        if not self.values or total == 0:
+            return
+
+        with self.canvas:
+            for color in self.colors:
+                Color(*HEX(color if color else '#1F1F1F'))
+                self._wedges.append(Ellipse(angle_start=0, angle_end=0))
+
+            Color(1, 1, 1, 1)
+            for label, value in zip(self.labels, self.values):
+                name = self._make_text(label, sp(11))
+                pct = self._make_text(f"{100 * value / total:.1f}%", sp(12))
+                self._texts.append((
+                    Rectangle(texture=name, size=name.size),
+                    Rectangle(texture=pct, size=pct.size),
+                ))
+
+    @staticmethod
+    def _make_text(text, font_size):
+        label = CoreLabel(
+            text=text, font_size=font_size, bold=True,
+            color=(1, 1, 1, 1), outline_width=1, outline_color=(0, 0, 0),
+        )
+        label.refresh()
+        return label.texture
+
+    def _draw(self, progress):
+        if not self._wedges:
+            return
+
+        total = sum(self.values)
+        radius = min(self.width, self.height) / 2
+        cx, cy = self.center
+        pos = (cx - radius, cy - radius)
+        size = (radius * 2, radius * 2)
+
+        # углы Kivy отсчитываются от 12 часов по часовой стрелке —
+        # как startangle=90, counterclock=False у matplotlib
+        angle = 0.0
+        for i, wedge in enumerate(self._wedges):
+            sweep = 360.0 * self.values[i] / total * progress
+            wedge.pos = pos
+            wedge.size = size
+            wedge.angle_start = angle
+            wedge.angle_end = angle + sweep
+
+            # подписи в середине сектора на 0.65 радиуса
+            mid = math.radians(angle + sweep / 2)
+            x = cx + 0.65 * radius * math.sin(mid)
+            y = cy + 0.65 * radius * math.cos(mid)
+            name, pct = self._texts[i]
+            name.pos = (x - name.size[0] / 2, y + 0.07 * radius - name.size[1] / 2)
+            pct.pos = (x - pct.size[0] / 2, y - 0.08 * radius - pct.size[1] / 2)
+
+            angle += sweep
+
+
+# ---------------------------
+# BarCanvasChart — столбики доходов и расходов по корзинам времени
+# ---------------------------
+# Как и PieCanvasChart: инструкции создаются один раз в start(), кадр
+# анимации только меняет высоту прямоугольников. Число инструкций
+# пропорционально числу корзин на экране, а не числу операций.
+class BarCanvasChart(Widget):
+    income_color = '#2ECC71'
+    expense_color = '#D64545'
+    max_labels = 6  # подписей по оси X не больше этого числа
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.progress = 0
+        self.fps = 1 / 120
+        self.speed = 0.1
+        self.labels = []
+        self.incomes = []
+        self.expenses = []
+        self._anim_event = None
+        self._bars = []
+        self._axis_labels = []
+        self._baseline = None
+        self.bind(pos=self._redraw, size=self._redraw)
+
+    def start(self, labels, incomes, expenses):
+        self.labels = labels
+        self.incomes = incomes
+        self.expenses = expenses
+
+        self.progress = 0
+        if self._anim_event:
+            self._anim_event.cancel()
+
+        self._build()
+        self._anim_event = Clock.schedule_interval(self._update, self.fps)
+
+    @timed()
+    def _update(self, dt):
+        if self.progress >= 1:
+            self.progress = 1
+            self._draw(self.progress)
+            return False
+
+        self._draw(self.progress)
+        self.progress += self.speed
+
+    def _redraw(self, *args):
+        if self._bars:
+            self._draw(min(self.progress, 1))
+
+    def _build(self):
+        self.canvas.clear()
+        self._bars = []
+        self._axis_labels = []
+        if not self.labels:
+            return
+
+        step = max(1, math.ceil(len(self.labels) / self.max_labels))
+        with self.canvas:
+            Color(0.6, 0.6, 0.6, 1)
+            self._baseline = Rectangle()
+            for color, values in ((self.income_color, self.incomes), (self.expense_color, self.expenses)):
+                Color(*HEX(color))
+                self._bars.append([Rectangle() for _ in values])
+
+            Color(0.3, 0.3, 0.3, 1)
+            for i in range(0, len(self.labels), step):
+                texture = self._make_text(self.labels[i], sp(10))
+                self._axis_labels.append((i, Rectangle(texture=texture, size=texture.size)))
+
+    @staticmethod
+    def _make_text(text, font_size):
+        label = CoreLabel(text=text, font_size=font_size)
+        label.refresh()
+        return label.texture
+
+    def _draw(self, progress):
+        if not self._bars:
+            return
+
+        count = len(self.labels)
+        label_height = sp(16)
+        x0, y0 = self.x, self.y + label_height
+        height = max(self.height - label_height, 1)
+        slot = self.width / count
+        bar = slot * 0.4
+        top = max(max(self.incomes, default=0), max(self.expenses, default=0)) or 1
+
+        self._baseline.pos = (x0, y0 - 1)
+        self._baseline.size = (self.width, 1)
+
+        # доход — левый столбик в слоте, расход — правый
+        for offset, rects, values in ((0.1, self._bars[0], self.incomes), (0.5, self._bars[1], self.expenses)):
+            for i, (rect, value) in enumerate(zip(rects, values)):
+                rect.pos = (x0 + slot * i + slot * offset, y0)
+                rect.size = (bar, height * value / top * progress)
+
+        for i, rect in self._axis_labels:
+            w, h = rect.size
+            cx = x0 + slot * (i + 0.5)
+            rect.pos = (min(max(cx - w / 2, self.x), self.right - w), self.y)
@@ -0,0 +1,708 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import migrations
+import profiler
+
+DB_NAME = "data.db"
+
+# Настройки соединения: WAL + synchronous=NORMAL дают дешёвые коммиты,
+# кэш страниц и mmap живут столько же, сколько само соединение
+PRAGMAS = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -8000;",      # ~8 МБ кэша страниц
+    "PRAGMA mmap_size = 67108864;",    # 64 МБ
+    "PRAGMA temp_store = MEMORY;",
+)
+
+# sqlite3 кэширует подготовленные запросы по тексту SQL,
+# поэтому все запросы — константы модуля
+STATEMENT_CACHE_SIZE = 64
+
+
+class Category(NamedTuple):
+    id: int
+    name: str
+    color: str
+
+
+class Operation(NamedTuple):
+    id: int
+    amount_cents: int
+    type: str
+    created_ts: int  # секунды Unix, UTC
+
+
+class StoredOperation(NamedTuple):
+    # операция вместе с категорией — то, что нужно экранам, чтобы поправить
+    # свои списки и итоги после записи без нового запроса
+    id: int
+    category_id: int
+    amount_cents: int
+    type: str
+    created_ts: int
+
+
+class CategorySummary(NamedTuple):
+    op_count: int
+    income_cents: int
+    expense_cents: int
+
+
+class ExportRow(NamedTuple):
+    id: int
+    category: str
+    amount_cents: int
+    type: str
+    created_ts: int
+    note: Optional[str]
+    merchant: Optional[str]
+
+
+class SearchResult(NamedTuple):
+    id: int
+    amount_cents: int
+    type: str
+    created_ts: int
+    note: Optional[str]
+    merchant: Optional[str]
+    category: str
+
+
+class TrendPoint(NamedTuple):
+    bucket: str  # 'ГГГГ-ММ-ДД' или 'ГГГГ-ММ'
+    income_cents: int
+    expense_cents: int
+
+
+class CategoryTotals(NamedTuple):
+    category_id: int
+    name: str
+    color: str
+    income_cents: int
+    expense_cents: int
+
+
+class ArchiveInfo(NamedTuple):
+    year: int
+    file: str  # имя файла рядом с основной базой
+    min_ts: int
+    max_ts: int
+    min_id: int
+    max_id: int
+    op_count: int
+
+
+SQL_CATEGORIES = "SELECT id, name, color FROM categories ORDER BY id"
+SQL_CATEGORY_EXISTS = "SELECT 1 FROM categories WHERE name = ?"
+SQL_INSERT_CATEGORY = "INSERT INTO categories (name, color) VALUES (?, ?)"
+SQL_DELETE_CATEGORY = "DELETE FROM categories WHERE id = ?"
+# created_at дублирует created_ts строкой в UTC для внешних инструментов
+SQL_INSERT_OPERATION = (
+    "INSERT INTO operations(category_id, amount_cents, type, created_ts, created_at, note, merchant) "
+    "VALUES (?1, ?2, ?3, ?4, datetime(?4, 'unixepoch'), ?5, ?6)"
+)
+# ключ, уже импортированный и перенесённый в архив, тоже дубль
+SQL_IMPORT_OPERATION = (
+    "INSERT OR IGNORE INTO operations"
+    "(category_id, amount_cents, type, created_ts, created_at, import_key, note, merchant) "
+    "SELECT ?1, ?2, ?3, ?4, datetime(?4, 'unixepoch'), ?5, ?6, ?7 "
+    "WHERE NOT EXISTS (SELECT 1 FROM archived_import_keys WHERE import_key = ?5)"
+)
+SQL_INSERT_CATEGORY_IF_MISSING = "INSERT OR IGNORE INTO categories (name, color) VALUES (?, ?)"
+SQL_CATEGORY_ID = "SELECT id FROM categories WHERE name = ?"
+# запись из журнала отложенной записи: повтор того же entry_uuid пропускается,
+# запись в уже удалённую категорию не вставляется (нарушение внешнего
+# ключа иначе сорвало бы всю пачку) — её возвращает add_journal_operations
+SQL_INSERT_JOURNAL_OPERATION = (
+    "INSERT OR IGNORE INTO operations"
+    "(category_id, amount_cents, type, created_ts, created_at, note, merchant, entry_uuid) "
+    "SELECT ?1, ?2, ?3, ?4, datetime(?4, 'unixepoch'), ?5, ?6, ?7 "
+    "WHERE EXISTS (SELECT 1 FROM categories WHERE id = ?1)"
+)
+SQL_JOURNAL_ENTRY_EXISTS = "SELECT 1 FROM operations WHERE entry_uuid = ?"
+SQL_DELETE_OPERATION = "DELETE FROM operations WHERE id=?"
+SQL_OPERATION_BY_ID = "SELECT id, category_id, amount_cents, type, created_ts FROM operations WHERE id=?"
+# data_version растёт при каждом изменении операций и категорий (триггеры
+# миграции 9), data_id отличает один файл базы от другого
+SQL_DATA_VERSION = (
+    "SELECT (SELECT value FROM meta WHERE key = 'data_id'),"
+    " (SELECT value FROM meta WHERE key = 'data_version')"
+)
+# постраничная история: ключ страницы — (created_ts, id) последней строки,
+# так что каждая страница — диапазонное чтение индекса без OFFSET
+SQL_HISTORY_FIRST_PAGE = """
+    SELECT id, amount_cents, type, created_ts
+    FROM operations
+    WHERE category_id=?
+    ORDER BY created_ts DESC, id DESC
+    LIMIT ?
+"""
+SQL_HISTORY_NEXT_PAGE = """
+    SELECT id, amount_cents, type, created_ts
+    FROM operations
+    WHERE category_id=? AND (created_ts, id) < (?, ?)
+    ORDER BY created_ts DESC, id DESC
+    LIMIT ?
+"""
+SQL_CATEGORY_SUMMARY = """
+    SELECT op_count, income_cents, expense_cents
+    FROM category_totals
+    WHERE category_id=?
+"""
+SQL_CATEGORY_TOTALS = """
+    SELECT c.id, c.name, c.color, t.income_cents, t.expense_cents
+    FROM categories c
+    JOIN category_totals t ON t.category_id = c.id
+    ORDER BY c.id
+"""
+# итоги категории за период [since, until) — диапазон idx_operations_history
+# по (category_id, created_ts), без чтения таблицы. Запрос на категорию,
+# а не JOIN с GROUP BY: у соединения план зависит от статистики и
+# может уйти в перебор всего индекса с временной сортировкой
+SQL_CATEGORY_PERIOD_TOTALS = """
+    SELECT COALESCE(SUM(CASE WHEN type='доход' THEN amount_cents END), 0),
+           COALESCE(SUM(CASE WHEN type='расход' THEN -amount_cents END), 0)
+    FROM operations
+    WHERE category_id=? AND created_ts >= ? AND created_ts < ?
+"""
+# выгрузка: по одной категории за раз, чтобы каждая выборка была
+# диапазонным чтением idx_operations_history без временной сортировки.
+# note и merchant в индекс не входят — за ними идём в строку таблицы
+SQL_EXPORT_OPERATIONS = """
+    SELECT o.id, c.name, o.amount_cents, o.type, o.created_ts, o.note, o.merchant
+    FROM operations o
+    JOIN categories c ON c.id = o.category_id
+    WHERE o.category_id=? AND o.created_ts >= ? AND o.created_ts < ?
+    ORDER BY o.created_ts, o.id
+"""
+# динамика по корзинам — только таблицы category_daily/category_monthly;
+# все категории — по индексу (корзина, суммы), одна — по первичному ключу
+_TREND_ALL = """
+    SELECT {key}, SUM(income_cents), SUM(expense_cents)
+    FROM {table}
+    WHERE {key} >= ? AND {key} < ?
+    GROUP BY {key}
+    ORDER BY {key}
+"""
+_TREND_CATEGORY = """
+    SELECT {key}, income_cents, expense_cents
+    FROM {table}
+    WHERE category_id=? AND {key} >= ? AND {key} < ?
+    ORDER BY {key}
+"""
+SQL_TREND = {
+    (granularity, scope): sql.format(table=table, key=key)
+    for granularity, table, key in (("day", "category_daily", "day"), ("month", "category_monthly", "month"))
+    for scope, sql in (("all", _TREND_ALL), ("category", _TREND_CATEGORY))
+}
+# суммы со временем для графика баланса; для всех категорий порядок не
+# задаём (без сортировки в SQLite), упорядочивает вызывающий
+SQL_AMOUNTS_ALL = "SELECT created_ts, amount_cents FROM operations WHERE created_ts IS NOT NULL"
+SQL_AMOUNTS_CATEGORY = """
+    SELECT created_ts, amount_cents
+    FROM operations
+    WHERE category_id=? AND created_ts IS NOT NULL
+    ORDER BY created_ts, id
+"""
+# поиск по заметкам и получателю: новые операции первыми, страница —
+# по rowid последней строки. Порядок по rowid FTS5 отдаёт сам, без
+# сортировки всех совпадений, так что первая страница не зависит от их числа
+_SQL_SEARCH = """
+    SELECT o.id, o.amount_cents, o.type, o.created_ts, o.note, o.merchant, c.name
+    FROM operations_fts f
+    JOIN operations o ON o.id = f.rowid
+    JOIN categories c ON c.id = o.category_id
+    WHERE operations_fts MATCH ?{after}
+    ORDER BY f.rowid DESC
+    LIMIT ?
+"""
+SQL_SEARCH_FIRST_PAGE = _SQL_SEARCH.format(after="")
+SQL_SEARCH_NEXT_PAGE = _SQL_SEARCH.format(after=" AND f.rowid < ?")
+
+# (название, запрос, параметры, индекс, который обязан быть в плане)
+QUERY_PLAN_CHECKS = (
+    ("history", SQL_HISTORY_FIRST_PAGE, (1, 50), "COVERING INDEX idx_operations_history"),
+    ("history_page", SQL_HISTORY_NEXT_PAGE, (1, 1704067200, 1, 50),
+     "COVERING INDEX idx_operations_history"),
+    ("totals", SQL_CATEGORY_TOTALS, (), "SEARCH t USING INTEGER PRIMARY KEY"),
+    ("period_totals", SQL_CATEGORY_PERIOD_TOTALS, (1, 1704067200, 1706745600),
+     "COVERING INDEX idx_operations_history"),
+    ("export", SQL_EXPORT_OPERATIONS, (1, 1704067200, 1735689600),
+     "USING INDEX idx_operations_history"),
+    ("trend_days", SQL_TREND["day", "all"], ("2024-01-01", "2024-02-01"),
+     "COVERING INDEX idx_category_daily_day"),
+    ("trend_months", SQL_TREND["month", "all"], ("2023-01", "2024-01"),
+     "COVERING INDEX idx_category_monthly_month"),
+    ("trend_category_days", SQL_TREND["day", "category"], (1, "2024-01-01", "2024-02-01"),
+     "SEARCH category_daily USING PRIMARY KEY"),
+    ("amounts_category", SQL_AMOUNTS_CATEGORY, (1,), "COVERING INDEX idx_operations_history"),
+    ("search", SQL_SEARCH_NEXT_PAGE, ('"кофе"*', 1000, 50), "SEARCH o USING INTEGER PRIMARY KEY"),
+)
+
+# ---------------------------
+# Архив прошлых лет (archive.py)
+# ---------------------------
+# Файл архива подключается через ATTACH как archive_<год> и содержит ту же
+# таблицу operations с тем же индексом истории, поэтому запросы к нему —
+# те же запросы основной базы с {schema}.operations вместо operations.
+# Подключено одновременно не больше MAX_ATTACHED_ARCHIVES файлов
+# (SQLite по умолчанию допускает 10), дольше всех не нужные отключаются.
+MAX_ATTACHED_ARCHIVES = 6
+# архивов в одном запросе страницы истории: страница обычно умещается
+# в один год или захватывает границу двух
+HISTORY_UNION_ARCHIVES = 2
+
+
+def in_archive(sql):
+    return sql.replace("FROM operations", "FROM {schema}.operations")
+
+
+SQL_ARCHIVES = "SELECT year, file, min_ts, max_ts, min_id, max_id, op_count FROM archives ORDER BY year DESC"
+SQL_ARCHIVE_STATS = "SELECT MIN(created_ts), MAX(created_ts), MIN(id), MAX(id), COUNT(*) FROM {schema}.operations"
+SQL_UPDATE_ARCHIVE = "UPDATE archives SET min_ts=?, max_ts=?, min_id=?, max_id=?, op_count=? WHERE year=?"
+SQL_ARCHIVE_COUNT_DOWN = "UPDATE archives SET op_count = op_count - 1 WHERE year=?"
+SQL_SET_ARCHIVING = "UPDATE meta SET value = ? WHERE key = 'archiving'"
+# ветка истории одного источника; ветки объединяются UNION ALL, каждая —
+# своя страница по индексу, общий порядок и LIMIT — поверх них
+SQL_HISTORY_BRANCH = "SELECT * FROM (" + in_archive(SQL_HISTORY_NEXT_PAGE) + ")"
+SQL_HISTORY_UNION_ORDER = " ORDER BY created_ts DESC, id DESC LIMIT ?"
+SQL_ARCHIVE_PERIOD_TOTALS = in_archive(SQL_CATEGORY_PERIOD_TOTALS)
+SQL_ARCHIVE_EXPORT = in_archive(SQL_EXPORT_OPERATIONS)
+SQL_ARCHIVE_AMOUNTS_ALL = in_archive(SQL_AMOUNTS_ALL)
+SQL_ARCHIVE_AMOUNTS_CATEGORY = in_archive(SQL_AMOUNTS_CATEGORY)
+SQL_ARCHIVE_OPERATION = (
+    "SELECT id, category_id, amount_cents, type, created_at, created_ts, note, merchant "
+    "FROM {schema}.operations WHERE id=?"
+)
+SQL_ARCHIVE_DELETE_OPERATION = "DELETE FROM {schema}.operations WHERE id=?"
+SQL_ARCHIVE_DELETE_CATEGORY = "DELETE FROM {schema}.operations WHERE category_id=?"
+# удалённая из архива операция снова может прийти с импортом выписки
+SQL_FORGET_ARCHIVED_KEY = (
+    "DELETE FROM archived_import_keys WHERE import_key = "
+    "(SELECT import_key FROM {schema}.operations WHERE id=?)"
+)
+SQL_FORGET_ARCHIVED_CATEGORY_KEYS = (
+    "DELETE FROM archived_import_keys WHERE import_key IN "
+    "(SELECT import_key FROM {schema}.operations WHERE category_id=? AND import_key IS NOT NULL)"
+)
+# архивная операция на время удаления возвращается в основную таблицу
+# (без import_key и entry_uuid — с ними она могла бы столкнуться
+# с более поздним импортом той же строки)
+SQL_RESTORE_OPERATION = (
+    "INSERT INTO operations(id, category_id, amount_cents, type, created_at, created_ts, note, merchant) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# границы created_ts «без ограничения»
+MIN_TS = -(2 ** 62)
+MAX_TS = 2 ** 62
+
+
+class Repository:
+    """Единственное долгоживущее соединение с базой и типизированные запросы к ней."""
+
+    def __init__(self, path=DB_NAME):
+        self.path = path
+        self.conn = sqlite3.connect(
+            path,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+            factory=profiler.connection_factory(),
+        )
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+        self.lock = threading.RLock()
+        self._attached = OrderedDict()  # год -> имя схемы подключённого архива
+
+    def close(self):
+        with self.lock:
+            # обновляет статистику планировщика, если она устарела
+            self.conn.execute("PRAGMA optimize;")
+            self.conn.close()
+
+    def vacuum(self):
+        with self.lock:
+            self.conn.execute("VACUUM")
+
+    # --- схема ---
+    def init_schema(self):
+        with self.lock:
+            return migrations.migrate(self.conn)
+
+    def check_query_plans(self):
+        # возвращает список проблем; пустой список — все горячие запросы
+        # идут по индексу без полного сканирования и временной сортировки
+        problems = []
+        with self.lock:
+            for name, sql, params, expected in QUERY_PLAN_CHECKS:
+                plan = [row[3] for row in self.conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+                text = "\n".join(plan)
+                if expected not in text:
+                    problems.append(f"{name}: ожидался '{expected}', план:\n{text}")
+                for step in plan:
+                    full_scan = step.startswith(("SCAN o", "SCAN operations"))
+                    if full_scan or "USE TEMP B-TREE" in step:
+                        problems.append(f"{name}: '{step}' в плане:\n{text}")
+        return problems
+
+    # --- категории ---
+    def categories(self):
+        with self.lock:
+            rows = self.conn.execute(SQL_CATEGORIES).fetchall()
+        return [Category(*r) for r in rows]
+
+    def add_category(self, name, color) -> int:
+        with self.lock, self.conn:
+            return self.conn.execute(SQL_INSERT_CATEGORY, (name, color)).lastrowid
+
+    def add_category_if_missing(self, name, color):
+        # проверка и вставка в одной транзакции; None — имя уже занято
+        with self.lock, self.conn:
+            if self.conn.execute(SQL_CATEGORY_EXISTS, (name,)).fetchone() is not None:
+                return None
+            return self.conn.execute(SQL_INSERT_CATEGORY, (name, color)).lastrowid
+
+    def ensure_category(self, name, color) -> int:
+        # id категории по имени, с созданием при отсутствии
+        with self.lock, self.conn:
+            self.conn.execute(SQL_INSERT_CATEGORY_IF_MISSING, (name, color))
+            return self.conn.execute(SQL_CATEGORY_ID, (name,)).fetchone()[0]
+
+    def delete_category(self, category_id):
+        with self.lock:
+            with self.conn:
+                self.conn.execute(SQL_DELETE_CATEGORY, (category_id,))
+            # в основной базе операции удалил ON DELETE CASCADE, в архивах —
+            # вручную; итоги категории каскад уже убрал целиком
+            for archive in self.archives():
+                schema = self._attach_existing(archive)
+                if schema is None:
+                    continue
+                with self.conn:
+                    self.conn.execute(SQL_FORGET_ARCHIVED_CATEGORY_KEYS.format(schema=schema), (category_id,))
+                    deleted = self.conn.execute(
+                        SQL_ARCHIVE_DELETE_CATEGORY.format(schema=schema), (category_id,)
+                    ).rowcount
+                if deleted:
+                    self.update_archive_stats(archive.year)
+
+    # --- операции ---
+    def history_page(self, category_id, after=None, limit=50):
+        # after — (created_ts, id) последней строки предыдущей страницы
+        with self.lock:
+            if after is None:
+                rows = self.conn.execute(SQL_HISTORY_FIRST_PAGE, (category_id, limit)).fetchall()
+            else:
+                rows = self.conn.execute(
+                    SQL_HISTORY_NEXT_PAGE, (category_id, after[0], after[1], limit)
+                ).fetchall()
+            # архивы нужны, только если их строки попадают на эту страницу:
+            # старше after и не старше последней строки полной страницы
+            upper = MAX_TS if after is None else after[0]
+            lower = rows[-1][3] if len(rows) == limit else MIN_TS
+            archives = [a for a in self.archives() if a.op_count and a.min_ts <= upper and a.max_ts >= lower]
+            if archives:
+                rows = self._history_union(category_id, after, limit, archives)
+        return [Operation(*r) for r in rows]
+
+    def _history_union(self, category_id, after, limit, archives):
+        # основная база и ближайшие архивы одним UNION ALL; если страница не
+        # заполнилась, следующие (более старые годы) добираются по
+        # HISTORY_UNION_ARCHIVES за запрос — лишние годы не подключаются
+        key = (MAX_TS, MAX_TS) if after is None else tuple(after)
+        sources = ["main"]
+        rows = []
+        while True:
+            chunk = archives[:HISTORY_UNION_ARCHIVES]
+            archives = archives[HISTORY_UNION_ARCHIVES:]
+            sources += [s for s in map(self._attach_existing, chunk) if s is not None]
+            if sources:
+                sql = " UNION ALL ".join(SQL_HISTORY_BRANCH.format(schema=s) for s in sources)
+                params = (category_id, key[0], key[1], limit) * len(sources) + (limit,)
+                rows += self.conn.execute(sql + SQL_HISTORY_UNION_ORDER, params).fetchall()
+                rows = sorted(rows, key=lambda r: (r[3], r[0]), reverse=True)[:limit]
+            if len(rows) == limit:
+                # полная страница: нужны только архивы, чьи строки новее последней
+                archives = [a for a in archives if a.max_ts >= rows[-1][3]]
+            if not archives:
+                return rows
+            sources = []
+
+    def category_summary(self, category_id):
+        # количество и суммы из category_totals — без чтения самих операций
+        with self.lock:
+            row = self.conn.execute(SQL_CATEGORY_SUMMARY, (category_id,)).fetchone()
+        return CategorySummary(*row) if row else CategorySummary(0, 0, 0)
+
+    def add_operation(self, category_id, amount_cents, type_op, created_ts,
+                      note=None, merchant=None) -> int:
+        with self.lock, self.conn:
+            cur = self.conn.execute(
+                SQL_INSERT_OPERATION,
+                (category_id, amount_cents, type_op, created_ts, note or None, merchant or None),
+            )
+            return cur.lastrowid
+
+    def import_operations(self, rows) -> int:
+        # rows: (category_id, amount_cents, type, created_ts, import_key, note, merchant);
+        # одна транзакция на пачку, уже импортированные ключи пропускаются.
+        # rowcount у executemany не учитывает изменения из триггеров
+        with self.lock, self.conn:
+            return self.conn.executemany(SQL_IMPORT_OPERATION, rows).rowcount
+
+    def add_journal_operations(self, records):
+        # records — journal.JournalRecord; одна транзакция на пачку.
+        # Возвращает (StoredOperation вставленных, записи, которые не легли:
+        # категории уже нет); уже вставленные прежде — ни там, ни там
+        with self.lock, self.conn:
+            added, rejected = [], []
+            for r in records:
+                cur = self.conn.execute(SQL_INSERT_JOURNAL_OPERATION, (
+                    r.category_id, r.amount_cents, r.type, r.created_ts,
+                    r.note or None, r.merchant or None, r.uuid,
+                ))
+                if cur.rowcount == 1:
+                    added.append(StoredOperation(
+                        cur.lastrowid, r.category_id, r.amount_cents, r.type, r.created_ts,
+                    ))
+                elif self.conn.execute(SQL_JOURNAL_ENTRY_EXISTS, (r.uuid,)).fetchone() is None:
+                    rejected.append(r)
+        return added, rejected
+
+    def delete_operation(self, op_id) -> Optional[StoredOperation]:
+        # возвращает удалённую операцию (None, если её уже нет)
+        with self.lock:
+            with self.conn:
+                row = self.conn.execute(SQL_OPERATION_BY_ID, (op_id,)).fetchone()
+                self.conn.execute(SQL_DELETE_OPERATION, (op_id,))
+            if row is None:
+                return self._delete_archived_operation(op_id)
+        return StoredOperation(*row)
+
+    def _delete_archived_operation(self, op_id):
+        # Операция из архива: её вклад в итогах и корзинах, а снять его умеют
+        # только триггеры основной таблицы. Поэтому строка возвращается
+        # в operations при archiving = 1 (итоги не трогаются) и удаляется
+        # обычным DELETE. Сначала строка удаляется из архива: падение между
+        # двумя коммитами оставит лишний вклад в итогах (его убирает
+        # manage.py rebuild-totals / rebuild-rollups), но не двойной вычет.
+        for archive in self.archives():
+            if not archive.op_count or not archive.min_id <= op_id <= archive.max_id:
+                continue
+            schema = self._attach_existing(archive)
+            if schema is None:
+                continue
+            row = self.conn.execute(SQL_ARCHIVE_OPERATION.format(schema=schema), (op_id,)).fetchone()
+            if row is None:
+                continue
+            with self.conn:
+                self.conn.execute(SQL_FORGET_ARCHIVED_KEY.format(schema=schema), (op_id,))
+                self.conn.execute(SQL_ARCHIVE_DELETE_OPERATION.format(schema=schema), (op_id,))
+            with self.conn:
+                self.conn.execute(SQL_SET_ARCHIVING, (1,))
+                self.conn.execute(SQL_RESTORE_OPERATION, row)
+                self.conn.execute(SQL_SET_ARCHIVING, (0,))
+                self.conn.execute(SQL_DELETE_OPERATION, (op_id,))
+                # границы min/max остаются верными и без пересчёта
+                self.conn.execute(SQL_ARCHIVE_COUNT_DOWN, (archive.year,))
+            op_id, category_id, amount_cents, type_op, _, created_ts, _, _ = row
+            return StoredOperation(op_id, category_id, amount_cents, type_op, created_ts)
+        return None
+
+    def iter_operations(self, category_ids=None, since=MIN_TS, until=MAX_TS, batch_size=5000):
+        # генератор пачек ExportRow: since включительно, until — нет.
+        # В памяти одновременно только одна пачка; блокировка берётся на
+        # каждый fetchmany, а не на всю выгрузку, чтобы не держать UI.
+        # Внутри категории сначала архивы по годам, затем основная база
+        if category_ids is None:
+            category_ids = [c.id for c in self.categories()]
+        archives = [a for a in reversed(self.archives()) if a.op_count and a.min_ts < until and a.max_ts >= since]
+        for category_id in category_ids:
+            for archive in archives:
+                schema = self._attach_existing(archive)
+                if schema is not None:
+                    for rows in self._batches(SQL_ARCHIVE_EXPORT.format(schema=schema),
+                                              (category_id, since, until), batch_size):
+                        yield [ExportRow(*r) for r in rows]
+            for rows in self._batches(SQL_EXPORT_OPERATIONS, (category_id, since, until), batch_size):
+                yield [ExportRow(*r) for r in rows]
+
+    def iter_amounts(self, category_id=None, batch_size=50000):
+        # пачки (created_ts, amount_cents) для графика баланса, включая архивы
+        if category_id is None:
+            sql, archive_sql, params = SQL_AMOUNTS_ALL, SQL_ARCHIVE_AMOUNTS_ALL, ()
+        else:
+            sql, archive_sql, params = SQL_AMOUNTS_CATEGORY, SQL_ARCHIVE_AMOUNTS_CATEGORY, (category_id,)
+        for archive in reversed(self.archives()):
+            schema = self._attach_existing(archive) if archive.op_count else None
+            if schema is not None:
+                yield from self._batches(archive_sql.format(schema=schema), params, batch_size)
+        yield from self._batches(sql, params, batch_size)
+
+    def _batches(self, sql, params, batch_size):
+        # курсор читается пачками; блокировка берётся на каждый fetchmany
+        with self.lock:
+            cur = self.conn.execute(sql, params)
+        try:
+            while True:
+                with self.lock:
+                    rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+    # --- данные для диаграмм ---
+    def data_version(self):
+        # (data_id, data_version): пока он тот же, содержимое не менялось
+        with self.lock:
+            return tuple(self.conn.execute(SQL_DATA_VERSION).fetchone())
+
+    def category_totals(self):
+        # доходы и расходы всех категорий одним запросом по таблице итогов
+        with self.lock:
+            rows = self.conn.execute(SQL_CATEGORY_TOTALS).fetchall()
+        return [CategoryTotals(*r) for r in rows]
+
+    def period_totals(self, since=None, until=None):
+        # то же, что category_totals, но за [since, until) в секундах Unix;
+        # без границ — готовые итоги из category_totals
+        if since is None and until is None:
+            return self.category_totals()
+        since = MIN_TS if since is None else since
+        until = MAX_TS if until is None else until
+        totals = []
+        with self.lock:
+            # архивы подключаются, только если период заходит в их годы
+            schemas = [self._attach_existing(a) for a in self.archives()
+                       if a.op_count and a.min_ts < until and a.max_ts >= since]
+            queries = [SQL_CATEGORY_PERIOD_TOTALS] + [
+                SQL_ARCHIVE_PERIOD_TOTALS.format(schema=s) for s in schemas if s is not None
+            ]
+            for c in self.categories():
+                income = expense = 0
+                for sql in queries:
+                    i, e = self.conn.execute(sql, (c.id, since, until)).fetchone()
+                    income, expense = income + i, expense + e
+                totals.append(CategoryTotals(c.id, c.name, c.color, income, expense))
+        return totals
+
+    def rebuild_category_totals(self):
+        self._rebuild(migrations.rebuild_category_totals, migrations.add_category_totals)
+
+    # --- поиск ---
+    def search_page(self, query, after=None, limit=50):
+        # query — строка пользователя; after — id последней строки
+        # предыдущей страницы. Пустой запрос — пустой ответ
+        match = fts_query(query)
+        if not match:
+            return []
+        with self.lock:
+            if after is None:
+                rows = self.conn.execute(SQL_SEARCH_FIRST_PAGE, (match, limit)).fetchall()
+            else:
+                rows = self.conn.execute(SQL_SEARCH_NEXT_PAGE, (match, after, limit)).fetchall()
+        return [SearchResult(*r) for r in rows]
+
+    def rebuild_search_index(self):
+        with self.lock, self.conn:
+            migrations.rebuild_search_index(self.conn)
+
+    # --- динамика по дням и месяцам ---
+    def trend(self, granularity, since, until, category_id=None):
+        # granularity — "day" или "month"; since/until — ключи корзин
+        # ('ГГГГ-ММ-ДД' / 'ГГГГ-ММ'), since включительно, until — нет.
+        # Пустые корзины в ответ не попадают
+        with self.lock:
+            if category_id is None:
+                rows = self.conn.execute(SQL_TREND[granularity, "all"], (since, until)).fetchall()
+            else:
+                rows = self.conn.execute(
+                    SQL_TREND[granularity, "category"], (category_id, since, until)
+                ).fetchall()
+        return [TrendPoint(*r) for r in rows]
+
+    def rebuild_rollups(self):
+        self._rebuild(migrations.rebuild_rollups, migrations.add_rollups)
+
+    def _rebuild(self, rebuild, add):
+        # пересчёт по основной базе и затем вклад каждого архива — отдельными
+        # транзакциями, потому что ATTACH внутри транзакции запрещён;
+        # прерванный пересчёт просто запускают снова
+        with self.lock:
+            with self.conn:
+                rebuild(self.conn)
+            for archive in self.archives():
+                schema = self._attach_existing(archive) if archive.op_count else None
+                if schema is not None:
+                    with self.conn:
+                        add(self.conn, f"{schema}.operations")
+
+    # --- архив прошлых лет ---
+    def archives(self):
+        # от новых лет к старым
+        with self.lock:
+            return [ArchiveInfo(*r) for r in self.conn.execute(SQL_ARCHIVES)]
+
+    def archive_path(self, file):
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)), file)
+
+    def attach_archive(self, year, file):
+        # имя схемы архива; вне транзакции — ATTACH внутри неё запрещён.
+        # Несуществующий файл SQLite создаст пустым
+        with self.lock:
+            schema = f"archive_{year}"
+            if year in self._attached:
+                self._attached.move_to_end(year)
+                return schema
+            while len(self._attached) >= MAX_ATTACHED_ARCHIVES:
+                old_year, old_schema = self._attached.popitem(last=False)
+                self.conn.execute(f"DETACH DATABASE {old_schema}")
+            self.conn.execute(f"ATTACH DATABASE ? AS {schema}", (self.archive_path(file),))
+            self._attached[year] = schema
+            return schema
+
+    def _attach_existing(self, archive):
+        # для чтения: пропавший файл архива пропускается, а не создаётся пустым
+        if archive.year not in self._attached and not os.path.exists(self.archive_path(archive.file)):
+            return None
+        return self.attach_archive(archive.year, archive.file)
+
+    def update_archive_stats(self, year):
+        with self.lock, self.conn:
+            self.conn.execute(SQL_UPDATE_ARCHIVE, (
+                *self.conn.execute(SQL_ARCHIVE_STATS.format(schema=f"archive_{year}")).fetchone(), year,
+            ))
+
+
+def fts_query(text):
+    # ввод пользователя -> запрос FTS5: каждое слово — префикс ("сло"*),
+    # все слова обязательны. Кавычки экранируются, так что синтаксис
+    # FTS5 (AND, NEAR, двоеточия) в тексте не интерпретируется
+    words = re.findall(r"\w+", text.lower())
+    return " ".join('"{}"*'.format(w.replace('"', '""')) for w in words)
+
+
+_repo: Optional[Repository] = None
+
+
+def get_repo() -> Repository:
+    global _repo
+    if _repo is None:
+        _repo = Repository(DB_NAME)
+    return _repo
+
+
+def close_repo():
+    global _repo
+    if _repo is not None:
+        _repo.close()
+        _repo = None
@@ -0,0 +1,102 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+import profiler
+
+# ---------------------------
+# DBExecutor — отдельный поток для всех запросов к базе
+# ---------------------------
+# UI ставит задачу в очередь и сразу получает Future; результат приходит
+# в on_done уже в UI-потоке через deliver (в приложении — Clock.schedule_once).
+# Задачи с тегом экрана можно отменить при уходе с экрана: ещё не начатые
+# не выполнятся, а у уже выполняющихся просто не будет вызван on_done.
+# Тот же класс с другим name — поток отрисовки графиков (main.run_render).
+
+log = logging.getLogger(__name__)
+
+
+class _Task:
+    __slots__ = ("future", "fn", "args", "kwargs", "tag", "on_done", "on_error", "stale")
+
+    def __init__(self, fn, args, kwargs, tag, on_done, on_error):
+        self.future = Future()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.tag = tag
+        self.on_done = on_done
+        self.on_error = on_error
+        self.stale = False
+
+
+class DBExecutor:
+    def __init__(self, deliver, name="db-worker"):
+        self._deliver = deliver
+        self._queue = queue.Queue()
+        self._tagged = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, tag=None, on_done=None, on_error=None, **kwargs):
+        task = _Task(fn, args, kwargs, tag, on_done, on_error)
+        if tag is not None:
+            with self._lock:
+                self._tagged.setdefault(tag, set()).add(task)
+        self._queue.put(task)
+        return task.future
+
+    def cancel(self, tag):
+        with self._lock:
+            tasks = self._tagged.pop(tag, ())
+        for task in tasks:
+            task.stale = True
+            task.future.cancel()
+
+    def shutdown(self, wait=True):
+        self._queue.put(None)
+        if wait:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            if task.future.set_running_or_notify_cancel():
+                if profiler.ENABLED:
+                    name = getattr(task.fn, "__qualname__", "task")
+                    with profiler.profiler.span("db", name, {"tag": task.tag}):
+                        self._execute(task)
+                else:
+                    self._execute(task)
+            self._forget(task)
+
+    def _execute(self, task):
+        try:
+            result = task.fn(*task.args, **task.kwargs)
+        except Exception as e:
+            task.future.set_exception(e)
+            if task.on_error is None:
+                log.exception("Ошибка запроса к базе в %s", getattr(task.fn, "__name__", task.fn))
+            elif not task.stale:
+                self._deliver(lambda t=task, e=e: None if t.stale else t.on_error(e))
+            return
+
+        task.future.set_result(result)
+        if task.on_done and not task.stale:
+            self._deliver(lambda t=task, r=result: None if t.stale else t.on_done(r))
+
+    def _forget(self, task):
+        # задача остаётся в _tagged до конца выполнения, чтобы cancel()
+        # успел пометить устаревшей и уже запущенную
+        if task.tag is None:
+            return
+        with self._lock:
+            tagged = self._tagged.get(task.tag)
+            if tagged is not None:
+                tagged.discard(task)
+                if not tagged:
+                    del self._tagged[task.tag]
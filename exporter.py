@@ -0,0 +1,171 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from decimal import Decimal
+
+import db
+import timeutil
+
+# ---------------------------
+# Потоковая выгрузка операций (CSV, NDJSON, колонки NumPy)
+# ---------------------------
+# Операции читаются из Repository.iter_operations пачками fetchmany и
+# сразу пишутся в файл, так что память не зависит от размера таблицы.
+# CSV выгружается с теми же заголовками, что понимает importer, и время
+# в нём местное, как и при импорте: выгрузка и повторный импорт сохраняют
+# заметку и получателя. В .npz только числовые колонки.
+
+BATCH_SIZE = 5000
+FORMATS = ("csv", "ndjson", "npz")
+CSV_HEADER = ("id", "date", "category", "amount", "type", "note", "merchant")
+
+
+class ExportStats:
+    def __init__(self):
+        self.rows_written = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_sec(self):
+        return self.rows_written / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def format_cents(cents):
+    return str(Decimal(cents).scaleb(-2))
+
+
+# --- форматы ---
+def write_csv(batches, f, stats, progress=None):
+    writer = csv.writer(f)
+    writer.writerow(CSV_HEADER)
+    for batch in batches:
+        writer.writerows(
+            (r.id, timeutil.format_ts(r.created_ts), r.category, format_cents(r.amount_cents), r.type,
+             r.note or "", r.merchant or "")
+            for r in batch
+        )
+        stats.rows_written += len(batch)
+        if progress:
+            progress(stats)
+
+
+def write_ndjson(batches, f, stats, progress=None):
+    for batch in batches:
+        f.writelines(
+            json.dumps(dict(r._asdict(), created_at=timeutil.format_ts(r.created_ts)), ensure_ascii=False) + "\n"
+            for r in batch
+        )
+        stats.rows_written += len(batch)
+        if progress:
+            progress(stats)
+
+
+def write_npz(batches, f, stats, progress=None, categories=()):
+    # Колонки копятся во временных файлах (по одному на колонку), затем
+    # собираются в несжатый .npz, который читается numpy.load без разбора.
+    # Длина колонок известна только в конце, поэтому заголовки .npy пишутся
+    # при сборке. Категории — отдельные маленькие массивы, в строках
+    # операций только category_id.
+    import numpy as np
+    from numpy.lib import format as npy
+
+    columns = {
+        "id": np.dtype("<i8"),
+        "category_id": np.dtype("<i8"),
+        "amount_cents": np.dtype("<i8"),
+        "created_at": np.dtype("<M8[s]"),
+    }
+    category_ids = {c.name: c.id for c in categories}
+    parts = {name: tempfile.TemporaryFile() for name in columns}
+    try:
+        for batch in batches:
+            ids, names, amounts, times = zip(*((r.id, r.category, r.amount_cents, r.created_ts) for r in batch))
+            values = {
+                "id": ids,
+                "category_id": [category_ids[n] for n in names],
+                "amount_cents": amounts,
+                "created_at": times,
+            }
+            for name, dtype in columns.items():
+                # datetime64[s] — те же секунды Unix, что и created_ts
+                parts[name].write(np.asarray(values[name], dtype="<i8").astype(dtype).tobytes())
+            stats.rows_written += len(batch)
+            if progress:
+                progress(stats)
+
+        with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for name, dtype in columns.items():
+                with zf.open(name + ".npy", "w", force_zip64=True) as out:
+                    npy.write_array_header_1_0(
+                        out, {"descr": npy.dtype_to_descr(dtype), "fortran_order": False,
+                              "shape": (stats.rows_written,)},
+                    )
+                    parts[name].seek(0)
+                    shutil.copyfileobj(parts[name], out)
+            for name, array in (
+                ("category_ids", np.array([c.id for c in categories], dtype="<i8")),
+                ("category_names", np.array([c.name for c in categories], dtype=str)),
+                ("category_colors", np.array([c.color for c in categories], dtype=str)),
+            ):
+                with zf.open(name + ".npy", "w") as out:
+                    npy.write_array(out, array, allow_pickle=False)
+    finally:
+        for part in parts.values():
+            part.close()
+
+
+def export_operations(repo, path, fmt=None, category_names=None, date_from=None, date_to=None,
+                      batch_size=BATCH_SIZE, progress=None):
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"неизвестный формат выгрузки: {fmt}")
+
+    categories = repo.categories()
+    if category_names:
+        by_name = {c.name: c for c in categories}
+        missing = [n for n in category_names if n not in by_name]
+        if missing:
+            raise ValueError("нет категорий: " + ", ".join(missing))
+        categories = [by_name[n] for n in category_names]
+
+    since, until = timeutil.day_range(date_from, date_to)
+    batches = repo.iter_operations(
+        [c.id for c in categories],
+        db.MIN_TS if since is None else since,
+        db.MAX_TS if until is None else until,
+        batch_size,
+    )
+    stats = ExportStats()
+
+    # пишем во временный файл рядом и переименовываем в конце,
+    # чтобы прерванная выгрузка не оставила полуфайл под нужным именем
+    tmp_path = path + ".part"
+    try:
+        if fmt == "npz":
+            with open(tmp_path, "wb") as f:
+                write_npz(batches, f, stats, progress, categories)
+        else:
+            with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+                writer = write_csv if fmt == "csv" else write_ndjson
+                writer(batches, f, stats, progress)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return stats
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext in ("json", "jsonl"):
+        return "ndjson"
+    return ext if ext in FORMATS else "csv"
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import uuid
+from typing import NamedTuple, Optional
+
+# ---------------------------
+# Журнал отложенной записи операций (write-behind)
+# ---------------------------
+# Ввод подтверждается, как только строка JSON дописана в файл журнала,
+# а в SQLite записи уходят пачкой — одна транзакция на несколько вводов.
+# Сброс пачки (flush) в потоке базы:
+#   1. rotate(): журнал атомарно переименовывается в <путь>.flushing,
+#      новые вводы пишутся в свежий журнал и транзакцию не ждут;
+#   2. Repository.add_journal_operations вставляет пачку с INSERT OR IGNORE
+#      по уникальному entry_uuid;
+#   3. commit(): .flushing удаляется.
+# Запись, которой некуда лечь (её категорию удалили до сброса), не
+# выбрасывается: она дописывается в <путь>.rejected в формате журнала
+# до commit(), и flush возвращает её вызывающему для показа.
+# Сбой на любом шаге оставляет записи в одном из двух файлов; следующий
+# flush (и первый при запуске) вставляет их снова, уже записанные
+# пропускаются по entry_uuid — без потерь и без дублей.
+# Строка, оборванная посреди write (процесс убит), не заканчивается
+# переводом строки и при чтении отбрасывается — её ввод ещё не был
+# подтверждён.
+# Журнал переживает падение и убийство процесса; от потери питания, как
+# и база с synchronous=NORMAL, защищает только fsync=True.
+
+
+JOURNAL_SUFFIX = ".pending"
+
+
+def journal_path(db_path):
+    return db_path + JOURNAL_SUFFIX
+
+
+def journal_files(db_path):
+    # журнал базы, пачка посреди сброса и отвергнутые записи (WriteJournal)
+    path = journal_path(db_path)
+    return [path, path + ".flushing", path + ".rejected"]
+
+
+class JournalRecord(NamedTuple):
+    uuid: str
+    category_id: int
+    amount_cents: int
+    type: str
+    created_ts: int
+    note: Optional[str] = None
+    merchant: Optional[str] = None
+
+
+class FlushResult(NamedTuple):
+    added: list     # StoredOperation действительно вставленных записей
+    rejected: list  # JournalRecord, которые база не приняла
+
+
+def _encode(record):
+    return (json.dumps(record._asdict(), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def read_records(path):
+    # записи файла журнала без повторов uuid; битые строки пропускаются
+    records = {}
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    continue
+                try:
+                    record = JournalRecord(**json.loads(line))
+                except (ValueError, TypeError):
+                    continue
+                records.setdefault(record.uuid, record)
+    except FileNotFoundError:
+        pass
+    return list(records.values())
+
+
+class WriteJournal:
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.flushing_path = path + ".flushing"
+        self.rejected_path = path + ".rejected"
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def append(self, category_id, amount_cents, type_op, created_ts, note=None, merchant=None):
+        # UI-поток: одна запись одним write() в файл с O_APPEND
+        record = JournalRecord(uuid.uuid4().hex, category_id, amount_cents, type_op,
+                               created_ts, note or None, merchant or None)
+        line = _encode(record)
+        with self._lock:
+            if self._fd is None:
+                self._fd = self._open()
+            os.write(self._fd, line)
+            if self.fsync:
+                os.fsync(self._fd)
+        return record
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        # оборванный хвост прошлого запуска закрываем переводом строки,
+        # иначе первая новая запись склеится с ним и пропадёт при чтении
+        size = os.fstat(fd).st_size
+        if size and os.pread(fd, 1, size - 1) != b"\n":
+            os.write(fd, b"\n")
+        return fd
+
+    def rotate(self):
+        # поток базы: всё, что ещё не в базе, переезжает в .flushing
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            if os.path.exists(self.path):
+                if os.path.exists(self.flushing_path):
+                    # прошлый flush не дошёл до commit — дописываем к нему;
+                    # перевод строки отделяет возможный оборванный хвост
+                    with open(self.path, "rb") as src, open(self.flushing_path, "ab") as dst:
+                        dst.write(b"\n" + src.read())
+                        if self.fsync:
+                            dst.flush()
+                            os.fsync(dst.fileno())
+                    os.remove(self.path)
+                else:
+                    os.replace(self.path, self.flushing_path)
+        return read_records(self.flushing_path)
+
+    def keep_rejected(self, records):
+        # повтор после сбоя допишет те же записи ещё раз — read_records
+        # схлопывает их по uuid
+        with open(self.rejected_path, "ab") as f:
+            f.write(b"".join(_encode(r) for r in records))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def commit(self):
+        # пачка из .flushing уже в базе
+        try:
+            os.remove(self.flushing_path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+def flush(journal, repo):
+    # один сброс журнала в базу
+    records = journal.rotate()
+    added, rejected = repo.add_journal_operations(records) if records else ([], [])
+    if rejected:
+        journal.keep_rejected(rejected)
+    journal.commit()
+    return FlushResult(added, rejected)
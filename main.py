@@ -1,35 +1,49 @@
 __version__ = '1.0'
 from kivy.config import Config
-Config.set('graphics', 'width', '360')
-Config.set('graphics', 'height', '800')
-Config.write()
 
-import sqlite3
-import io
+# размер окна; config.ini переписываем только если он действительно изменился
+_config_changed = False
+for _key, _value in (('width', '360'), ('height', '800')):
+    if Config.get('graphics', _key) != _value:
+        Config.set('graphics', _key, _value)
+        _config_changed = True
+if _config_changed:
+    Config.write()
+
+import json
+import math
+import os
 from decimal import Decimal
-from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
 
-# matplotlib + kivy image
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-from kivy.core.image import Image as CoreImage
 from kivy.clock import Clock
+from kivy.logger import Logger
 
 from kivy.app import App
 from kivy.lang import Builder
 from kivy.uix.floatlayout import FloatLayout
-from kivy.uix.screenmanager import ScreenManager, Screen, SlideTransition, FadeTransition
-from kivy.properties import ListProperty, ObjectProperty, StringProperty, NumericProperty
+from kivy.uix.screenmanager import Screen, SlideTransition, FadeTransition
+from kivy.properties import ListProperty, StringProperty, NumericProperty
 from kivy.uix.label import Label
-from kivy.uix.button import Button
-from kivy.metrics import dp
 from kivy.utils import get_color_from_hex as HEX
 from kivy.uix.image import Image
-import numpy as np
-import matplotlib.patheffects as pe
-
-DB_NAME = "data.db"
+from kivy.graphics import Color, Rectangle
+from kivy.metrics import dp, sp
+
+from db import Category, CategoryTotals, get_repo, close_repo
+import archive
+import backup
+from chartcache import ChartCache
+from db_worker import DBExecutor
+import journal
+import profiler
+from profiler import timed
+from store import CategoryStore, OperationFeed, operation_delta
+from timeutil import day_buckets, format_ts, month_buckets, now_ts, period_range
+from charts import BarCanvasChart, PieCanvasChart, RGBATexture  # noqa: F401 — диаграммы нужны main.kv
+
+# matplotlib/numpy (модуль render) импортируются только при первом открытии
+# графика баланса — обычный запуск приложения их не трогает
 
 CATEGORY_COLORS = [
     "#9AA0A6", "#1F1F1F",
@@ -38,286 +52,704 @@ CATEGORY_COLORS = [
     "#3498DB", "#8E44AD", "#C0398E",
 ]
 
+HISTORY_PAGE_SIZE = 50
+
+
+def format_amount(amount):
+    sign = "-" if amount < 0 else "+"
+    rub = abs(amount) // 100
+    kop = abs(amount) % 100
+    return f"{sign}{rub}.{kop:02d}₽"
+
+
+# строки операций форматируются один раз и кэшируются по id операции
+OPERATION_TEXT_CACHE_SIZE = 2000
+_operation_texts = OrderedDict()
+
+
+def operation_texts(op):
+    texts = _operation_texts.get(op.id)
+    if texts is None:
+        short = format_amount(op.amount_cents)
+        full = f"{format_ts(op.created_ts)} | {op.type.capitalize()} {short}"
+        texts = _operation_texts[op.id] = (full, short)
+        if len(_operation_texts) > OPERATION_TEXT_CACHE_SIZE:
+            _operation_texts.popitem(last=False)
+    else:
+        _operation_texts.move_to_end(op.id)
+    return texts
+
+
+def forget_operation_texts(op_id):
+    _operation_texts.pop(op_id, None)
+
+
+def _history_page_key(op):
+    return (op.created_ts, op.id)
+
+
+class OperationPager:
+    # Постраничная подгрузка операций в RecycleView: первая страница сразу,
+    # следующие — когда до конца списка меньше экрана. Источник — категория
+    # для истории или строка поиска: fetch(source, after, limit) выполняется
+    # в потоке базы, page_key(row) даёт after для следующей страницы
+    def __init__(self, rv, make_item, tag, on_page=None, page_size=HISTORY_PAGE_SIZE,
+                 fetch=None, page_key=_history_page_key):
+        self.rv = rv
+        self.make_item = make_item
+        self.tag = tag
+        self.on_page = on_page
+        self.page_size = page_size
+        self.fetch = fetch
+        self.page_key = page_key
+        self.source = None
+        self.loading = False
+        self._generation = 0
+        self._page_key = None
+        self._keys = []  # page_key каждой строки rv.data, по убыванию
+        self._exhausted = True
+        self._scroll_offset = None
+        rv.bind(scroll_y=self._on_scroll)
+        rv.layout_manager.bind(height=self._restore_scroll)
+
+    def reset(self, source):
+        self.cancel()
+        self.source = source
+        self._page_key = None
+        self._keys = []
+        self._exhausted = False
+        self._scroll_offset = None
+        self.rv.data = []
+        self.rv.scroll_y = 1
+        self.load_page()
+
+    def clear(self):
+        # пустой список без источника: resume() ничего не дозагрузит
+        self.cancel()
+        self.source = None
+        self._page_key = None
+        self._keys = []
+        self._exhausted = True
+        self._scroll_offset = None
+        self.rv.data = []
+
+    def cancel(self):
+        # уход с экрана: недогруженная страница больше не нужна
+        cancel_db(self.tag)
+        self._generation += 1
+        self.loading = False
+
+    def resume(self):
+        # возврат на экран: дозагружаем первую страницу, если её отменили
+        if not self.rv.data and not self._exhausted:
+            self.load_page()
+
+    def load_page(self):
+        if self._exhausted or self.loading:
+            return
+        self.loading = True
+        generation = self._generation
+        run_db(
+            self.fetch or get_repo().history_page, self.source, self._page_key, self.page_size,
+            on_done=lambda rows: self._page_loaded(generation, rows),
+            tag=self.tag,
+        )
+
+    @timed()
+    def _page_loaded(self, generation, rows):
+        if generation != self._generation:
+            return  # ответ на уже сброшенный список
+        self.loading = False
+
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if rows:
+            self._append(rows)
+        if self.on_page:
+            self.on_page()
+
+    def _append(self, rows):
+        rv = self.rv
+        self._page_key = self.page_key(rows[-1])
+        self._keys.extend(self.page_key(op) for op in rows)
+
+        data = [self.make_item(op) for op in rows]
+
+        # запоминаем, сколько пикселей прокручено от верха: после роста
+        # списка scroll_y пересчитается так, чтобы экран не прыгнул вниз
+        hidden = rv.layout_manager.height - rv.height
+        if rv.data and hidden > 0:
+            self._scroll_offset = (1 - rv.scroll_y) * hidden
+        rv.data.extend(data)
+
+    def _find(self, key):
+        # позиция key в _keys (упорядочены по убыванию) двоичным поиском
+        lo, hi = 0, len(self._keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._keys[mid] > key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def insert(self, row):
+        # новая строка встаёт на своё место среди загруженных; если она ниже
+        # последней загруженной, её принесёт следующая страница
+        key = self.page_key(row)
+        if not self._exhausted and (self._page_key is None or key < self._page_key):
+            return
+        index = self._find(key)
+        self._keys.insert(index, key)
+        self.rv.data.insert(index, self.make_item(row))
+
+    def remove(self, row):
+        key = self.page_key(row)
+        index = self._find(key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+            del self.rv.data[index]
+
+    def _restore_scroll(self, layout, height):
+        if self._scroll_offset is None:
+            return
+        rv = self.rv
+        hidden = height - rv.height
+        if hidden > 0:
+            rv.scroll_y = max(0, 1 - self._scroll_offset / hidden)
+        self._scroll_offset = None
+
+    def _on_scroll(self, rv, scroll_y):
+        if self._exhausted or self.loading or self._scroll_offset is not None or not rv.data:
+            return
+        hidden = rv.layout_manager.height - rv.height
+        if hidden <= 0 or scroll_y * hidden < rv.height:
+            self.load_page()
+
 # --- Работа с базой данных ---
-def get_db():
-    conn = sqlite3.connect(DB_NAME)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cur = conn.cursor()
-    return conn, cur
+# Все запросы из интерфейса выполняет поток DBExecutor, а on_done
+# вызывается уже в UI-потоке через Clock
+_db_executor = None
 
-def init_db():
-    conn, cur = get_db()
-
-    cur.execute("""CREATE TABLE IF NOT EXISTS categories (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE,
-                    color TEXT DEFAULT '#1F1F1F'
-                  );""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS operations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
-                    amount_cents INTEGER,
-                    type TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                  );""")
-    conn.commit()
-    cur.close()
-    conn.close()
 
+def run_db(fn, *args, on_done=None, on_error=None, tag=None):
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = DBExecutor(deliver=lambda cb: Clock.schedule_once(lambda dt: cb(), 0))
+    return _db_executor.submit(fn, *args, on_done=on_done, on_error=on_error, tag=tag)
 
-def get_categories():
-    conn, cur = get_db()
-    cur.execute("SELECT id, name, color FROM categories ORDER BY id")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
 
-    return rows
+def cancel_db(tag):
+    if _db_executor is not None:
+        _db_executor.cancel(tag)
+
+
+def shutdown_db():
+    global _db_executor
+    if _db_executor is not None:
+        _db_executor.shutdown()
+        _db_executor = None
+
+
+# Кадры matplotlib рисуются в своём потоке, чтобы не занимать ни UI,
+# ни поток базы; готовый кадр так же приходит в on_done через Clock
+_render_executor = None
+
+
+def run_render(fn, *args, on_done=None, on_error=None, tag=None):
+    global _render_executor
+    if _render_executor is None:
+        _render_executor = DBExecutor(deliver=lambda cb: Clock.schedule_once(lambda dt: cb(), 0),
+                                      name="chart-render")
+    return _render_executor.submit(fn, *args, on_done=on_done, on_error=on_error, tag=tag)
+
+
+def shutdown_render():
+    global _render_executor
+    if _render_executor is not None:
+        _render_executor.shutdown(wait=False)
+        _render_executor = None
+
+
+def init_db():
+    get_repo().init_schema()
+    archive.resume(get_repo())  # перенос в архив, прерванный в прошлый запуск
+    # вводы, не дошедшие до базы в прошлый запуск, — до первого чтения
+    result = journal.flush(get_journal(), get_repo())
+    if result.rejected:
+        Clock.schedule_once(lambda dt: _report_rejected(result.rejected), 0)
 
-def delete_category_from_db(category_id):
-    conn, cur = get_db()
-    cur.execute("DELETE FROM categories WHERE id = ?", (category_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
 
 # ---------------------------
-# PieChart widget (matplotlib -> texture)
+# Отложенная запись операций (journal.py)
 # ---------------------------
-class PieChart(Image):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+# Ввод подтверждается после строки в журнале; в базу пачка уходит через
+# JOURNAL_FLUSH_DELAY секунд после первого несброшенного ввода или сразу,
+# когда их набралось JOURNAL_BATCH_SIZE. Экраны узнают об операциях из
+# operation_feed уже после вставки, с настоящими id.
+JOURNAL_FLUSH_DELAY = 0.5
+JOURNAL_BATCH_SIZE = 32
+_journal = None
+
+
+def get_journal():
+    global _journal
+    if _journal is None:
+        _journal = journal.WriteJournal(journal.journal_path(get_repo().path))
+    return _journal
+
 
-    def draw(self, data, dpi=120, size_px=320):
-        total = sum([v for _, v, _ in data])
-        # подготовим фигуру
-        fig, ax = plt.subplots(figsize=(size_px/ dpi, size_px/ dpi), dpi=dpi)
-        fig.patch.set_alpha(0)  # прозрачный фон
-
-        if total <= 0 or len(data) == 0:
-            # пустой / нулевые данные — рисуем серый круг и текст
-            sizes = [1]
-            colors = ['#DDDDDD']
-            wedges, _ = ax.pie(sizes, colors=colors, startangle=90, counterclock=False,
-                               wedgeprops={'linewidth':0})
-            ax.set(aspect="equal")
-            ax.text(0, 0, "Нет\nдоходов", ha='center', va='center', fontsize=14)
+def flush_journal():
+    return journal.flush(get_journal(), get_repo())
+
+
+class WriteBehind:
+    def __init__(self):
+        self.pending = 0
+        self._trigger = Clock.create_trigger(lambda dt: self.flush(), JOURNAL_FLUSH_DELAY)
+
+    def add(self, category_id, amount_cents, type_op, created_ts, note=None, merchant=None):
+        record = get_journal().append(category_id, amount_cents, type_op, created_ts, note, merchant)
+        self.pending += 1
+        if self.pending >= JOURNAL_BATCH_SIZE:
+            self.flush()
         else:
-            labels = []
-            sizes = []
-            colors = []
-            for lbl, val, hexc in data:
-                if val > 0:
-                    labels.append(lbl)
-                    sizes.append(val)
-                    colors.append(hexc if hexc else '#1F1F1F')
-
-            def autopct(pct):
-                return ('{:.1f}%'.format(pct)) if pct > 0.5 else ''
-
-            wedges, texts, autotexts = ax.pie(
-                sizes,
-                labels=None,
-                colors=colors,
-                startangle=90,
-                counterclock=False,
-                autopct=autopct,
-                pctdistance=0.75,
-                wedgeprops={'linewidth':0}
-            )
-            ax.set(aspect="equal")
-
-            # Внутренние подписи (при желании можно расположить легенду)
-            # Сделаем легенду справа с именами + суммы в рублях
-            legend_labels = []
-            for (lbl, val, _) in zip(labels, sizes, colors):
-                # но здесь zip неправильно — ниже пересоздадим из data
-                pass
-            # Создадим легенду из исходных списков:
-            legend_labels = [f"{labels[i]} — {sizes[i]/100:.2f}₽" for i in range(len(labels))]
-            ax.legend(wedges, legend_labels, loc="center left", bbox_to_anchor=(1, 0.5), fontsize=8)
-
-            # увеличим размер процентов
-            for t in autotexts:
-                t.set_fontsize(9)
-                t.set_color('white')
-                t.set_weight('bold')
-
-        # Сохранение в buffer и установка текстуры
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', transparent=True, bbox_inches='tight', pad_inches=0)
-        plt.close(fig)
-        buf.seek(0)
-        self.texture = CoreImage(buf, ext='png').texture
+            self._trigger()  # уже запланированный сброс не откладывается
+        return record
+
+    def flush(self):
+        self._trigger.cancel()
+        if not self.pending:
+            return
+        self.pending = 0
+        run_db(flush_journal, on_done=_journal_flushed)
+
+
+def _journal_flushed(result):
+    for operation in result.added:
+        operation_feed.added(operation)
+    if result.rejected:
+        _report_rejected(result.rejected)
+
+
+def _report_rejected(records):
+    # ввод был подтверждён, но категорию удалили раньше, чем пачка дошла
+    # до базы: записи лежат в журнале .rejected, пользователь должен знать
+    from kivy.uix.popup import Popup
+
+    text = (f"Не сохранено операций: {len(records)}\n"
+            f"категория удалена до записи в базу.\n"
+            f"Они остались в {os.path.basename(get_journal().rejected_path)}")
+    Popup(title="Операции не сохранены", content=Label(text=text, halign="center"),
+          size_hint=(0.85, 0.35)).open()
+
+
+write_behind = WriteBehind()
+
 
 # ---------------------------
-# Существующие классы приложения
+# Резервные копии (backup.py)
 # ---------------------------
-class CategoriesWidget(FloatLayout):
-    output = ListProperty([])
+# Снимок базы раз в backup.BACKUP_INTERVAL, в своём потоке и через
+# BACKUP_START_DELAY секунд после запуска, чтобы не спорить с первыми
+# экранами за диск и соединение
+BACKUP_START_DELAY = 30
+_backup_service = None
 
-    def on_output(self, instance, value):
-        # попытка найти RecycleView в self.ids
-        rv = self.ids.get("rv")
-        if not rv:
-            # ещё не создан — ничего не делаем (show_categories попробует снова)
-            return
-        rv.data = [
-            {"text": f"{cid}. {name}", "category_id": cid, "bg_color": HEX(color)}
-            for cid, name, color in get_categories()
-        ]
 
+def get_backup_service():
+    global _backup_service
+    if _backup_service is None:
+        _backup_service = backup.BackupService(get_repo())
+    return _backup_service
 
-    def show_categories(self):
-        rows = get_categories()
-
-        # функция для правильного склонения слова "категория"
-        def pluralize_category(n):
-            if 11 <= n % 100 <= 14:
-                return "категорий"
-            last = n % 10
-            if last == 1:
-                return "категория"
-            elif last in (2, 3, 4):
-                return "категории"
-            else:
-                return "категорий"
 
-        # обновляем текст-инфо
-        info = self.ids.get("info_label")
-        if info:
-            if len(rows) == 0:
-                info.text = "У вас нет категорий"
-            else:
-                count = len(rows)
-                info.text = f"У вас {count} {pluralize_category(count)}"
-
-        # формируем данные для RecycleView:
-        data = []
-        for i, (cid, name, color_hex) in enumerate(rows):
-            display_text = f"{i+1}. {name}"
-            data.append({
-                "text": display_text,
-                "category_id": cid,
-                "bg_color": HEX(color_hex)
-            })
-
-        rv = self.ids.get("rv")
-        if rv:
-            rv.data = data
-        else:
-            # запасной путь — используем output
-            self.output = [f"{i+1}. {name}" for i, (_, name) in enumerate(rows)]
+def get_categories():
+    return get_repo().categories()
+
+
+# категории читаются из базы один раз за запуск; дальше category_store
+# обновляют add_category/delete_category, а об операциях экраны узнают
+# из operation_feed
+category_store = CategoryStore()
+operation_feed = OperationFeed()
+_categories_requested = False
+
+
+def load_categories():
+    global _categories_requested
+    if category_store.loaded or _categories_requested:
+        return
+    _categories_requested = True
+
+    def failed(error):
+        global _categories_requested
+        _categories_requested = False  # следующий show_categories попробует снова
+
+    run_db(get_categories, on_done=category_store.reset, on_error=failed)
+
+def delete_category_from_db(category_id):
+    get_repo().delete_category(category_id)
+
+# ---------------------------
+# BalanceChart — баланс во времени (matplotlib Agg -> texture)
+# ---------------------------
+# Полный ряд (ts, баланс) хранится в NumPy-массивах; на каждый кадр
+# прореживается только видимое окно до ширины виджета в пикселях.
+# Перетаскивание — сдвиг окна, колесо мыши и щипок — масштаб,
+# двойное касание — весь ряд.
+class BalanceChart(Image):
+    # Кадр рисуется в потоке рендера (run_render): там же живут AggFigure
+    # и BalanceLine. Пока кадр рисуется, новые окна от жестов не копятся в
+    # очередь — дорисовывается только последнее. Готовые кадры лежат в LRU
+    # по (версия ряда, окно, размер): повторный вход на экран с теми же
+    # данными и двойной тап показывают кадр сразу, без matplotlib
+    ZOOM_STEP = 1.25
+    MIN_SPAN = 3600  # окно не уже часа
+    FRAME_CACHE_SIZE = 8  # кадр — ширина * высота * 4 байта
 
-class PieAnimatedChart(Image):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.progress = 0
-        self.fps = 1 / 120
-        self.speed = 0.1
-        self.values = []
-        self.colors = []
-        self.labels = []
-        self._anim_event = None
-
-    def start(self, values, colors, labels):
-        # сохраняем данные
-        self.values = values
-        self.colors = colors
-        self.labels = labels
-
-        # сбрасываем анимацию
-        self.progress = 0
-        if self._anim_event:
-            self._anim_event.cancel()
-
-        # запуск анимации
-        self._anim_event = Clock.schedule_interval(self._update, self.fps)
-
-    def _update(self, dt):
-        if self.progress >= 1:
-            self.progress = 1
-            self._draw(self.progress)
-            return False  # стоп анимации
-
-        self._draw(self.progress)
-        self.progress += self.speed
-
-    def _draw(self, progress):
-        if not self.values:
+        self._agg = None
+        self._line = None
+        self._texture = RGBATexture()
+        self.ts = None
+        self.balance = None
+        self.series_key = None
+        self.view = None  # (x0, x1) видимого окна, секунды Unix
+        self._touches = {}
+        self._frames = OrderedDict()
+        self._wanted = None  # последний запрошенный кадр
+        self._rendering = False
+        self._redraw = Clock.create_trigger(self.draw)
+        self.bind(size=self._redraw)
+
+    def set_series(self, series, key=None):
+        # key — версия данных ряда; без неё кадры не кэшируются
+        self.ts, self.balance = series
+        self.series_key = key
+        self.reset_view()
+
+    def reset_view(self):
+        if self.ts is None or not len(self.ts):
+            self.view = None
+        else:
+            x0, x1 = int(self.ts[0]), int(self.ts[-1])
+            self.view = (x0, max(x1, x0 + self.MIN_SPAN))
+        self._redraw()
+
+    @staticmethod
+    def _date_format(value, span):
+        if span > 2 * 365 * 86400:
+            return format_ts(value, "%Y")
+        if span > 180 * 86400:
+            return format_ts(value, "%m.%y")
+        if span > 2 * 86400:
+            return format_ts(value, "%d.%m")
+        return format_ts(value, "%H:%M")
+
+    @timed()
+    def draw(self, *args):
+        if self.view is None or self.width < 10 or self.height < 10:
             return
+        frame = (self.series_key, self.view, (int(self.width), int(self.height)))
+        self._wanted = frame
+        cached = self._frames.get(frame)
+        if cached is not None:
+            self._frames.move_to_end(frame)
+            self._show(frame, cached)
+        elif not self._rendering:
+            self._render(frame)
+
+    def _render(self, frame):
+        self._rendering = True
+        run_render(
+            self._render_frame, frame, self.ts, self.balance,
+            on_done=lambda rgba: self._frame_ready(frame, rgba),
+            on_error=self._render_failed,
+        )
 
-        fig, ax = plt.subplots(figsize=(3.2, 3.2), dpi=100)
-        fig.patch.set_alpha(0)
+    def _render_frame(self, frame, ts, balance):
+        # поток рендера; буфер Agg перезапишет следующий кадр — отдаём копию
+        from render import AggFigure, BalanceLine, minmax_downsample
+
+        _, (x0, x1), size = frame
+        if self._agg is None:
+            self._agg = AggFigure(size[0], size[1], dpi=100)
+            self._line = BalanceLine(self._agg, self._date_format)
+        elif self._agg.size != size:
+            self._agg.resize(*size)
+        columns = max(int(size[0] * 0.8), 1)  # ширина области графика
+        x, y = minmax_downsample(ts, balance, x0, x1, columns)
+        return bytes(self._line.render(x, y, x0, x1))
+
+    def _frame_ready(self, frame, rgba):
+        self._rendering = False
+        if frame[0] is not None:
+            self._frames[frame] = rgba
+            if len(self._frames) > self.FRAME_CACHE_SIZE:
+                self._frames.popitem(last=False)
+        if frame == self._wanted:
+            self._show(frame, rgba)
+        elif self._wanted not in self._frames:
+            # окно ушло дальше, пока кадр рисовался: показываем что есть
+            # и рисуем последнее
+            self._show(frame, rgba)
+            self._render(self._wanted)
+
+    def _render_failed(self, error):
+        self._rendering = False
+        Logger.error("BalanceChart: кадр не нарисован: %r", error)
+
+    def _show(self, frame, rgba):
+        self.texture = self._texture.upload(rgba, frame[2])
+        self.canvas.ask_update()
+
+    # --- масштаб и сдвиг окна ---
+    def _clamp(self, x0, x1):
+        first, last = int(self.ts[0]), int(self.ts[-1])
+        span = min(max(x1 - x0, self.MIN_SPAN), max(last - first, self.MIN_SPAN))
+        x0 = min(max(x0, first), max(last - span, first))
+        return x0, x0 + span
+
+    def zoom(self, factor, anchor_x):
+        # factor > 1 — приблизить; anchor_x — точка виджета, что остаётся на месте
+        if self.view is None:
+            return
+        x0, x1 = self.view
+        at = x0 + (x1 - x0) * (anchor_x - self.x) / self.width
+        self.view = self._clamp(at - (at - x0) / factor, at + (x1 - at) / factor)
+        self._redraw()
 
-        total = sum(self.values)
-        if total == 0:
-            plt.close(fig)
+    def pan(self, dx_px):
+        if self.view is None:
             return
+        x0, x1 = self.view
+        shift = -(x1 - x0) * dx_px / self.width
+        self.view = self._clamp(x0 + shift, x1 + shift)
+        self._redraw()
+
+    def on_disabled(self, instance, value):
+        # касания, начатые до скрытия, отпустит уже не этот виджет
+        self._touches.clear()
+
+    def on_touch_down(self, touch):
+        # скрытый график (opacity 0, disabled) лежит поверх столбиков
+        # и не должен перехватывать их касания. Widget.on_touch_down
+        # поглощает касание отключённого виджета, поэтому не super()
+        if self.disabled:
+            return False
+        if not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+        if touch.is_mouse_scrolling:
+            if touch.button == "scrolldown":
+                self.zoom(self.ZOOM_STEP, touch.x)
+            elif touch.button == "scrollup":
+                self.zoom(1 / self.ZOOM_STEP, touch.x)
+            return True
+        if touch.is_double_tap:
+            self.reset_view()
+            return True
+        touch.grab(self)
+        self._touches[touch.uid] = touch.pos
+        return True
+
+    def on_touch_move(self, touch):
+        if self.disabled or touch.grab_current is not self:
+            return super().on_touch_move(touch)
+        previous = dict(self._touches)
+        self._touches[touch.uid] = touch.pos
+        if len(previous) == 2:
+            # щипок: масштаб по изменению расстояния между пальцами
+            (ax, ay), (bx, by) = previous.values()
+            (cx, cy), (dx, dy) = self._touches.values()
+            before = math.hypot(ax - bx, ay - by)
+            after = math.hypot(cx - dx, cy - dy)
+            if before > 0 and after > 0:
+                self.zoom(after / before, (cx + dx) / 2)
+        elif len(previous) == 1:
+            self.pan(touch.dx)
+        return True
+
+    def on_touch_up(self, touch):
+        if self.disabled or touch.grab_current is not self:
+            return super().on_touch_up(touch)
+        touch.ungrab(self)
+        self._touches.pop(touch.uid, None)
+        return True
 
-        # масштабируем значениями прогресса
-        scaled = [(v / total) * progress for v in self.values]
-
-        # гарантируем, что сектор не исчезает полностью
-        safe_scaled = [max(v, 0.0001) for v in scaled]
-
-        # добавляем ПРОЗРАЧНЫЙ остаток — ОТВЕЧАЕТ ЗА АНИМАЦИЮ
-        remainder = max(0, 1 - progress)
-        sizes = safe_scaled + [remainder]
-        colors = list(self.colors) + [(0, 0, 0, 0)]
-        labels = list(self.labels) + [""]
-
-        wedges, _ = ax.pie(
-            sizes,
-            colors=colors,
-            startangle=90,
-            counterclock=False,
-            labels=None,
-            wedgeprops={'linewidth': 0}
-        )
+# ---------------------------
+# Кэш диаграмм на диске (chartcache.py)
+# ---------------------------
+# Итоги главного экрана и ряд баланса хранятся рядом с базой под ключом
+# (версия данных, параметры запроса): после перезапуска и при том же
+# содержимом базы диаграммы показываются без чтения операций.
+# Версия читается до данных: запись между ними даст данные новее ключа,
+# и следующий запрос с новой версией просто промахнётся.
+_chart_cache = None
+
+
+def get_chart_cache():
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = ChartCache(get_repo().path + ".charts")
+    return _chart_cache
+
+
+def load_period_totals(since, until):
+    # выполняется в потоке базы; (итоги, взяты ли они из кэша)
+    repo, cache = get_repo(), get_chart_cache()
+    key = (repo.data_version(), since, until)
+    data = cache.get("totals", key)
+    if data is not None:
+        try:
+            return [CategoryTotals(*row) for row in json.loads(data)], True
+        except (ValueError, TypeError):
+            pass  # битый файл — перезапишется ниже
+    totals = repo.period_totals(since, until)
+    cache.put("totals", key, json.dumps([list(t) for t in totals]).encode("utf-8"))
+    return totals, False
+
+
+def load_balance_series(category_id=None):
+    # выполняется в потоке базы: чтение пачками и cumsum в NumPy;
+    # (ряд, ключ версии данных) — по ключу BalanceChart кэширует кадры
+    from render import balance_series, pack_series, unpack_series
+    repo, cache = get_repo(), get_chart_cache()
+    key = (repo.data_version(), category_id)
+    data = cache.get("balance", key)
+    if data is not None:
+        series = unpack_series(data)
+        if series is not None:
+            return series, key
+    series = balance_series(repo.iter_amounts(category_id))
+    cache.put("balance", key, pack_series(*series))
+    return series, key
 
-        # --- подписи из второго варианта ---
-        for i, w in enumerate(wedges[:-1]):  # последний — прозрачный сектор
-            theta1, theta2 = w.theta1, w.theta2
-            theta_mid = (theta1 + theta2) / 2
-            ang = np.deg2rad(theta_mid)
-
-            r = 0.65
-            x = r * np.cos(ang)
-            y = r * np.sin(ang)
-
-            # название категории
-            ax.text(
-                x, y + 0.07, self.labels[i],
-                ha='center', va='center',
-                fontsize=9, color='white', weight='bold',
-                path_effects=[pe.withStroke(linewidth=1, foreground="black")]
-            )
+# ---------------------------
+# Существующие классы приложения
+# ---------------------------
+def pluralize_category(n):
+    # правильное склонение слова "категория"
+    if 11 <= n % 100 <= 14:
+        return "категорий"
+    last = n % 10
+    if last == 1:
+        return "категория"
+    elif last in (2, 3, 4):
+        return "категории"
+    else:
+        return "категорий"
 
-            # процент от полного массива (как во втором варианте)
-            pct = f"{100 * self.values[i] / total:.1f}%"
-            ax.text(
-                x, y - 0.08, pct,
-                ha='center', va='center',
-                fontsize=10, color='white', weight='bold',
-                path_effects=[pe.withStroke(linewidth=1, foreground="black")]
-            )
 
-        ax.set(aspect='equal')
+class CategoriesWidget(FloatLayout):
+    # Строки RecycleView следуют за category_store: первая загрузка строит
+    # список целиком, добавление и удаление правят одну строку (и номера
+    # строк ниже удалённой), без нового запроса и без разбора цветов
 
-        buf = io.BytesIO()
-        plt.savefig(
-            buf, format='png',
-            transparent=True,
-            bbox_inches='tight',
-            pad_inches=0
-        )
-        plt.close(fig)
+    def on_kv_post(self, base_widget):
+        category_store.subscribe(self._on_change)
 
-        buf.seek(0)
-        self.texture = CoreImage(buf, ext='png').texture
+    def show_categories(self):
+        if not category_store.loaded:
+            self.ids.info_label.text = "Загрузка..."
+            load_categories()
+
+    @staticmethod
+    def _row(position, category):
+        return {
+            "text": f"{position}. {category.name}",
+            "category_id": category.id,
+            "bg_color": category.rgba,
+        }
+
+    def _on_change(self, store, change):
+        rv = self.ids.rv
+        if change.kind == "reset":
+            rv.data = [self._row(i + 1, c) for i, c in enumerate(store.items())]
+        elif change.kind == "add":
+            rv.data.append(self._row(change.index + 1, change.category))
+        elif change.kind == "remove":
+            # номера ниже удалённой строки сдвигаются на один; data меняется
+            # на месте, а del сам обновит видимые строки
+            for i in range(change.index + 1, len(rv.data)):
+                row = rv.data[i]
+                row["text"] = f"{i}. {store.get(row['category_id']).name}"
+            del rv.data[change.index]
+        self._update_info(len(store))
+
+    def _update_info(self, count):
+        if count == 0:
+            self.ids.info_label.text = "У вас нет категорий"
+        else:
+            self.ids.info_label.text = f"У вас {count} {pluralize_category(count)}"
+
+# ---------------------------
+# Оверлей профилирования (только при CASHPILOT_PROFILE=1)
+# ---------------------------
+# F12 — показать/скрыть FPS и самые долгие операции за последние секунды,
+# F11 — сохранить трассу. Время каждого кадра пишется в трассу всегда,
+# пока профилирование включено, а не только при открытом оверлее.
+KEY_F11 = 292
+KEY_F12 = 293
 
 
+class ProfilerOverlay(Label):
+    def __init__(self, **kwargs):
+        super().__init__(
+            size_hint=(1, None), height=dp(150), halign="left", valign="top",
+            font_size=sp(11), color=(1, 1, 1, 1), padding=(dp(6), dp(4)), **kwargs
+        )
+        self.bind(size=lambda *a: setattr(self, "text_size", self.size))
+        with self.canvas.before:
+            Color(0, 0, 0, 0.7)
+            self._bg = Rectangle()
+        self.bind(pos=self._move_bg, size=self._move_bg)
+        self._frames = []
+        self._refresh_event = None
+
+    def _move_bg(self, *args):
+        self._bg.pos = self.pos
+        self._bg.size = self.size
+
+    def install(self):
+        from kivy.core.window import Window
+        Clock.schedule_interval(self._frame, 0)
+        Window.bind(on_key_down=self._on_key)
+
+    def _frame(self, dt):
+        profiler.profiler.counter("frame_ms", round(dt * 1000, 2))
+        self._frames.append(dt)
+
+    def _on_key(self, window, key, *args):
+        if key == KEY_F12:
+            self.toggle()
+            return True
+        if key == KEY_F11:
+            profiler.profiler.dump()
+            return True
+
+    def toggle(self):
+        from kivy.core.window import Window
+        if self.parent:
+            Window.remove_widget(self)
+            self._refresh_event.cancel()
+            return
+        self.top = Window.height
+        Window.add_widget(self)
+        self._frames.clear()
+        self._refresh_event = Clock.schedule_interval(self._refresh, 0.5)
+        self._refresh(0)
+
+    def _refresh(self, dt):
+        self.top = self.parent.height
+        frames, self._frames = self._frames, []
+        worst = max(frames, default=0) * 1000
+        lines = [f"FPS {Clock.get_fps():.0f} | худший кадр {worst:.1f} мс"]
+        for e in profiler.profiler.slowest():
+            rows = f" ({e.args['rows']} стр.)" if e.args and "rows" in e.args else ""
+            lines.append(f"{e.duration * 1000:.1f} мс  {e.cat}: {e.name}{rows}")
+        self.text = "\n".join(lines)
 
 
 class MainApp(App):
@@ -326,28 +758,51 @@ class MainApp(App):
     def build(self):
         # загрузим kv из файла main.kv (если есть)
         Builder.load_file("main.kv")
+        if profiler.ENABLED:
+            self.profiler_overlay = ProfilerOverlay()
+            self.profiler_overlay.install()
         return RootWidget()
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.last_entry_point = None
 
-    # --- навигация (без изменений) ---
+    def on_start(self):
+        Clock.schedule_once(lambda dt: get_backup_service().start_if_due(), BACKUP_START_DELAY)
+
+    def on_stop(self):
+        if _backup_service is not None:
+            _backup_service.stop()  # копия с соединения базы — до его закрытия
+        if profiler.ENABLED:
+            profiler.profiler.dump()
+        write_behind.flush()  # shutdown_db дождётся этой пачки
+        shutdown_db()
+        shutdown_render()
+        if _journal is not None:
+            _journal.close()
+        close_repo()
+
+    # --- навигация ---
+    def screen(self, name):
+        # экраны, кроме главного, строятся при первом переходе на них
+        sm = self.root.ids.sm
+        if not sm.has_screen(name):
+            sm.add_widget(LAZY_SCREENS[name](name=name))
+        return sm.get_screen(name)
+
     def open_category_screen(self, category_id, category_name, direction="left"):
+        # один экран записи на все категории: меняется только категория,
+        # так что дерево виджетов не растёт с числом посещённых категорий
+        record = self.screen("record")
+        record.category_id = category_id
+        record.category_name = category_name
         sm = self.root.ids.sm
-        if f"cat_{category_id}" in sm.screen_names:
-            sm.transition = SlideTransition(direction=direction, duration=0.4)
-            sm.current = f"cat_{category_id}"
-            return
-        new_screen = RecordScreen(name=f"cat_{category_id}")
-        new_screen.category_id = category_id
-        new_screen.category_name = category_name
-        sm.add_widget(new_screen)
         sm.transition = SlideTransition(direction=direction, duration=0.4)
-        sm.current = new_screen.name
+        sm.current = record.name
 
     def go_to(self, screen_name, transition_type="slide_up"):
         sm = self.root.ids.sm
+        self.screen(screen_name)
         if transition_type.startswith("slide_"):
             self.last_transition = transition_type.replace("slide_", "")
         if transition_type == "fade":
@@ -364,6 +819,7 @@ class MainApp(App):
 
     def go_back(self, screen_name):
         sm = self.root.ids.sm
+        self.screen(screen_name)
         opposite = {
             "up": "down",
             "down": "up",
@@ -383,10 +839,7 @@ class MainApp(App):
         self.go_to("main", direction)
 
     def delete_category(self, category_id):
-        delete_category_from_db(category_id)
-        screen = self.root.ids.sm.get_screen("categories")
-        widget = screen.ids.category_widget
-        widget.show_categories()
+        run_db(delete_category_from_db, category_id, on_done=lambda _: category_store.remove(category_id))
 
     mode = "record"  # "record" или "history"
 
@@ -401,36 +854,36 @@ class MainApp(App):
         self.go_to("categories", "slide_right")
 
     def category_selected(self, cat_id, cat_name):
-        sm = self.root.ids.sm
         if self.mode == "record":
-            record = sm.get_screen("record")
+            record = self.screen("record")
             record.category_id = cat_id
             record.category_name = cat_name
             self.go_to("record", "slide_left")
         else:
-            history = sm.get_screen("history")
+            history = self.screen("history")
             history.category_id = cat_id
             history.category_name = cat_name
             history.load_history()
             self.go_to("history", "slide_right")
 
     def open_operation_detail(self, full_text):
-        sm = self.root.ids.sm
-        screen = sm.get_screen("operation_detail")
+        screen = self.screen("operation_detail")
         screen.operation_text = full_text
         self.go_to("operation_detail", "slide_right")
 
     def delete_operation(self, op_id):
-        conn, cur = get_db()
-        cur.execute("DELETE FROM operations WHERE id=?", (op_id,))
-        conn.commit()
-        conn.close()
-        screen = self.root.ids.sm.get_screen("history")
-        screen.load_history()
+        def deleted(operation):
+            forget_operation_texts(op_id)
+            if operation is not None:
+                operation_feed.deleted(operation)
+
+        run_db(get_repo().delete_operation, op_id, on_done=deleted)
 
 class AddCategoryScreen(Screen):
     selected_color = "#1F1F1F"
     def on_enter(self):
+        from kivy.uix.button import Button
+
         grid = self.ids.get("color_grid")
         if not grid:
             return
@@ -466,32 +919,25 @@ class AddCategoryScreen(Screen):
             return
 
         short_name = name[:13] + "..." if len(name) > 13 else name
-        conn, cur = get_db()
-        cur.execute("SELECT id FROM categories WHERE name = ?", (name,))
-        exists = cur.fetchone()
-
-        if exists:
-            msg.text = f"Ошибка: категория '{short_name}' уже существует"
-            msg.color = (1, 0, 0, 1)
-            msg.halign = "center"
-            msg.valign = "middle"
-            msg.text_size = msg.size
-            Clock.schedule_once(clear_msg, 3)
-        else:
-            cur.execute(
-                "INSERT INTO categories (name, color) VALUES (?, ?)",
-                (name, self.selected_color)
-            )
-            conn.commit()
-            msg.text = f"Категория '{short_name}' добавлена"
-            msg.color = (0, 1, 0, 1)
+        button = self.ids.addcategory
+        button.disabled = True  # пока запрос в работе
+
+        def added(category_id):
+            button.disabled = False
+            if category_id is None:
+                msg.text = f"Ошибка: категория '{short_name}' уже существует"
+                msg.color = (1, 0, 0, 1)
+            else:
+                category_store.add(Category(category_id, name, color))
+                msg.text = f"Категория '{short_name}' добавлена"
+                msg.color = (0, 1, 0, 1)
             msg.halign = "center"
             msg.valign = "middle"
             msg.text_size = msg.size
             Clock.schedule_once(clear_msg, 3)
 
-        cur.close()
-        conn.close()
+        color = self.selected_color
+        run_db(get_repo().add_category_if_missing, name, color, on_done=added)
         self.ids.category_input.text = ""
 
 class CategoryButton(FloatLayout):
@@ -503,38 +949,143 @@ class RootWidget(FloatLayout):
     pass
 
 class MainScreen(Screen):
+    # период диаграмм: ключ timeutil.PERIODS; для "custom" — даты в custom_range
+    period = StringProperty("all")
+    period_text = StringProperty("")
+    custom_range = None
+    # итоги последнего показа: {category_id: CategoryTotals} и их период
+    # (since, until); записи операций правят их на месте, так что повторный
+    # вход на экран с тем же периодом не ходит в базу
+    _totals = None
+    _totals_range = None
+
+    def on_kv_post(self, base_widget):
+        operation_feed.subscribe(self._on_operation)
+        category_store.subscribe(self._on_category)
 
     def on_enter(self):
         Clock.schedule_once(self.animate_chart, 0)
 
+    def on_leave(self):
+        cancel_db("main")
+
+    def set_period(self, period):
+        self.period = period
+        self.animate_chart(0)
+
+    def ask_custom_range(self):
+        from kivy.uix.boxlayout import BoxLayout
+        from kivy.uix.button import Button
+        from kivy.uix.popup import Popup
+        from kivy.uix.textinput import TextInput
+
+        if self.custom_range:
+            since, until = self.custom_range
+        else:
+            # по умолчанию — с начала месяца по сегодня
+            since = format_ts(period_range("month")[0], "%Y-%m-%d")
+            until = format_ts(now_ts(), "%Y-%m-%d")
+
+        box = BoxLayout(orientation="vertical", spacing=6, padding=6)
+        date_from = TextInput(text=since, hint_text="С (ГГГГ-ММ-ДД)", multiline=False)
+        date_to = TextInput(text=until, hint_text="По (ГГГГ-ММ-ДД)", multiline=False)
+        error = Label(text="", color=(1, 0, 0, 1))
+        apply = Button(text="Показать")
+        for w in (date_from, date_to, error, apply):
+            box.add_widget(w)
+        popup = Popup(title="Период", content=box, size_hint=(0.85, 0.45))
+
+        def on_apply(*args):
+            try:
+                custom = (date_from.text.strip(), date_to.text.strip())
+                since_ts, until_ts = period_range("custom", custom=custom)
+            except ValueError:
+                error.text = "Даты в формате ГГГГ-ММ-ДД"
+                return
+            if since_ts >= until_ts:
+                error.text = "Начало позже конца"
+                return
+            self.custom_range = custom
+            popup.dismiss()
+            self.set_period("custom")
+
+        def on_dismiss(*args):
+            # отмена: вернуть кнопкам состояние текущего периода
+            self.property("period").dispatch(self)
+
+        apply.bind(on_release=on_apply)
+        popup.bind(on_dismiss=on_dismiss)
+        popup.open()
+
+    @timed()
     def animate_chart(self, dt):
-        conn, cur = get_db()
+        loading = self.ids.get("loading_label")
+        if loading:
+            loading.opacity = 1
+
+        # «всё время» — готовые итоги из category_totals, остальные периоды —
+        # диапазон индекса по created_ts для каждой категории
+        since, until = period_range(self.period, custom=self.custom_range)
+        if self.period == "custom" and self.custom_range:
+            self.period_text = "с {} по {}".format(*self.custom_range)
+        elif since is not None:
+            self.period_text = f"с {format_ts(since, '%Y-%m-%d')}"
+        else:
+            self.period_text = ""
 
-        # --- Доходы ---
-        cur.execute("""
-            SELECT c.name, c.color,
-                   COALESCE(SUM(CASE WHEN o.type='доход' THEN o.amount_cents ELSE 0 END), 0)
-            FROM categories c
-            LEFT JOIN operations o ON o.category_id = c.id
-            GROUP BY c.id
-        """)
-        income_rows = cur.fetchall()
+        cancel_db("main")  # ответ для прежнего периода уже не нужен
+        if self._totals is not None and self._totals_range == (since, until):
+            # повторный вход: итоги в памяти уже актуальны — без анимации
+            self._show_totals(list(self._totals.values()), animate=False)
+            return
+        run_db(
+            load_period_totals, since, until, tag="main",
+            on_done=lambda result: self._totals_loaded((since, until), *result),
+        )
 
-        income_rows = [r for r in income_rows if r[2] > 0]
+    def _totals_loaded(self, totals_range, totals, cached=False):
+        self._totals_range = totals_range
+        self._totals = {t.category_id: t for t in totals}
+        # анимация — только когда итоги пришлось считать
+        self._show_totals(totals, animate=not cached)
 
-        # --- Расходы ---
-        cur.execute("""
-            SELECT c.name, c.color,
-                   COALESCE(SUM(CASE WHEN o.type='расход' THEN -o.amount_cents ELSE 0 END), 0)
-            FROM categories c
-            LEFT JOIN operations o ON o.category_id = c.id
-            GROUP BY c.id
-        """)
-        expense_rows = cur.fetchall()
+    def _on_operation(self, feed, change):
+        if self._totals is None:
+            return
+        operation = change.operation
+        since, until = self._totals_range
+        if (since is not None and operation.created_ts < since) or \
+                (until is not None and operation.created_ts >= until):
+            return
+        totals = self._totals.get(operation.category_id)
+        if totals is None:
+            category = category_store.get(operation.category_id)
+            if category is None:
+                self._totals = None  # категории нет в памяти — перечитаем при входе
+                return
+            totals = CategoryTotals(category.id, category.name, category.color, 0, 0)
+        sign = 1 if change.kind == "add" else -1
+        income, expense = operation_delta(operation)
+        self._totals[operation.category_id] = totals._replace(
+            income_cents=totals.income_cents + sign * income,
+            expense_cents=totals.expense_cents + sign * expense,
+        )
 
-        expense_rows = [r for r in expense_rows if r[2] > 0]
+    def _on_category(self, store, change):
+        if change.kind == "remove" and self._totals is not None:
+            self._totals.pop(change.category.id, None)
 
-        conn.close()
+    @timed()
+    def _show_totals(self, totals, animate=True):
+        loading = self.ids.get("loading_label")
+        if loading:
+            loading.opacity = 0
+
+        # --- Доходы ---
+        income_rows = [(t.name, t.color, t.income_cents) for t in totals if t.income_cents > 0]
+
+        # --- Расходы ---
+        expense_rows = [(t.name, t.color, t.expense_cents) for t in totals if t.expense_cents > 0]
 
         # --- Анимация доходов ---
         income_chart = self.ids.get("pie_chart_income")
@@ -549,7 +1100,7 @@ class MainScreen(Screen):
                 labels = [r[0] for r in income_rows]
                 colors = [r[1] for r in income_rows]
                 values = [r[2] for r in income_rows]
-                income_chart.start(values, colors, labels)
+                income_chart.start(values, colors, labels, animate)
 
             if income_label:
                 income_label.opacity = 1
@@ -577,7 +1128,7 @@ class MainScreen(Screen):
                 labels = [r[0] for r in expense_rows]
                 colors = [r[1] for r in expense_rows]
                 values = [r[2] for r in expense_rows]
-                expense_chart.start(values, colors, labels)
+                expense_chart.start(values, colors, labels, animate)
 
             if expense_label:
                 expense_label.opacity = 1
@@ -595,59 +1146,63 @@ class MainScreen(Screen):
 
 
 class OperationScreen(Screen):
+    # операции одной категории; список, как в истории, держится в актуальном
+    # виде событиями operation_feed, а не перечитыванием при каждом входе
     category_id = None
     category_name = None
 
     def on_pre_enter(self):
-        self.show_operations()
+        if self.category_id is not None and self.pager.source == self.category_id:
+            self.pager.resume()
+        else:
+            self.show_operations()
 
-    def show_operations(self):
-        from kivy.uix.label import Label
-        from kivy.uix.scrollview import ScrollView
-        from kivy.uix.boxlayout import BoxLayout
+    def on_leave(self):
+        self.pager.cancel()
+
+    def on_kv_post(self, base_widget):
+        self.pager = OperationPager(
+            self.ids.operations_rv, self._make_item,
+            tag="operations", on_page=self._update_status,
+        )
+        operation_feed.subscribe(self._on_operation)
+        category_store.subscribe(self._on_category)
 
-        layout = self.ids.operations_layout
-        layout.clear_widgets()
+    @staticmethod
+    def _make_item(op):
+        return {"text": operation_texts(op)[0]}
+
+    def show_operations(self):
+        # RecycleView держит виджеты только для видимых строк,
+        # а строки грузятся страницами — время входа не зависит от истории
+        status = self.ids.status_label
 
         if not self.category_id:
-            layout.add_widget(Label(text="Ошибка: нет категории"))
+            self.ids.operations_rv.data = []
+            status.text = "Ошибка: нет категории"
             return
 
-        conn, cur = get_db()
-        cur.execute("""
-            SELECT amount_cents, type, created_at 
-            FROM operations 
-            WHERE category_id=? 
-            ORDER BY created_at DESC
-        """, (self.category_id,))
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
-
-        if not rows:
-            layout.add_widget(Label(
-                text="Операций пока нет",
-                color=(0, 0, 0, 1),
-                font_size=18
-            ))
+        status.text = "Загрузка..."
+        self.pager.reset(self.category_id)
+
+    def _update_status(self):
+        status = self.ids.status_label
+        status.text = "" if self.ids.operations_rv.data else "Операций пока нет"
+
+    def _on_operation(self, feed, change):
+        if change.operation.category_id != self.category_id:
             return
+        if change.kind == "add":
+            self.pager.insert(change.operation)
+        else:
+            self.pager.remove(change.operation)
+        self._update_status()
 
-        for amount, type_op, dt in rows:
-            sign = "-" if amount < 0 else "+"
-            rub = abs(amount) // 100
-            kop = abs(amount) % 100
-
-            text = f"{dt} | {type_op.capitalize()} {sign}{rub}.{kop:02d}₽"
-
-            layout.add_widget(
-                Label(
-                    text=text,
-                    color=(0, 0, 0, 1),
-                    font_size=16,
-                    size_hint_y=None,
-                    height=30
-                )
-            )
+    def _on_category(self, store, change):
+        if change.kind == "remove" and change.category.id == self.category_id:
+            self.pager.clear()
+            self.category_id = None
+            self.ids.status_label.text = "Категория удалена"
 
 class CategoryScreen(Screen):
     def on_enter(self):
@@ -711,17 +1266,24 @@ class RecordScreen(Screen):
             type_op = "расход"
             amount_cents = -abs(amount_cents)
 
-        # 4. Записываем в БД с московским временем
-        conn, cur = get_db()
-        current_time = datetime.now(timezone(timedelta(hours=3)))
+        # 4. Пишем в журнал — ввод подтверждается сразу, в базу операция
+        # уйдёт пачкой; время — секунды Unix, пояс учитывается при показе.
+        # Запись без существующей категории база не примет — её нельзя
+        # и подтверждать
+        if self.category_id is None or (category_store.loaded and category_store.get(self.category_id) is None):
+            self._operation_failed("Категория удалена")
+            return
+        try:
+            write_behind.add(
+                self.category_id, amount_cents, type_op, now_ts(),
+                self.ids.note.text.strip(), self.ids.merchant.text.strip(),
+            )
+        except OSError:
+            self._operation_failed()
+            return
+        self._operation_added(type_op)
 
-        cur.execute(
-            "INSERT INTO operations(category_id, amount_cents, type, created_at) VALUES (?, ?, ?, ?)",
-            (self.category_id, amount_cents, type_op, current_time.strftime("%Y-%m-%d %H:%M:%S"))
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
+    def _operation_added(self, type_op):
 
         # 5. Показываем зелёное сообщение
         self.success_label = Label(
@@ -734,11 +1296,24 @@ class RecordScreen(Screen):
         )
         self.add_widget(self.success_label)
 
-        # 6. Чистим поле
+        # 6. Чистим поля
         self.ids.operation.text = ""
+        self.ids.note.text = ""
+        self.ids.merchant.text = ""
 
         self.reset_buttons()
 
+    def _operation_failed(self, text="Ошибка записи"):
+        self.error_label = Label(
+            text=text,
+            color=(1, 0, 0, 1),
+            font_size='24sp',
+            size_hint=(None, None),
+            size=(self.ids.operation.width, 30),
+            pos_hint={"center_x": 0.5, "center_y": 0.6}
+        )
+        self.add_widget(self.error_label)
+
     def on_enter(self):
         # Активируем кнопку "Доход"
         self.ids.income.state = "down"
@@ -777,47 +1352,219 @@ class HistoryScreen(Screen):
 
     def show_operation_detail(self, full_text):
         app = App.get_running_app()
-        sm = app.root.ids.sm
 
-        screen = sm.get_screen("operation_detail")
+        screen = app.screen("operation_detail")
         screen.operation_text = full_text
 
         app.go_to("operation_detail", "slide_right")
 
-    def load_history(self):
-        rv = self.ids.history_rv
+    _summary = None
 
-        conn, cur = get_db()
-        cur.execute("""
-            SELECT id, amount_cents, type, created_at
-            FROM operations
-            WHERE category_id=?
-            ORDER BY created_at DESC
-        """, (self.category_id,))
-        rows = cur.fetchall()
-        conn.close()
+    def on_kv_post(self, base_widget):
+        self.pager = OperationPager(self.ids.history_rv, self._make_item, tag="history")
+        operation_feed.subscribe(self._on_operation)
+        category_store.subscribe(self._on_category)
 
-        data = []
+    def on_enter(self):
+        self.pager.resume()
 
-        for op_id, amount, type_op, dt in rows:
-            sign = "-" if amount < 0 else "+"
-            rub = abs(amount) // 100
-            kop = abs(amount) % 100
+    def on_leave(self):
+        self.pager.cancel()
 
-            full = f"{dt} | {type_op.capitalize()} {sign}{rub}.{kop:02d}₽"
-            short = f"{sign}{rub}.{kop:02d}₽"
+    @staticmethod
+    def _make_item(op):
+        full, short = operation_texts(op)
+        return {
+            "op_id": op.id,
+            "full_text": full,
+            "short_text": short
+        }
 
-            data.append({
-                "op_id": op_id,
-                "full_text": full,
-                "short_text": short
-            })
+    def load_history(self):
+        # начинаем с первой страницы, остальные подгружаются при прокрутке
+        self._summary = None
+        self.pager.reset(self.category_id)
+
+        label = self.ids.get("summary_label")
+        if label:
+            label.text = "Загрузка..."
+        category_id = self.category_id
+        run_db(
+            get_repo().category_summary, category_id,
+            on_done=lambda summary: self._show_summary(category_id, summary),
+        )
+
+    def _show_summary(self, category_id, summary):
+        label = self.ids.get("summary_label")
+        if not label or category_id != self.category_id:
+            return
+        self._summary = summary
+        balance = format_amount(summary.income_cents - summary.expense_cents)
+        label.text = f"Операций: {summary.op_count} | Итого: {balance}"
+
+    def _on_operation(self, feed, change):
+        # одна строка и итоги правятся на месте, без перечитывания категории
+        operation = change.operation
+        if operation.category_id != self.category_id:
+            return
+        if change.kind == "add":
+            self.pager.insert(operation)
+            sign = 1
+        else:
+            self.pager.remove(operation)
+            sign = -1
+        if self._summary is not None:
+            income, expense = operation_delta(operation)
+            summary = self._summary
+            self._show_summary(self.category_id, summary._replace(
+                op_count=summary.op_count + sign,
+                income_cents=summary.income_cents + sign * income,
+                expense_cents=summary.expense_cents + sign * expense,
+            ))
 
-        rv.data = data
+    def _on_category(self, store, change):
+        if change.kind == "remove" and change.category.id == self.category_id:
+            self.pager.cancel()
+            self.ids.history_rv.data = []
+            self.category_id = None
+            self._summary = None
+            self.ids.summary_label.text = ""
 
 class OperationDetailScreen(Screen):
     operation_text = StringProperty("")
 
+class SearchScreen(Screen):
+    # поиск по заметкам и получателю по мере ввода; каждый ввод отменяет
+    # прошлый запрос, результаты подгружаются страницами, как история
+    def on_kv_post(self, base_widget):
+        self.pager = OperationPager(
+            self.ids.search_rv, self._make_item, tag="search", on_page=self._update_status,
+            fetch=lambda query, after, limit: get_repo().search_page(query, after, limit),
+            page_key=lambda row: row.id,
+        )
+
+    def on_enter(self):
+        self.ids.search_input.focus = True
+        self.pager.resume()
+
+    def on_leave(self):
+        self.pager.cancel()
+
+    @staticmethod
+    def _make_item(row):
+        full, short = operation_texts(row)
+        details = " — ".join(t for t in (row.merchant, row.note) if t)
+        return {"text": f"{full[:16]} | {row.category} | {short}\n{details}"}
+
+    def search(self, text):
+        status = self.ids.search_status
+        if not text.strip():
+            self.pager.clear()
+            status.text = "Введите слово из заметки или получателя"
+            return
+        status.text = "Поиск..."
+        self.pager.reset(text)
+
+    def _update_status(self):
+        self.ids.search_status.text = "" if self.ids.search_rv.data else "Ничего не найдено"
+
+class TrendScreen(Screen):
+    # динамика доходов и расходов: последние 30 дней или 12 месяцев.
+    # Читает только category_daily/category_monthly — на экране столько
+    # корзин, сколько столбиков, независимо от длины истории.
+    # Режим "balance" — накопленный баланс за всю историю (BalanceChart)
+    granularity = StringProperty("day")
+    BUCKETS = {"day": 30, "month": 12}
+
+    def on_enter(self):
+        self.show_trend()
+
+    def on_leave(self):
+        cancel_db("trend")
+
+    def set_granularity(self, granularity):
+        self.granularity = granularity
+        self.show_trend()
+
+    def show_trend(self):
+        granularity = self.granularity
+        bars, balance = self.ids.trend_chart, self.ids.balance_chart
+        bars.opacity, balance.opacity = (0, 1) if granularity == "balance" else (1, 0)
+        bars.disabled, balance.disabled = granularity == "balance", granularity != "balance"
+        if granularity == "balance":
+            self.show_balance()
+            return
+
+        if granularity == "day":
+            keys, until = day_buckets(self.BUCKETS["day"])
+        else:
+            keys, until = month_buckets(self.BUCKETS["month"])
+
+        self.ids.trend_summary.text = "Загрузка..."
+        cancel_db("trend")
+        run_db(
+            get_repo().trend, granularity, keys[0], until,
+            on_done=lambda points: self._show_points(granularity, keys, points),
+            tag="trend",
+        )
+
+    def show_balance(self):
+        # баланс строится по операциям, а не по корзинам: точность до
+        # операции нужна при приближении; ряд считается в потоке базы
+        self.ids.trend_summary.text = "Загрузка..."
+        cancel_db("trend")
+        run_db(load_balance_series, on_done=self._show_balance, tag="trend")
+
+    @timed()
+    def _show_balance(self, result):
+        if self.granularity != "balance":
+            return
+        series, key = result
+        ts, balance = series
+        if not len(ts):
+            self.ids.trend_summary.text = "Операций пока нет"
+            return
+        self.ids.trend_summary.text = f"Баланс: {format_amount(int(balance[-1]))} | операций: {len(ts)}"
+        self.ids.balance_chart.set_series(series, key)
+
+    @timed()
+    def _show_points(self, granularity, keys, points):
+        if granularity != self.granularity:
+            return
+        # корзины без операций в таблицах не хранятся — дополняем нулями
+        by_key = {p.bucket: p for p in points}
+        incomes = [by_key[k].income_cents if k in by_key else 0 for k in keys]
+        expenses = [by_key[k].expense_cents if k in by_key else 0 for k in keys]
+        # подписи: 'ДД.ММ' для дней, 'ММ.ГГ' для месяцев
+        if granularity == "day":
+            labels = [f"{k[8:10]}.{k[5:7]}" for k in keys]
+        else:
+            labels = [f"{k[5:7]}.{k[2:4]}" for k in keys]
+
+        self.ids.trend_chart.start(labels, incomes, expenses)
+        self.ids.trend_summary.text = (
+            f"Доходы: {format_amount(sum(incomes))} | Расходы: {format_amount(-sum(expenses))}"
+        )
+
+# экраны, которые MainApp.screen() создаёт по первому требованию
+LAZY_SCREENS = {
+    "record": RecordScreen,
+    "categories": CategoryScreen,
+    "addcategory": AddCategoryScreen,
+    "history": HistoryScreen,
+    "operations": OperationScreen,
+    "operation_detail": OperationDetailScreen,
+    "trend": TrendScreen,
+    "search": SearchScreen,
+}
+
+
+def widget_count(root):
+    # размер дерева виджетов — метрика для проверки, что память не растёт;
+    # неактивные экраны ScreenManager держит вне дерева, считаем и их
+    detached = [s for s in root.ids.sm.screens if s.parent is None]
+    return sum(1 for w in [root] + detached for _ in w.walk(restrict=True))
+
 if __name__ == "__main__":
     init_db()
     MainApp().run()
@@ -0,0 +1,246 @@
+# Служебные команды для data.db (без запуска интерфейса):
+#   python manage.py migrate
+#   python manage.py check-plans
+#   python manage.py rebuild-totals
+#   python manage.py rebuild-rollups
+#   python manage.py rebuild-search
+#   python manage.py import statement.csv [--category Еда] [--encoding cp1251]
+#   python manage.py export out.csv|out.ndjson|out.npz [--category Еда] [--from 2024-01-01] [--to 2024-12-31]
+#   python manage.py archive [--keep-months 24 | --before 2024-01-01] [--vacuum]
+#   python manage.py backup [--keep 7]
+#   python manage.py backups [--verify]
+#   python manage.py restore [snapshot-...]
+import argparse
+import os
+import sys
+
+import archive
+import backup
+import db
+import exporter
+import importer
+import timeutil
+
+
+def cmd_migrate(args):
+    repo = db.Repository(args.db)
+    version = repo.init_schema()
+    repo.close()
+    print(f"Схема обновлена до версии {version}")
+
+
+def cmd_check_plans(args):
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    problems = repo.check_query_plans()
+    repo.close()
+    if problems:
+        for p in problems:
+            print(p)
+        return 1
+    print("Все горячие запросы используют индексы")
+    return 0
+
+
+def cmd_rebuild_totals(args):
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    repo.rebuild_category_totals()
+    repo.close()
+    print("Итоги по категориям пересчитаны")
+
+
+def cmd_rebuild_rollups(args):
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    repo.rebuild_rollups()
+    repo.close()
+    print("Итоги по дням и месяцам пересчитаны")
+
+
+def cmd_rebuild_search(args):
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    repo.rebuild_search_index()
+    repo.close()
+    print("Поисковый индекс пересобран")
+
+
+def cmd_import(args):
+    def report(stats):
+        print(f"\r{stats.percent:5.1f}%  строк: {stats.rows_read}  "
+              f"добавлено: {stats.inserted}  дублей: {stats.duplicates}  "
+              f"{stats.rows_per_sec:,.0f} строк/с", end="", flush=True)
+
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    stats = importer.import_statement(
+        repo, args.path, fmt=args.format, default_category=args.category,
+        encoding=args.encoding, batch_size=args.batch_size, progress=report,
+    )
+    repo.close()
+    print()
+    print(f"Готово за {stats.elapsed:.1f} с: добавлено {stats.inserted}, "
+          f"пропущено дублей {stats.duplicates}, не разобрано {stats.skipped}, "
+          f"новых категорий {stats.categories_created}")
+
+
+def cmd_export(args):
+    def report(stats):
+        print(f"\rстрок: {stats.rows_written}  {stats.rows_per_sec:,.0f} строк/с", end="", flush=True)
+
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    try:
+        stats = exporter.export_operations(
+            repo, args.path, fmt=args.format, category_names=args.category,
+            date_from=args.date_from, date_to=args.date_to,
+            batch_size=args.batch_size, progress=report,
+        )
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        repo.close()
+    print()
+    print(f"Готово за {stats.elapsed:.1f} с: выгружено {stats.rows_written} операций в {args.path}")
+
+
+def cmd_archive(args):
+    def report(year, count):
+        print(f"{year}: {count} операций -> {archive.archive_file(repo, year)}")
+
+    if args.before:
+        cutoff = timeutil.day_range(args.before)[0]
+    else:
+        cutoff = archive.cutoff_for(args.keep_months)
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    try:
+        archive.resume(repo)
+        moved = archive.archive_before(repo, cutoff, progress=report)
+        if args.vacuum and moved:
+            # освободившиеся страницы и так переиспользуются; VACUUM
+            # нужен, только чтобы уменьшить сам файл
+            repo.vacuum()
+    finally:
+        repo.close()
+    print(f"В архив перенесено {moved} операций старше {timeutil.format_ts(cutoff, '%Y-%m-%d')}")
+
+
+def _size(n):
+    return f"{n / 2 ** 20:.1f} МБ"
+
+
+def cmd_backup(args):
+    repo = db.Repository(args.db)
+    repo.init_schema()
+    try:
+        directory = args.dir or backup.backup_dir(repo.path)
+        snapshot = backup.create_snapshot(repo, directory, level=args.level)
+        backup.prune(directory, args.keep)
+    finally:
+        repo.close()
+    size = sum(f["size"] for f in snapshot.files.values())
+    compressed = sum(f["compressed"] for f in snapshot.files.values())
+    print(f"Снимок {snapshot.path}: {_size(size)} -> {_size(compressed)}, "
+          f"копия {snapshot.copy_s:.1f} с, сжатие {snapshot.compress_s:.1f} с")
+
+
+def cmd_backups(args):
+    snapshots = backup.list_snapshots(args.dir or backup.backup_dir(args.db))
+    if not snapshots:
+        print("Снимков нет")
+        return 0
+    failed = False
+    for snapshot in snapshots:
+        compressed = sum(f["compressed"] for f in snapshot.files.values())
+        line = (f"{os.path.basename(snapshot.path)}  {_size(compressed)}  "
+                f"файлов: {len(snapshot.files)}  схема v{snapshot.schema_version}")
+        if args.verify:
+            problems = backup.verify_snapshot(snapshot)
+            failed = failed or bool(problems)
+            line += "  " + ("; ".join(problems) if problems else "ok")
+        print(line)
+    return 1 if failed else 0
+
+
+def cmd_restore(args):
+    # приложение должно быть закрыто: файлы базы подменяются на месте
+    snapshots = backup.list_snapshots(args.dir or backup.backup_dir(args.db))
+    if args.snapshot:
+        snapshots = [s for s in snapshots if os.path.basename(s.path) == args.snapshot]
+    if not snapshots:
+        print("Снимок не найден")
+        return 1
+    try:
+        restored, moved = backup.restore_snapshot(snapshots[0], args.db)
+    except ValueError as e:
+        print(f"Снимок не прошёл проверку, база не тронута: {e}")
+        return 1
+    print(f"Восстановлено из {os.path.basename(snapshots[0].path)}: {', '.join(restored)}")
+    if moved:
+        print(f"Прежние файлы: {', '.join(moved)}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="CashPilot: обслуживание базы данных")
+    parser.add_argument("--db", default=db.DB_NAME, help="путь к базе (по умолчанию data.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("migrate", help="обновить схему до текущей версии").set_defaults(func=cmd_migrate)
+    sub.add_parser("check-plans", help="проверить EXPLAIN QUERY PLAN горячих запросов").set_defaults(func=cmd_check_plans)
+    sub.add_parser("rebuild-totals", help="пересчитать таблицу category_totals").set_defaults(func=cmd_rebuild_totals)
+    sub.add_parser("rebuild-rollups", help="пересчитать итоги по дням и месяцам (например, после смены часового пояса)").set_defaults(func=cmd_rebuild_rollups)
+    sub.add_parser("rebuild-search", help="пересобрать полнотекстовый индекс заметок").set_defaults(func=cmd_rebuild_search)
+
+    p = sub.add_parser("import", help="импортировать выписку CSV или OFX")
+    p.add_argument("path")
+    p.add_argument("--format", choices=("csv", "ofx"), help="по умолчанию — по расширению файла")
+    p.add_argument("--category", default=importer.DEFAULT_CATEGORY, help="категория для строк без своей категории")
+    p.add_argument("--encoding", help="кодировка файла (например cp1251)")
+    p.add_argument("--batch-size", type=int, default=importer.BATCH_SIZE)
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="выгрузить операции в CSV, NDJSON или колонки NumPy (.npz)")
+    p.add_argument("path")
+    p.add_argument("--format", choices=exporter.FORMATS, help="по умолчанию — по расширению файла")
+    p.add_argument("--category", action="append", help="только эта категория (можно несколько раз)")
+    p.add_argument("--from", dest="date_from", help="с даты ГГГГ-ММ-ДД включительно")
+    p.add_argument("--to", dest="date_to", help="по дату ГГГГ-ММ-ДД включительно")
+    p.add_argument("--batch-size", type=int, default=exporter.BATCH_SIZE)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("archive", help="перенести старые операции в архивы по годам")
+    group = p.add_mutually_exclusive_group()
+    group.add_argument("--keep-months", type=int, default=archive.DEFAULT_KEEP_MONTHS,
+                       help=f"оставить в базе последние N месяцев (по умолчанию {archive.DEFAULT_KEEP_MONTHS})")
+    group.add_argument("--before", help="перенести операции раньше даты ГГГГ-ММ-ДД")
+    p.add_argument("--vacuum", action="store_true", help="после переноса уменьшить файл базы (VACUUM)")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("backup", help="снять сжатый снимок базы с контрольными суммами")
+    p.add_argument("--dir", help="каталог снимков (по умолчанию <база>.backups)")
+    p.add_argument("--keep", type=int, default=backup.DEFAULT_KEEP, help="сколько последних снимков хранить")
+    p.add_argument("--level", type=int, default=backup.COMPRESS_LEVEL, help="уровень gzip 1-9")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("backups", help="список снимков")
+    p.add_argument("--dir")
+    p.add_argument("--verify", action="store_true", help="сверить sha256 каждого файла")
+    p.set_defaults(func=cmd_backups)
+
+    p = sub.add_parser("restore", help="восстановить базу из снимка (при закрытом приложении)")
+    p.add_argument("snapshot", nargs="?", help="имя каталога снимка; по умолчанию — последний")
+    p.add_argument("--dir")
+    p.set_defaults(func=cmd_restore)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
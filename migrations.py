@@ -0,0 +1,480 @@
+# --- Миграции схемы ---
+# Версия схемы хранится в PRAGMA user_version. Миграция N переводит базу
+# из версии N-1 в версию N; каждая выполняется в своей транзакции, так что
+# прерванное обновление просто повторится при следующем запуске.
+# Миграции только добавляют таблицы/индексы/колонки — без пересоздания
+# таблицы operations, иначе обновление большой базы займёт минуты.
+# Исключение одно — v5 (created_ts): значение новой колонки считается из
+# created_at, так что UPDATE проходит по каждой строке (~5 с на 1 млн
+# операций). Таблица при этом не копируется, а UPDATE идёт одной
+# транзакцией: прерванный перенос откатывается и повторяется целиком,
+# половины строк в UTC, а половины в UTC+3 не бывает.
+
+import os
+import sqlite3
+
+import timeutil
+
+
+def _v1_base_schema(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS categories (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE,
+                    color TEXT DEFAULT '#1F1F1F'
+                  );""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS operations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+                    amount_cents INTEGER,
+                    type TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                  );""")
+
+
+def _v2_operations_indexes(conn):
+    # история категории: WHERE category_id=? ORDER BY created_at DESC, id DESC
+    # (id — для стабильного порядка при одинаковом времени);
+    # amount_cents и type в индексе, чтобы не ходить в саму таблицу
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_operations_history
+                    ON operations(category_id, created_at, id, amount_cents, type);""")
+    # суммы по категориям для диаграмм
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_operations_category_type
+                    ON operations(category_id, type, amount_cents);""")
+
+
+# вклад одной операции в итоги; NEW/OLD подставляются в триггерах
+_INCOME_OF = "(CASE WHEN {r}.type='доход' THEN {r}.amount_cents ELSE 0 END)"
+_EXPENSE_OF = "(CASE WHEN {r}.type='расход' THEN -{r}.amount_cents ELSE 0 END)"
+
+
+def _totals_add(row, sign):
+    # строку итогов создаём только при добавлении: при каскадном удалении
+    # категории её строка уже удалена, и вставка нарушила бы внешний ключ
+    ensure_row = ""
+    if sign == "+":
+        ensure_row = f"INSERT OR IGNORE INTO category_totals(category_id) VALUES ({row}.category_id);"
+    return f"""
+        {ensure_row}
+        UPDATE category_totals
+           SET income_cents = income_cents {sign} {_INCOME_OF.format(r=row)},
+               expense_cents = expense_cents {sign} {_EXPENSE_OF.format(r=row)},
+               op_count = op_count {sign} 1
+         WHERE category_id = {row}.category_id;"""
+
+
+def rebuild_category_totals(conn):
+    # полный пересчёт — после ручной правки базы или при подозрении на расхождение
+    conn.execute("DELETE FROM category_totals")
+    conn.execute("INSERT INTO category_totals(category_id) SELECT id FROM categories")
+    add_category_totals(conn, "main.operations")
+
+
+def add_category_totals(conn, source):
+    # добавляет к итогам вклад операций из source — таблицы operations
+    # основной базы или подключённого архива
+    conn.execute(f"""INSERT INTO category_totals(category_id, income_cents, expense_cents, op_count)
+                     SELECT o.category_id,
+                            SUM({_INCOME_OF.format(r='o')}),
+                            SUM({_EXPENSE_OF.format(r='o')}),
+                            COUNT(*)
+                     FROM {source} o
+                     WHERE o.category_id IN (SELECT id FROM main.categories)
+                     GROUP BY o.category_id
+                     ON CONFLICT(category_id) DO UPDATE
+                        SET income_cents = income_cents + excluded.income_cents,
+                            expense_cents = expense_cents + excluded.expense_cents,
+                            op_count = op_count + excluded.op_count""")
+
+
+def _v3_category_totals(conn):
+    # итоги по категориям для главного экрана, поддерживаются триггерами,
+    # так что диаграммы читают O(категорий) строк вместо всей истории
+    conn.execute("""CREATE TABLE IF NOT EXISTS category_totals (
+                    category_id INTEGER PRIMARY KEY REFERENCES categories(id) ON DELETE CASCADE,
+                    income_cents INTEGER NOT NULL DEFAULT 0,
+                    expense_cents INTEGER NOT NULL DEFAULT 0,
+                    op_count INTEGER NOT NULL DEFAULT 0
+                  );""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_categories_totals_insert
+                    AFTER INSERT ON categories
+                    BEGIN
+                        INSERT OR IGNORE INTO category_totals(category_id) VALUES (NEW.id);
+                    END;""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_totals_insert
+                     AFTER INSERT ON operations
+                     WHEN NEW.category_id IS NOT NULL
+                     BEGIN {_totals_add("NEW", "+")}
+                     END;""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_totals_delete
+                     AFTER DELETE ON operations
+                     WHEN OLD.category_id IS NOT NULL
+                     BEGIN {_totals_add("OLD", "-")}
+                     END;""")
+    # при изменении операции снимаем старый вклад и добавляем новый
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_totals_update_old
+                     AFTER UPDATE OF category_id, amount_cents, type ON operations
+                     WHEN OLD.category_id IS NOT NULL
+                     BEGIN {_totals_add("OLD", "-")}
+                     END;""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_totals_update_new
+                     AFTER UPDATE OF category_id, amount_cents, type ON operations
+                     WHEN NEW.category_id IS NOT NULL
+                     BEGIN {_totals_add("NEW", "+")}
+                     END;""")
+    rebuild_category_totals(conn)
+
+
+def _v4_import_key(conn):
+    # ключ строки выписки для повторного импорта без дублей; ADD COLUMN
+    # не переписывает таблицу, а частичный индекс не хранит NULL ручного ввода
+    conn.execute("ALTER TABLE operations ADD COLUMN import_key TEXT")
+    conn.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_operations_import_key
+                    ON operations(import_key) WHERE import_key IS NOT NULL;""")
+
+
+# created_at ('ГГГГ-ММ-ДД ЧЧ:ММ:СС', UTC) -> секунды Unix. Сам created_at
+# остаётся для внешних инструментов: приложение пишет в него то же время
+# в UTC, в том же виде, что и CURRENT_TIMESTAMP по умолчанию
+_LEGACY_TIME_TO_TS = "CAST(strftime('%s', {col}) AS INTEGER)"
+
+
+def _v5_created_ts(conn):
+    # created_ts — секунды Unix (UTC); на нём теперь индекс истории и
+    # выборки по периодам. Строки created_at писались по UTC+3 — переводим
+    # их в UTC тем же UPDATE. Старый индекс удаляем до UPDATE, чтобы не
+    # перестраивать его построчно, и создаём заново уже по created_ts.
+    # Единственная миграция, переписывающая все строки, — см. заголовок
+    offset = timeutil.LEGACY_UTC_OFFSET
+    conn.execute("DROP INDEX IF EXISTS idx_operations_history")
+    conn.execute("ALTER TABLE operations ADD COLUMN created_ts INTEGER")
+    conn.execute(f"""UPDATE operations
+                     SET created_ts = {_LEGACY_TIME_TO_TS.format(col='created_at')} - {offset},
+                         created_at = datetime(created_at, '-{offset} seconds')
+                     WHERE created_at IS NOT NULL""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_operations_history
+                    ON operations(category_id, created_ts, id, amount_cents, type);""")
+    # вставка без created_ts (старая версия приложения, ручной SQL):
+    # время берём из created_at, который по умолчанию CURRENT_TIMESTAMP (UTC)
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_created_ts
+                     AFTER INSERT ON operations
+                     WHEN NEW.created_ts IS NULL
+                     BEGIN
+                         UPDATE operations
+                            SET created_ts = {_LEGACY_TIME_TO_TS.format(col='NEW.created_at')}
+                          WHERE id = NEW.id;
+                     END;""")
+
+
+# ---------------------------
+# Помесячные и подневные итоги по категориям
+# ---------------------------
+# Ключ корзины — локальная дата операции ('ГГГГ-ММ-ДД' / 'ГГГГ-ММ') в поясе
+# устройства на момент записи. После смены пояса корзины пересобираются
+# командой manage.py rebuild-rollups.
+ROLLUPS = (
+    # (таблица, колонка ключа, выражение ключа по created_ts)
+    ("category_daily", "day", "date({r}.created_ts, 'unixepoch', 'localtime')"),
+    ("category_monthly", "month", "strftime('%Y-%m', {r}.created_ts, 'unixepoch', 'localtime')"),
+)
+
+
+def _rollup_add(table, key_col, key_expr, row, sign):
+    # то же, что _totals_add, но для строки (категория, корзина); опустевшая
+    # корзина удаляется, чтобы таблица совпадала с rebuild_rollups
+    key = key_expr.format(r=row)
+    ensure_row = drop_empty = ""
+    if sign == "+":
+        ensure_row = (f"INSERT OR IGNORE INTO {table}(category_id, {key_col}) "
+                      f"VALUES ({row}.category_id, {key});")
+    else:
+        drop_empty = (f"DELETE FROM {table} WHERE category_id = {row}.category_id "
+                      f"AND {key_col} = {key} AND op_count = 0;")
+    return f"""
+        {ensure_row}
+        UPDATE {table}
+           SET income_cents = income_cents {sign} {_INCOME_OF.format(r=row)},
+               expense_cents = expense_cents {sign} {_EXPENSE_OF.format(r=row)},
+               op_count = op_count {sign} 1
+         WHERE category_id = {row}.category_id AND {key_col} = {key};
+        {drop_empty}"""
+
+
+def rebuild_rollups(conn):
+    for table, _, _ in ROLLUPS:
+        conn.execute(f"DELETE FROM {table}")
+    add_rollups(conn, "main.operations")
+
+
+def add_rollups(conn, source):
+    # то же, что add_category_totals, для корзин по дням и месяцам
+    for table, key_col, key_expr in ROLLUPS:
+        conn.execute(f"""INSERT INTO {table}(category_id, {key_col}, income_cents, expense_cents, op_count)
+                         SELECT o.category_id, {key_expr.format(r='o')},
+                                SUM({_INCOME_OF.format(r='o')}),
+                                SUM({_EXPENSE_OF.format(r='o')}),
+                                COUNT(*)
+                         FROM {source} o
+                         WHERE o.category_id IN (SELECT id FROM main.categories)
+                           AND o.created_ts IS NOT NULL
+                         GROUP BY 1, 2
+                         ON CONFLICT(category_id, {key_col}) DO UPDATE
+                            SET income_cents = income_cents + excluded.income_cents,
+                                expense_cents = expense_cents + excluded.expense_cents,
+                                op_count = op_count + excluded.op_count""")
+
+
+def _v6_rollups(conn):
+    # графики динамики читают корзины, а не операции: стоимость графика
+    # зависит от числа дней/месяцев на экране, а не от длины истории
+    for table, key_col, key_expr in ROLLUPS:
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS {table} (
+                         category_id INTEGER NOT NULL REFERENCES categories(id) ON DELETE CASCADE,
+                         {key_col} TEXT NOT NULL,
+                         income_cents INTEGER NOT NULL DEFAULT 0,
+                         expense_cents INTEGER NOT NULL DEFAULT 0,
+                         op_count INTEGER NOT NULL DEFAULT 0,
+                         PRIMARY KEY (category_id, {key_col})
+                       ) WITHOUT ROWID;""")
+        # суммы по всем категориям за диапазон корзин — по этому индексу
+        conn.execute(f"""CREATE INDEX IF NOT EXISTS idx_{table}_{key_col}
+                         ON {table}({key_col}, income_cents, expense_cents);""")
+
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_{table}_insert
+                         AFTER INSERT ON operations
+                         WHEN NEW.category_id IS NOT NULL AND NEW.created_ts IS NOT NULL
+                         BEGIN {_rollup_add(table, key_col, key_expr, "NEW", "+")}
+                         END;""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_{table}_delete
+                         AFTER DELETE ON operations
+                         WHEN OLD.category_id IS NOT NULL AND OLD.created_ts IS NOT NULL
+                         BEGIN {_rollup_add(table, key_col, key_expr, "OLD", "-")}
+                         END;""")
+        # UPDATE OF включает created_ts: так же срабатывает и заполнение
+        # created_ts триггером trg_operations_created_ts
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_{table}_update_old
+                         AFTER UPDATE OF category_id, amount_cents, type, created_ts ON operations
+                         WHEN OLD.category_id IS NOT NULL AND OLD.created_ts IS NOT NULL
+                         BEGIN {_rollup_add(table, key_col, key_expr, "OLD", "-")}
+                         END;""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_{table}_update_new
+                         AFTER UPDATE OF category_id, amount_cents, type, created_ts ON operations
+                         WHEN NEW.category_id IS NOT NULL AND NEW.created_ts IS NOT NULL
+                         BEGIN {_rollup_add(table, key_col, key_expr, "NEW", "+")}
+                         END;""")
+    rebuild_rollups(conn)
+
+
+# ---------------------------
+# Заметки и получатель операции + полнотекстовый поиск (FTS5)
+# ---------------------------
+# operations_fts — external content таблица: текст хранится только в
+# operations, в FTS лежит лишь индекс. Триггеры держат его в синхроне;
+# операции без заметки и получателя в индекс не попадают вовсе, поэтому
+# и 'delete' для них не выполняется (для external content удалять
+# из индекса можно только то, что в него добавлялось).
+_HAS_TEXT = "({r}.note IS NOT NULL OR {r}.merchant IS NOT NULL)"
+_FTS_ADD = ("INSERT INTO operations_fts(rowid, note, merchant) "
+            "VALUES ({r}.id, {r}.note, {r}.merchant);")
+_FTS_REMOVE = ("INSERT INTO operations_fts(operations_fts, rowid, note, merchant) "
+               "VALUES ('delete', {r}.id, {r}.note, {r}.merchant);")
+
+
+def rebuild_search_index(conn):
+    conn.execute("INSERT INTO operations_fts(operations_fts) VALUES ('delete-all')")
+    conn.execute(f"""INSERT INTO operations_fts(rowid, note, merchant)
+                     SELECT id, note, merchant FROM operations o
+                     WHERE {_HAS_TEXT.format(r='o')}""")
+
+
+def _v7_notes_search(conn):
+    conn.execute("ALTER TABLE operations ADD COLUMN note TEXT")
+    conn.execute("ALTER TABLE operations ADD COLUMN merchant TEXT")
+    # prefix='2 3' — готовые индексы префиксов для поиска по мере ввода
+    conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS operations_fts USING fts5(
+                        note, merchant,
+                        content='operations', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2',
+                        prefix='2 3'
+                    );""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_fts_insert
+                     AFTER INSERT ON operations
+                     WHEN {_HAS_TEXT.format(r='NEW')}
+                     BEGIN {_FTS_ADD.format(r='NEW')}
+                     END;""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_fts_delete
+                     AFTER DELETE ON operations
+                     WHEN {_HAS_TEXT.format(r='OLD')}
+                     BEGIN {_FTS_REMOVE.format(r='OLD')}
+                     END;""")
+    # старый текст убираем до добавления нового — одним триггером, чтобы
+    # не зависеть от порядка срабатывания двух триггеров
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_operations_fts_update
+                     AFTER UPDATE OF note, merchant ON operations
+                     BEGIN
+                         INSERT INTO operations_fts(operations_fts, rowid, note, merchant)
+                         SELECT 'delete', OLD.id, OLD.note, OLD.merchant
+                         WHERE {_HAS_TEXT.format(r='OLD')};
+                         INSERT INTO operations_fts(rowid, note, merchant)
+                         SELECT NEW.id, NEW.note, NEW.merchant
+                         WHERE {_HAS_TEXT.format(r='NEW')};
+                     END;""")
+
+
+def _v8_entry_uuid(conn):
+    # ключ записи из журнала отложенной записи (journal.py): повтор журнала
+    # после сбоя вставляет только то, чего ещё нет в базе
+    conn.execute("ALTER TABLE operations ADD COLUMN entry_uuid TEXT")
+    conn.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_operations_entry_uuid
+                    ON operations(entry_uuid) WHERE entry_uuid IS NOT NULL;""")
+
+
+# ---------------------------
+# Версия данных для кэша диаграмм
+# ---------------------------
+# meta('data_version') растёт при любом изменении операций и категорий;
+# кэш диаграмм на диске (chartcache.py) хранит результат вместе с версией,
+# по которой он посчитан, и после перезапуска отдаёт его без запросов
+# и отрисовки, если версия не сменилась. Триггеры построчные (других в
+# SQLite нет), но обновляют одну и ту же строку одной страницы.
+DATA_VERSION_SOURCES = (
+    ("operations", "INSERT"), ("operations", "DELETE"),
+    ("operations", "UPDATE OF category_id, amount_cents, type, created_ts"),
+    ("categories", "INSERT"), ("categories", "DELETE"),
+    ("categories", "UPDATE OF name, color"),
+)
+_BUMP_DATA_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'data_version';"
+
+
+def _v9_data_version(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                  ) WITHOUT ROWID;""")
+    conn.execute("INSERT OR IGNORE INTO meta(key, value) VALUES ('data_version', 0)")
+    # случайный id файла базы: у заново созданной базы версии снова идут
+    # с нуля, и без него она получила бы чужие диаграммы из кэша
+    conn.execute("INSERT OR IGNORE INTO meta(key, value) VALUES ('data_id', abs(random()))")
+    for table, event in DATA_VERSION_SOURCES:
+        name = event.split()[0].lower()
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_data_version_{name}
+                         AFTER {event} ON {table}
+                         BEGIN {_BUMP_DATA_VERSION}
+                         END;""")
+
+
+# ---------------------------
+# Архив прошлых лет (archive.py)
+# ---------------------------
+# Старые операции переезжают в файлы по годам; archives — их список с
+# границами created_ts и id, по которым чтение решает, какие файлы
+# подключать (ATTACH). Итоги, корзины и версия данных архив не замечают:
+# пока meta 'archiving' = 1, их триггеры на вставку и удаление операций
+# не срабатывают, так что перенос строк в архив и обратно их не меняет.
+# Поисковый индекс следует за таблицей: заметки архивных операций не ищутся.
+NOT_ARCHIVING = "(SELECT value FROM meta WHERE key = 'archiving') IS NOT 1"
+
+
+def _v10_archives(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS archives (
+                    year INTEGER PRIMARY KEY,
+                    file TEXT NOT NULL,
+                    min_ts INTEGER,
+                    max_ts INTEGER,
+                    min_id INTEGER,
+                    max_id INTEGER,
+                    op_count INTEGER NOT NULL DEFAULT 0
+                  );""")
+    conn.execute("INSERT OR IGNORE INTO meta(key, value) VALUES ('archiving', 0)")
+
+    # триггеры вставки и удаления из v3, v6 и v9 — те же, с условием NOT_ARCHIVING
+    triggers = [
+        ("trg_operations_totals_insert", "INSERT", "NEW.category_id IS NOT NULL", _totals_add("NEW", "+")),
+        ("trg_operations_totals_delete", "DELETE", "OLD.category_id IS NOT NULL", _totals_add("OLD", "-")),
+        ("trg_operations_data_version_insert", "INSERT", "1", _BUMP_DATA_VERSION),
+        ("trg_operations_data_version_delete", "DELETE", "1", _BUMP_DATA_VERSION),
+    ]
+    for table, key_col, key_expr in ROLLUPS:
+        for event, row, sign in (("INSERT", "NEW", "+"), ("DELETE", "OLD", "-")):
+            triggers.append((
+                f"trg_operations_{table}_{event.lower()}", event,
+                f"{row}.category_id IS NOT NULL AND {row}.created_ts IS NOT NULL",
+                _rollup_add(table, key_col, key_expr, row, sign),
+            ))
+    for name, event, when, body in triggers:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"""CREATE TRIGGER {name}
+                         AFTER {event} ON operations
+                         WHEN {when} AND {NOT_ARCHIVING}
+                         BEGIN {body}
+                         END;""")
+
+
+# Уникальный индекс import_key видит только main.operations: без отдельного
+# списка повторный импорт выписки за архивный год вставил бы её заново.
+# archived_import_keys — ключи перенесённых в архив строк; её пополняет
+# перенос (archive.py) в той же транзакции, что удаляет строки из
+# основной таблицы, а импорт пропускает ключи из неё.
+def _v11_archived_import_keys(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS archived_import_keys (
+                    import_key TEXT PRIMARY KEY
+                  ) WITHOUT ROWID;""")
+    # уже существующие архивы: ATTACH в транзакции миграции запрещён,
+    # поэтому ключи читаются отдельным соединением
+    main_file = next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main")
+    if not main_file:
+        return
+    for (file,) in conn.execute("SELECT file FROM archives").fetchall():
+        path = os.path.join(os.path.dirname(main_file), file)
+        if not os.path.exists(path):
+            continue
+        archive = sqlite3.connect(path)
+        try:
+            keys = archive.execute(
+                "SELECT import_key FROM operations WHERE import_key IS NOT NULL"
+            ).fetchall()
+        finally:
+            archive.close()
+        conn.executemany("INSERT OR IGNORE INTO archived_import_keys(import_key) VALUES (?)", keys)
+
+
+MIGRATIONS = [
+    _v1_base_schema,
+    _v2_operations_indexes,
+    _v3_category_totals,
+    _v4_import_key,
+    _v5_created_ts,
+    _v6_rollups,
+    _v7_notes_search,
+    _v8_entry_uuid,
+    _v9_data_version,
+    _v10_archives,
+    _v11_archived_import_keys,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    version = get_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"База данных версии {version} новее приложения (ожидается {SCHEMA_VERSION})"
+        )
+
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        step = MIGRATIONS[target - 1]
+        conn.execute("BEGIN")
+        try:
+            step(conn)
+            # PRAGMA не принимает параметры, target — наше собственное число
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return get_version(conn)
@@ -0,0 +1,224 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# ---------------------------
+# Профилирование горячих путей (по желанию)
+# ---------------------------
+# Включается переменной окружения CASHPILOT_PROFILE=1 до запуска. Тогда:
+#   * каждый запрос SQLite замеряется вместе с чтением строк (ProfiledConnection);
+#   * помеченные timed() колбэки Clock и задачи DBExecutor пишутся как отрезки;
+#   * в приложении F12 показывает поверх экрана FPS и самые долгие операции
+#     за последние секунды, F11 и выход из приложения сохраняют трассу
+#     в формате Chrome trace (CASHPILOT_TRACE, по умолчанию trace.json) —
+#     её открывает chrome://tracing или ui.perfetto.dev.
+# Без переменной timed() возвращает функцию как есть, а соединение
+# создаётся обычным sqlite3.Connection — накладных расходов нет.
+
+ENABLED = os.environ.get("CASHPILOT_PROFILE", "") not in ("", "0")
+TRACE_PATH = os.environ.get("CASHPILOT_TRACE", "trace.json")
+
+MAX_TRACE_EVENTS = 200_000
+RECENT_EVENTS = 500
+
+
+class Event:
+    __slots__ = ("cat", "name", "start", "duration", "tid", "args")
+
+    def __init__(self, cat, name, start, duration, tid, args):
+        self.cat = cat
+        self.name = name
+        self.start = start
+        self.duration = duration
+        self.tid = tid
+        self.args = args
+
+
+class Profiler:
+    # события пишут UI-поток и поток базы; deque.append и list.append
+    # атомарны под GIL, блокировка нужна только для имён потоков
+    def __init__(self, max_events=MAX_TRACE_EVENTS, recent=RECENT_EVENTS):
+        self.origin = time.perf_counter()
+        self.events = deque(maxlen=max_events)
+        self.recent = deque(maxlen=recent)
+        self.threads = {}
+        self._lock = threading.Lock()
+
+    def record(self, cat, name, start, duration, args=None):
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            with self._lock:
+                self.threads[tid] = threading.current_thread().name
+        event = Event(cat, name, start, duration, tid, args)
+        self.events.append(event)
+        self.recent.append(event)
+
+    def counter(self, name, value):
+        # отдельная дорожка-график в трассе (FPS, время кадра)
+        self.record("counter", name, time.perf_counter(), 0, {"value": value})
+
+    @contextmanager
+    def span(self, cat, name, args=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(cat, name, start, time.perf_counter() - start, args)
+
+    def slowest(self, count=5, window=5.0):
+        # самые долгие отрезки за последние window секунд
+        since = time.perf_counter() - window
+        events = [e for e in list(self.recent) if e.duration and e.start >= since]
+        events.sort(key=lambda e: e.duration, reverse=True)
+        return events[:count]
+
+    def trace(self):
+        pid = os.getpid()
+        out = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self.threads.items()
+        ]
+        for e in list(self.events):
+            ts = (e.start - self.origin) * 1e6
+            if e.cat == "counter":
+                out.append({"name": e.name, "ph": "C", "ts": ts, "pid": pid, "tid": e.tid, "args": e.args})
+                continue
+            item = {"name": e.name, "cat": e.cat, "ph": "X", "ts": ts, "dur": e.duration * 1e6,
+                    "pid": pid, "tid": e.tid}
+            if e.args:
+                item["args"] = e.args
+            out.append(item)
+        return {"traceEvents": out, "displayTimeUnit": "ms"}
+
+    def dump(self, path=TRACE_PATH):
+        tmp = path + ".part"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+
+profiler = Profiler() if ENABLED else None
+
+
+def timed(cat="clock", name=None):
+    # декоратор для колбэков Clock и других точек UI-потока
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.record(cat, label, start, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# ---------------------------
+# SQL: время выполнения и число строк
+# ---------------------------
+# Замер курсора — от execute() до последней прочитанной строки (время
+# только внутри SQLite, без кода между fetchmany). Событие пишется, когда
+# строки кончились: fetchall(), неполный fetchmany(), конец итерации или
+# fetchone() — он обычно читает единственную строку. Для запросов без
+# результата (INSERT/UPDATE/DDL) — сразу после execute() с rowcount.
+
+def _statement_name(sql):
+    return " ".join(sql.split())[:80]
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    _sql = None
+
+    def _start(self, sql, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self._sql = sql
+        self._started = start
+        self._busy = time.perf_counter() - start
+        self._rows = 0
+        if self.description is None:
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+        return result
+
+    def _fetched(self, start, rows, done):
+        if self._sql is None:
+            return
+        self._busy += time.perf_counter() - start
+        self._rows += rows
+        if done:
+            self._finish()
+
+    def _finish(self):
+        profiler.record("sql", _statement_name(self._sql), self._started, self._busy, {"rows": self._rows})
+        self._sql = None
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, super().execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, super().executemany, sql, seq_of_parameters)
+        return self
+
+    def executescript(self, script):
+        self._start(script, super().executescript, script)
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None, True)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return row
+
+
+class ProfiledConnection(sqlite3.Connection):
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+
+def connection_factory():
+    return ProfiledConnection if ENABLED else sqlite3.Connection
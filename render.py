@@ -0,0 +1,129 @@
+import io
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+# ---------------------------
+# Отрисовка диаграмм в сырой RGBA-буфер (matplotlib Agg, без pyplot)
+# ---------------------------
+# Фигура и холст создаются один раз на виджет и переиспользуются, при
+# смене размера тоже; кадр — это canvas.draw() и memoryview на буфер Agg,
+# без PNG и без bbox_inches='tight'.
+
+
+class AggFigure:
+    def __init__(self, width_px, height_px, dpi=100):
+        self.size = (int(width_px), int(height_px))
+        self.dpi = dpi
+        self.figure = Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
+        self.figure.patch.set_alpha(0)  # прозрачный фон
+        self.canvas = FigureCanvasAgg(self.figure)
+
+    def resize(self, width_px, height_px):
+        # оси и линии остаются; буфер Agg под новый размер холст
+        # пересоздаст сам при следующем draw()
+        self.size = (int(width_px), int(height_px))
+        self.figure.set_size_inches(width_px / self.dpi, height_px / self.dpi)
+
+    def rgba(self):
+        # буфер принадлежит холсту и перезаписывается следующим draw();
+        # плоский memoryview без копирования — то, что ждёт blit_buffer
+        self.canvas.draw()
+        return memoryview(self.canvas.buffer_rgba()).cast('B')
+
+
+# ---------------------------
+# Баланс во времени: накопленная сумма и прореживание до ширины экрана
+# ---------------------------
+def balance_series(batches):
+    # пачки (created_ts, amount_cents) -> (ts, balance_cents), по времени.
+    # Накопленная сумма — один np.cumsum по всему массиву
+    parts = [np.array(rows, dtype=np.int64).reshape(-1, 2) for rows in batches]
+    if not parts:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    data = np.concatenate(parts)
+    order = np.argsort(data[:, 0], kind="stable")
+    ts = np.ascontiguousarray(data[order, 0])
+    return ts, np.cumsum(data[order, 1])
+
+
+def pack_series(ts, balance):
+    # ряд баланса -> байты .npz для кэша на диске
+    buf = io.BytesIO()
+    np.savez(buf, ts=ts, balance=balance)
+    return buf.getvalue()
+
+
+def unpack_series(data):
+    # None — файл повреждён
+    try:
+        with np.load(io.BytesIO(data)) as f:
+            return f["ts"], f["balance"]
+    except (ValueError, OSError, KeyError):
+        return None
+
+
+def minmax_downsample(x, y, x0, x1, columns):
+    # Точки окна [x0, x1] -> не больше 4 точек на столбец пикселей:
+    # первая, минимум, максимум и последняя. Линия через них на экране
+    # совпадает с линией через все точки (M4), а считается за O(n)
+    # через reduceat только по видимому окну.
+    lo = max(np.searchsorted(x, x0, side="left") - 1, 0)  # точка слева от окна
+    hi = min(np.searchsorted(x, x1, side="right") + 1, len(x))  # и справа
+    x, y = x[lo:hi], y[lo:hi]
+    if len(x) <= 4 * columns:
+        return x.astype(np.float64), y.astype(np.float64)
+
+    edges = np.linspace(x0, x1, columns + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1], side="left"))
+    starts = starts[starts < len(x)]
+    # точка слева от окна — в первый столбец, как правая — в последний
+    starts[0] = 0
+    ends = np.append(starts[1:], len(x)) - 1
+    centers = x[starts] + (x[ends] - x[starts]) / 2
+
+    out_x = np.repeat(centers, 4)
+    out_y = np.empty(len(starts) * 4, np.float64)
+    out_y[0::4] = y[starts]
+    out_y[1::4] = np.minimum.reduceat(y, starts)
+    out_y[2::4] = np.maximum.reduceat(y, starts)
+    out_y[3::4] = y[ends]
+    return out_x, out_y
+
+
+def short_amount(rub):
+    # подпись оси без «1e7» над графиком: 1.5 млн, 250 тыс, 900
+    if abs(rub) >= 1e6:
+        return f"{rub / 1e6:g} млн"
+    if abs(rub) >= 1e3:
+        return f"{rub / 1e3:g} тыс"
+    return f"{rub:g}"
+
+
+class BalanceLine:
+    # Линия баланса на AggFigure: оси и Line2D создаются один раз,
+    # кадр — только новые точки и пределы осей
+    def __init__(self, agg, date_format):
+        self.agg = agg
+        self.ax = agg.figure.add_axes((0.16, 0.1, 0.8, 0.86))
+        self.ax.set_facecolor("white")
+        self.ax.grid(True, color="#DDDDDD", linewidth=0.6)
+        self.ax.tick_params(labelsize=7)
+        self.ax.axhline(0, color="#999999", linewidth=0.6)
+        (self.line,) = self.ax.plot([], [], color="#3498DB", linewidth=1)
+        self._date_format = date_format
+        self.ax.xaxis.set_major_formatter(FuncFormatter(lambda v, pos: self._date_format(v, self._span)))
+        self.ax.yaxis.set_major_formatter(FuncFormatter(lambda v, pos: short_amount(v)))
+        self._span = 0
+
+    def render(self, x, y, x0, x1):
+        self._span = x1 - x0
+        self.line.set_data(x / 1.0, y / 100.0)  # копейки -> рубли
+        self.ax.set_xlim(x0, x1)
+        if len(y):
+            lo, hi = float(y.min()) / 100, float(y.max()) / 100
+            pad = (hi - lo) * 0.05 or 1.0
+            self.ax.set_ylim(lo - pad, hi + pad)
+        return self.agg.rgba()
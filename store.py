@@ -0,0 +1,138 @@
+from typing import List, NamedTuple, Optional
+
+from kivy.utils import get_color_from_hex
+
+from db import StoredOperation
+
+# ---------------------------
+# CategoryStore — категории в памяти UI-потока
+# ---------------------------
+# Загружается из базы один раз, дальше его обновляют сами пути записи
+# (добавление и удаление категории) после успешного ответа базы.
+# Подписчики получают не весь список, а изменение: reset — полный список
+# (первая загрузка), add/remove — одна категория и её позиция, так что
+# RecycleView правит свой data на месте.
+# Все методы вызываются только из UI-потока.
+#
+# OperationFeed — то же для операций: после добавления или удаления
+# операции подписчики получают саму операцию (db.StoredOperation) и правят
+# свои строки и итоги, а не перечитывают категорию целиком.
+
+
+class StoredCategory(NamedTuple):
+    id: int
+    name: str
+    color: str
+    rgba: List[float]  # разобранный color, чтобы не звать HEX на каждую отрисовку
+
+
+class CategoryChange(NamedTuple):
+    kind: str  # "reset", "add" или "remove"
+    index: Optional[int]
+    category: Optional[StoredCategory]
+
+
+class OperationChange(NamedTuple):
+    kind: str  # "add" или "delete"
+    operation: StoredOperation
+
+
+def operation_delta(operation):
+    # вклад операции в (доходы, расходы) итогов, в копейках; расходы хранятся
+    # с минусом, а в итогах — положительной суммой
+    if operation.type == "доход":
+        return operation.amount_cents, 0
+    return 0, -operation.amount_cents
+
+
+def _stored(category):
+    return StoredCategory(category.id, category.name, category.color,
+                          get_color_from_hex(category.color or "#1F1F1F"))
+
+
+class Observable:
+    def __init__(self):
+        self._listeners = []
+
+    def subscribe(self, listener):
+        # listener(источник, изменение)
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, change):
+        for listener in list(self._listeners):
+            listener(self, change)
+
+
+class CategoryStore(Observable):
+    def __init__(self):
+        super().__init__()
+        self.loaded = False
+        self._items = []
+        self._index = {}  # id -> позиция в _items
+
+    def __len__(self):
+        return len(self._items)
+
+    def items(self):
+        return list(self._items)
+
+    def get(self, category_id):
+        index = self._index.get(category_id)
+        return None if index is None else self._items[index]
+
+    def subscribe(self, listener):
+        # после подписки на уже загруженный список сразу приходит reset,
+        # чтобы подписчику не читать его отдельно
+        super().subscribe(listener)
+        if self.loaded:
+            listener(self, CategoryChange("reset", None, None))
+
+    def reset(self, categories):
+        # categories — [db.Category], по id, как их отдаёт Repository.categories()
+        self._items = [_stored(c) for c in categories]
+        self._reindex(0)
+        self.loaded = True
+        self._notify(CategoryChange("reset", None, None))
+
+    # До первой загрузки add/remove пропускаются: запросы к базе идут по
+    # очереди, так что загрузка после записи её уже содержит, а загрузка до
+    # записи доставляется раньше и add/remove применятся к ней.
+
+    def add(self, category):
+        if not self.loaded:
+            return
+        # id растут, а список упорядочен по id — новая категория всегда в конце
+        item = _stored(category)
+        self._items.append(item)
+        self._index[item.id] = len(self._items) - 1
+        self._notify(CategoryChange("add", len(self._items) - 1, item))
+
+    def remove(self, category_id):
+        if not self.loaded:
+            return
+        index = self._index.pop(category_id, None)
+        if index is None:
+            return
+        item = self._items.pop(index)
+        self._reindex(index)
+        self._notify(CategoryChange("remove", index, item))
+
+    def _reindex(self, start):
+        if start == 0:
+            self._index = {}
+        for i in range(start, len(self._items)):
+            self._index[self._items[i].id] = i
+
+
+class OperationFeed(Observable):
+    # события публикуются после успешной записи в базу, в порядке ответов
+    # потока базы — том же, в каком выполнялись запросы
+    def added(self, operation):
+        self._notify(OperationChange("add", operation))
+
+    def deleted(self, operation):
+        self._notify(OperationChange("delete", operation))
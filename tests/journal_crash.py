@@ -0,0 +1,126 @@
+# Проверка журнала отложенной записи на убийство процесса: дочерний процесс
+# пишет операции через WriteJournal и сбрасывает их в базу пачками, а этот
+# скрипт убивает его SIGKILL посреди очередного flush. Каждый следующий
+# запуск начинает с повтора журнала, как приложение при старте. В конце
+# проверяется, что каждая подтверждённая запись есть в базе ровно один раз.
+# В наборе тестов (tests/test_journal_crash.py) — CRASH_TEST_ROUNDS убийств;
+# вручную можно гонять дольше:
+#
+#   python -m pytest tests/test_journal_crash.py
+#   python tests/journal_crash.py               # 30 убийств
+#   python tests/journal_crash.py --rounds 500
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+import journal  # noqa: E402
+
+CRASH_TEST_ROUNDS = 10
+ACK = "ACK"
+FLUSH = "FLUSH"
+
+
+def run_child(db_path, seed):
+    # пишет бесконечно: ACK <uuid> после каждой записи в журнал,
+    # FLUSH перед каждым сбросом пачки
+    repo = db.Repository(db_path)
+    repo.init_schema()
+    log = journal.WriteJournal(journal.journal_path(db_path))
+    journal.flush(log, repo)  # повтор после прошлого убийства
+    category_id = repo.ensure_category("Проверка", "#9AA0A6")
+    rnd = random.Random(seed)
+    while True:
+        for _ in range(rnd.randint(1, 40)):
+            record = log.append(category_id, -rnd.randint(100, 100000), "расход",
+                                int(time.time()), "журнал", None)
+            print(f"{ACK} {record.uuid}", flush=True)
+        print(FLUSH, flush=True)
+        journal.flush(log, repo)
+
+
+def crash_round(db_path, rnd):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", db_path, str(rnd.randrange(1 << 30))],
+        stdout=subprocess.PIPE, text=True,
+    )
+    acked = set()
+
+    def read(line):
+        # строка, оборванная убийством, — не подтверждение
+        kind, _, value = line.partition(" ")
+        if kind == ACK and line.endswith("\n"):
+            acked.add(value.strip())
+        return kind.strip()
+
+    kill_after = rnd.randint(1, 6)
+    flushes = 0
+    for line in proc.stdout:
+        if read(line) == FLUSH:
+            flushes += 1
+            if flushes == kill_after:
+                # пачка от нескольких до сотни мс — бьём в произвольный её момент
+                time.sleep(rnd.random() * 0.02)
+                proc.send_signal(signal.SIGKILL)
+                break
+    # дочитываем подтверждения, успевшие попасть в канал до убийства
+    for line in proc.stdout:
+        read(line)
+    proc.wait()
+    return acked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Журнал отложенной записи против SIGKILL")
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--child", nargs=2, metavar=("DB", "SEED"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args.child[0], int(args.child[1]))
+        return 0
+
+    rnd = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "data.db")
+        acked = set()
+        leftovers = 0
+        for i in range(args.rounds):
+            acked |= crash_round(db_path, rnd)
+            if os.path.exists(journal.journal_path(db_path) + ".flushing"):
+                leftovers += 1
+            print(f"\rубийств: {i + 1}/{args.rounds}, подтверждено записей: {len(acked)}", end="", flush=True)
+        print()
+
+        # последний повтор журнала — как при запуске приложения
+        repo = db.Repository(db_path)
+        repo.init_schema()
+        journal.flush(journal.WriteJournal(journal.journal_path(db_path)), repo)
+        uuids = [r[0] for r in repo.conn.execute(
+            "SELECT entry_uuid FROM operations WHERE entry_uuid IS NOT NULL")]
+        repo.close()
+
+    stored = set(uuids)
+    lost = acked - stored
+    duplicated = len(uuids) - len(stored)
+    # запись может попасть в журнал, но процесс погибнет до печати ACK —
+    # таких не больше одной на убийство
+    unacked = len(stored - acked)
+    print(f"в базе: {len(uuids)}, убийств посреди сброса (остался .flushing): {leftovers}")
+    print(f"потеряно: {len(lost)}, дублей: {duplicated}, без подтверждения: {unacked}")
+    failed = lost or duplicated or unacked > args.rounds
+    print("ok" if not failed else "ОШИБКА")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
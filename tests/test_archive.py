@@ -0,0 +1,40 @@
+import archive
+import db
+import importer
+
+
+def _statement(tmp_path):
+    statement = tmp_path / "statement.csv"
+    statement.write_text(
+        "date;amount;category;description\n"
+        "2019-03-01;-150,00;Еда;coffee\n"
+        "2019-03-01;-150,00;Еда;coffee\n"
+        "2019-07-12;-500,00;Транспорт;taxi\n"
+        "2020-02-02;1000,00;Зарплата;salary\n",
+        encoding="utf-8",
+    )
+    return str(statement)
+
+
+def _totals(repo):
+    return [tuple(t) for t in repo.category_totals()]
+
+
+def test_reimport_after_archiving_skips_archived_rows(tmp_path):
+    repo = db.Repository(str(tmp_path / "data.db"))
+    repo.init_schema()
+    statement = _statement(tmp_path)
+    assert importer.import_statement(repo, statement).inserted == 4
+    totals = _totals(repo)
+
+    assert archive.archive_before(repo, archive.year_range(2021)[0]) == 4
+    again = importer.import_statement(repo, statement)
+    assert (again.inserted, again.duplicates) == (0, 4)
+    assert _totals(repo) == totals
+
+    # удалённая из архива операция при повторном импорте возвращается
+    archived_id = repo.conn.execute("SELECT min_id FROM archives WHERE year = 2019").fetchone()[0]
+    assert repo.delete_operation(archived_id) is not None
+    assert importer.import_statement(repo, statement).inserted == 1
+    assert _totals(repo) == totals
+    repo.close()
@@ -0,0 +1,29 @@
+import os
+
+import backup
+import db
+import journal
+
+
+def test_restore_keeps_every_previous_state_and_moves_journal_aside(tmp_path):
+    path = str(tmp_path / "data.db")
+    repo = db.Repository(path)
+    repo.init_schema()
+    category_id = repo.ensure_category("Еда", "#D64545")
+    repo.add_operation(category_id, -100, "расход", 1_700_000_000)
+    snapshot = backup.create_snapshot(repo)
+    repo.close()
+
+    # несброшенный ввод прежней базы не должен попасть в восстановленную
+    log = journal.WriteJournal(journal.journal_path(path))
+    log.append(category_id, -500, "расход", 1_700_000_100)
+    log.close()
+
+    _, first = backup.restore_snapshot(snapshot, path)
+    _, second = backup.restore_snapshot(snapshot, path)
+    assert not any(os.path.exists(p) for p in journal.journal_files(path))
+    assert any(p.startswith(path + ".pending.before-restore-") for p in first)
+    # второе восстановление не затирает копию, отложенную первым
+    main_copies = [p for p in first + second
+                   if os.path.basename(p).startswith("data.db.before-restore-") and not p.endswith("-wal")]
+    assert len(set(main_copies)) == 2 and all(os.path.exists(p) for p in main_copies)
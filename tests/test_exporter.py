@@ -0,0 +1,31 @@
+import json
+
+import db
+import exporter
+import importer
+
+
+def test_csv_export_reimports_note_and_merchant(tmp_path):
+    repo = db.Repository(str(tmp_path / "data.db"))
+    repo.init_schema()
+    assert repo.check_query_plans() == []
+    category_id = repo.add_category("Еда", "#D64545")
+    repo.add_operation(category_id, -15000, "расход", 1704103200, "обед с коллегами", "Столовая №1")
+    repo.add_operation(category_id, -30000, "расход", 1704189600, None, "Рынок")
+    path = str(tmp_path / "ops.csv")
+    exporter.export_operations(repo, path)
+    exporter.export_operations(repo, str(tmp_path / "ops.ndjson"))
+    repo.close()
+
+    with open(tmp_path / "ops.ndjson", encoding="utf-8") as f:
+        assert [json.loads(line)["note"] for line in f] == ["обед с коллегами", None]
+
+    copy = db.Repository(str(tmp_path / "copy.db"))
+    copy.init_schema()
+    stats = importer.import_statement(copy, path)
+    rows = copy.conn.execute(
+        "SELECT amount_cents, created_ts, note, merchant FROM operations ORDER BY created_ts").fetchall()
+    copy.close()
+    assert stats.inserted == 2
+    assert rows == [(-15000, 1704103200, "обед с коллегами", "Столовая №1"),
+                    (-30000, 1704189600, None, "Рынок")]
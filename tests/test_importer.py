@@ -0,0 +1,74 @@
+import tracemalloc
+
+import pytest
+
+import db
+import importer
+
+
+@pytest.mark.parametrize("text, cents", [
+    ("1 234,56", 123456),
+    ("1.234,56", 123456),
+    ("1,234.56", 123456),
+    ("-0,5", -50),
+    ("-1234.56", -123456),
+    ("1234,56 ₽", 123456),
+    ("1.234.567", 123456700),
+    ("100", 10000),
+])
+def test_parse_amount(text, cents):
+    assert importer.parse_amount(text) == cents
+
+
+@pytest.mark.parametrize("text", ["1,234", "1.234", "1,2,3", "1.234.56,7"])
+def test_parse_amount_rejects_ambiguous(text):
+    with pytest.raises(ValueError):
+        importer.parse_amount(text)
+
+
+def test_repeats_counted_across_unsorted_rows(tmp_path):
+    # одинаковые строки одной даты не рядом — две операции, а не дубль
+    statement = tmp_path / "statement.csv"
+    statement.write_text(
+        "date;amount;description\n"
+        "2024-01-01;-150,00;coffee\n"
+        "2024-01-02;-500,00;taxi\n"
+        "2024-01-01;-150,00;coffee\n",
+        encoding="utf-8",
+    )
+    repo = db.Repository(str(tmp_path / "data.db"))
+    repo.init_schema()
+    first = importer.import_statement(repo, str(statement))
+    again = importer.import_statement(repo, str(statement))
+    repo.close()
+    assert (first.inserted, first.duplicates) == (3, 0)
+    assert (again.inserted, again.duplicates) == (0, 3)
+
+
+def _rows(count, days=30):
+    # строки вразброс по дням; каждая пятая повторяет предыдущую
+    for i in range(count):
+        j = i - 1 if i % 5 == 4 else i
+        created_at = f"2024-01-{j % days + 1:02d} 00:00:00"
+        yield importer.StatementRow(created_at, 0, -100 - j, None, f"row {j}", None)
+
+
+def test_repeat_keys_survive_spilling():
+    # ключи не зависят от того, сколько счётчиков держится в памяти
+    expected = [key for _, key in importer._with_keys(_rows(3000), limit=10 ** 9)]
+    spilled = [key for _, key in importer._with_keys(_rows(3000), limit=100)]
+    assert spilled == expected
+    assert len(set(expected)) == len(expected)
+
+
+def test_repeat_counter_memory_is_bounded():
+    def peak(count):
+        tracemalloc.start()
+        for _ in importer._with_keys(_rows(count), limit=2000):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    small, large = peak(10_000), peak(40_000)
+    assert large < small * 1.5
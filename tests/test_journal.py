@@ -0,0 +1,37 @@
+import db
+import journal
+
+
+def _setup(tmp_path):
+    repo = db.Repository(str(tmp_path / "data.db"))
+    repo.init_schema()
+    return repo, journal.WriteJournal(str(tmp_path / "data.db.pending"))
+
+
+def test_flush_reports_entries_of_deleted_category(tmp_path):
+    repo, log = _setup(tmp_path)
+    kept = repo.ensure_category("Еда", "#D64545")
+    gone = repo.ensure_category("Такси", "#3498DB")
+    log.append(kept, -100, "расход", 1_700_000_000)
+    lost = log.append(gone, -200, "расход", 1_700_000_001)
+    orphan = log.append(None, -300, "расход", 1_700_000_002)
+    repo.delete_category(gone)
+
+    result = journal.flush(log, repo)
+    assert [op.category_id for op in result.added] == [kept]
+    assert {r.uuid for r in result.rejected} == {lost.uuid, orphan.uuid}
+    # не выброшены: лежат рядом с журналом
+    assert {r.uuid for r in journal.read_records(log.rejected_path)} == {lost.uuid, orphan.uuid}
+    repo.close()
+
+
+def test_replayed_entries_are_neither_added_nor_rejected(tmp_path):
+    repo, log = _setup(tmp_path)
+    category_id = repo.ensure_category("Еда", "#D64545")
+    log.append(category_id, -100, "расход", 1_700_000_000)
+    records = log.rotate()
+    repo.add_journal_operations(records)
+    # сбой до commit(): следующий сброс повторяет ту же пачку
+    result = journal.flush(log, repo)
+    assert (result.added, result.rejected) == ([], [])
+    repo.close()
@@ -0,0 +1,7 @@
+import journal_crash
+
+
+def test_acknowledged_entries_survive_sigkill():
+    # каждая подтверждённая запись — в базе ровно один раз после убийств
+    # процесса посреди сброса пачки
+    assert journal_crash.main(["--rounds", str(journal_crash.CRASH_TEST_ROUNDS)]) == 0
@@ -0,0 +1,23 @@
+import numpy as np
+
+import render
+
+
+def test_downsample_keeps_left_neighbour():
+    # точка слева от окна держит линию у левого края и при прореживании
+    x = np.arange(10_000, dtype=np.int64)
+    y = x % 7
+    y[4999] = -100
+    _, out_y = render.minmax_downsample(x, y, 5000, 9000, 100)
+    assert out_y[0] == -100
+    assert out_y.min() == -100
+
+
+def test_agg_figure_resize_keeps_axes():
+    agg = render.AggFigure(200, 100)
+    line = render.BalanceLine(agg, lambda value, span: "")
+    x = np.arange(10, dtype=np.float64)
+    assert len(line.render(x, x, 0, 9)) == 200 * 100 * 4
+    agg.resize(300, 150)
+    assert len(line.render(x, x, 0, 9)) == 300 * 150 * 4
+    assert agg.figure.axes == [line.ax]
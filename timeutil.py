@@ -0,0 +1,74 @@
+import time
+from datetime import date, datetime, timedelta
+
+# ---------------------------
+# Время операций
+# ---------------------------
+# В базе время хранится как целые секунды Unix (operations.created_ts, UTC),
+# а показывается и вводится в локальном часовом поясе устройства.
+# До версии схемы 5 приложение писало created_at строкой по Москве (UTC+3);
+# миграция переводит эти строки с поправкой LEGACY_UTC_OFFSET.
+
+LEGACY_UTC_OFFSET = 3 * 3600
+DISPLAY_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# периоды главного экрана: код -> подпись
+PERIODS = {
+    "all": "Всё время",
+    "month": "Этот месяц",
+    "30d": "30 дней",
+    "custom": "Период...",
+}
+
+
+def now_ts():
+    return int(time.time())
+
+
+def format_ts(ts, fmt=DISPLAY_FORMAT):
+    return time.strftime(fmt, time.localtime(ts))
+
+
+def local_day_start(day):
+    # полночь локального дня; datetime без tzinfo .timestamp() учитывает
+    # локальный пояс и переход на летнее время
+    return int(datetime(day.year, day.month, day.day).timestamp())
+
+
+def day_range(date_from=None, date_to=None):
+    # даты включительно (date или 'ГГГГ-ММ-ДД') -> полуинтервал [since, until)
+    # в секундах; None — без ограничения с этой стороны
+    if isinstance(date_from, str):
+        date_from = date.fromisoformat(date_from)
+    if isinstance(date_to, str):
+        date_to = date.fromisoformat(date_to)
+    since = None if date_from is None else local_day_start(date_from)
+    until = None if date_to is None else local_day_start(date_to + timedelta(days=1))
+    return since, until
+
+
+def period_range(period, today=None, custom=None):
+    # (since, until) для периода главного экрана; (None, None) — всё время
+    today = today or date.today()
+    if period == "month":
+        return day_range(today.replace(day=1), None)
+    if period == "30d":
+        return day_range(today - timedelta(days=29), None)
+    if period == "custom" and custom:
+        return day_range(*custom)
+    return None, None
+
+
+def day_buckets(count, today=None):
+    # ключи последних count дней, включая сегодня, и ключ следующего дня
+    today = today or date.today()
+    days = [today - timedelta(days=i) for i in range(count - 1, -1, -1)]
+    return [d.isoformat() for d in days], (today + timedelta(days=1)).isoformat()
+
+
+def month_buckets(count, today=None):
+    # ключи последних count месяцев, включая текущий, и ключ следующего
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1
+    keys = [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in range(index - count + 1, index + 2)]
+    return keys[:-1], keys[-1]